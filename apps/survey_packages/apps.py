@@ -5,3 +5,6 @@ class SurveyPackagesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.survey_packages"
     label = "survey_packages"
+
+    def ready(self):
+        from apps.survey_packages import signals  # noqa: F401
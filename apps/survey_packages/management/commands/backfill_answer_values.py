@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.survey_packages.validators import PackageAnswerValidator
+from apps.surveys.models import QuestionAnswer
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the numeric value and selection mask of stored answers, "
+        "walking the answers table in primary key order a batch at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="number of answers updated per transaction",
+        )
+        parser.add_argument(
+            "--start-id",
+            type=int,
+            default=0,
+            help="resume after this answer id",
+        )
+
+    def handle(self, *args, **options):
+        last_id = options["start_id"]
+        updated = 0
+        validators: dict[int, PackageAnswerValidator] = {}
+
+        while True:
+            with transaction.atomic():
+                answers = list(
+                    QuestionAnswer.objects.filter(id__gt=last_id)
+                    .only("id", "survey_package_id", "question_id", "answer")
+                    .order_by("id")[: options["batch_size"]]
+                )
+                if not answers:
+                    break
+
+                for a in answers:
+                    if a.survey_package_id is None:
+                        continue
+                    if a.survey_package_id not in validators:
+                        validators[
+                            a.survey_package_id
+                        ] = PackageAnswerValidator.for_package(a.survey_package_id)
+                    a.numeric_value, a.selection_mask = validators[
+                        a.survey_package_id
+                    ].parse(a.question_id, a.answer)
+
+                QuestionAnswer.objects.bulk_update(
+                    answers, ["numeric_value", "selection_mask"], batch_size=1000
+                )
+
+            last_id = answers[-1].id
+            updated += len(answers)
+            self.stdout.write(f"{updated} answers updated, last id {last_id}")
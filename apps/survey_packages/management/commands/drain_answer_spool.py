@@ -0,0 +1,67 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.surveys.services import AnswerSpoolService
+
+logger = logging.getLogger("convey")
+
+
+class Command(BaseCommand):
+    help = "Writes spooled survey package submissions to the database in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.ANSWER_SPOOL_BATCH_SIZE,
+            help="number of submissions written per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.ANSWER_SPOOL_FLUSH_INTERVAL,
+            help="seconds to wait before polling an empty spool again",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="drain the spool until it is empty and exit",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="print spool metrics and exit",
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self._print_metrics()
+            return
+
+        service = AnswerSpoolService(batch_size=options["batch_size"])
+
+        while True:
+            written, failed = service.drain()
+            if written or failed:
+                metrics = AnswerSpoolService.metrics()
+                logger.info(
+                    f"answer spool: {written} written, {failed} failed, "
+                    f"depth {metrics['depth']}"
+                )
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self._print_metrics()
+
+    def _print_metrics(self):
+        metrics = AnswerSpoolService.metrics()
+        self.stdout.write(
+            f"depth: {metrics['depth']}, failed: {metrics['failed']}, "
+            f"oldest pending: {metrics['oldest_pending_seconds']:.1f}s"
+        )
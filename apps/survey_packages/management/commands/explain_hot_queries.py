@@ -0,0 +1,108 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import QuerySet
+
+from apps.survey_packages.models import Respondent, AnswerSpool, IdempotencyKey
+from apps.surveys.models import QuestionAnswer
+from apps.workspaces.models import Workspace
+
+FULL_SCAN_PATTERNS = {
+    "mysql": re.compile(r'"access_type":\s*"ALL"'),
+    "sqlite": re.compile(r"^.*\bSCAN\b(?!.*\bUSING\b)", re.MULTILINE),
+    "postgresql": re.compile(r"\bSeq Scan\b"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the hot queries of answer ingestion and export "
+        "and fails when any of them scans a whole table"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--package", type=int, default=None, help="survey package id to plan with"
+        )
+        parser.add_argument(
+            "--workspace", type=int, default=None, help="workspace id to plan with"
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="print the plan of every query, not only the flagged ones",
+        )
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor, None)
+        if pattern is None:
+            raise CommandError(f"unsupported database backend: {connection.vendor}")
+
+        sample = Respondent.objects.values(
+            "workspace_id", "survey_package_id", "respondent_id"
+        ).first() or dict(workspace_id=0, survey_package_id=0, respondent_id="")
+        package_id = options["package"] or sample["survey_package_id"]
+        workspace_id = options["workspace"] or sample["workspace_id"]
+
+        flagged = []
+        for name, queryset in self.get_hot_queries(
+            package_id, workspace_id, sample["respondent_id"]
+        ).items():
+            plan = self.explain(queryset)
+
+            full_scan = pattern.search(plan) is not None
+            if full_scan:
+                flagged.append(name)
+
+            self.stdout.write(f"{'FULL SCAN' if full_scan else 'ok':>9}  {name}")
+            if full_scan or options["verbose_plans"]:
+                self.stdout.write(plan)
+
+        if flagged:
+            raise CommandError(f"full table scans in: {', '.join(flagged)}")
+
+    @staticmethod
+    def explain(queryset: QuerySet) -> str:
+        # Runs on a raw cursor, silk explains every ORM query it records
+        # and would prefix the statement a second time
+        sql, params = queryset.query.sql_with_params()
+        prefix = connection.ops.explain_query_prefix(
+            format="json" if connection.vendor == "mysql" else None
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            return "\n".join(
+                " ".join(str(column) for column in row) for row in cursor.fetchall()
+            )
+
+    @staticmethod
+    def get_hot_queries(
+        package_id: int, workspace_id: int, respondent_id: str
+    ) -> dict[str, QuerySet]:
+        return {
+            "answers of a package by question": QuestionAnswer.objects.filter(
+                survey_package_id=package_id, question_id__in=[0, 1]
+            ).order_by("respondent_id"),
+            "answers of a package in a workspace": QuestionAnswer.objects.filter(
+                workspace_id=workspace_id, survey_package_id=package_id
+            ).order_by("respondent_id"),
+            "numeric answers of a question": QuestionAnswer.objects.filter(
+                survey_package_id=package_id,
+                question_id=0,
+                numeric_value__isnull=False,
+            ).values("numeric_value"),
+            "respondent lookup": Respondent.objects.filter(
+                workspace_id=workspace_id,
+                survey_package_id=package_id,
+                respondent_id=respondent_id,
+            ),
+            "respondents of a package in a workspace": Respondent.objects.filter(
+                workspace_id=workspace_id, survey_package_id=package_id
+            ).order_by("respondent_id"),
+            "workspace by subject key": Workspace.objects.filter(uuid=""),
+            "pending answer spool": AnswerSpool.objects.filter(
+                status=AnswerSpool.Status.PENDING
+            ).order_by("id"),
+            "idempotency key lookup": IdempotencyKey.objects.filter(user_id=0, key=""),
+        }
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.surveys.services import QuestionAggregateService
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the per question response aggregates from the stored answers, "
+        "replacing the rows in the given scope"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workspace", type=int, default=None, help="only rebuild this workspace"
+        )
+        parser.add_argument(
+            "--package", type=int, default=None, help="only rebuild this survey package"
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50000,
+            help="number of answers read and summarized at a time",
+        )
+
+    def handle(self, *args, **options):
+        written = QuestionAggregateService.rebuild(
+            workspace_id=options["workspace"],
+            survey_package_id=options["package"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(f"{written} question aggregates written")
@@ -0,0 +1,47 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.survey_packages.services import ExportJobService
+
+logger = logging.getLogger("convey")
+
+
+class Command(BaseCommand):
+    help = "Builds requested export files and removes expired ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.EXPORT_JOB_POLL_INTERVAL,
+            help="seconds to wait before polling for new jobs again",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="run every pending job and exit",
+        )
+
+    def handle(self, *args, **options):
+        service = ExportJobService()
+
+        while True:
+            failed = service.fail_stale()
+            if failed:
+                logger.info(f"export jobs: {failed} stale running jobs failed")
+
+            purged = service.purge_expired()
+            if purged:
+                logger.info(f"export jobs: {purged} expired artifacts removed")
+
+            job = service.run_next()
+            if job is not None:
+                logger.info(f"export job {job.id}: {job.status}")
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,110 @@
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from apps.surveys.models import QuestionAnswer, SurveySector
+
+NUMERIC_QUESTION_TYPES = [
+    SurveySector.QuestionType.LIKERT,
+    SurveySector.QuestionType.EXTENT,
+    SurveySector.QuestionType.SINGLE_SELECT,
+]
+
+
+class ResponseMatrixBuilder(object):
+    """
+    Builds the respondent x question matrix of a survey package in a workspace.
+    Answers are read with one ordered query and pivoted a block of respondents
+    at a time, so memory is bounded by `chunk_size` answers.
+    """
+
+    def __init__(
+        self,
+        workspace_id: int,
+        survey_package_id: int,
+        columns: list[tuple[int, str]],
+        chunk_size: int = 5000,
+        respondent_ids: Optional[list[str]] = None,
+    ):
+        """
+        `columns` is the (question id, question type) of every matrix column,
+        a question may appear in more than one column.
+        `respondent_ids` limits the matrix to the given respondents
+        """
+        self.workspace_id = workspace_id
+        self.survey_package_id = survey_package_id
+        self.respondent_ids = respondent_ids
+        self.question_ids = [question_id for question_id, _ in columns]
+        self.numeric_question_ids = {
+            question_id
+            for question_id, question_type in columns
+            if question_type in NUMERIC_QUESTION_TYPES
+        }
+        self.chunk_size = chunk_size
+
+    def _iter_chunks(self) -> Iterator[list[tuple[str, int, str]]]:
+        answers = QuestionAnswer.objects.filter(
+            workspace_id=self.workspace_id,
+            survey_package_id=self.survey_package_id,
+        )
+        if self.respondent_ids is not None:
+            answers = answers.filter(respondent_id__in=self.respondent_ids)
+
+        # Ordered by id within a respondent so the newest of repeated answers
+        # is the one kept, as in the stored dedupe
+        rows = (
+            answers.order_by("respondent_id", "id")
+            .values_list("respondent_id", "question_id", "answer")
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+        chunk = []
+        for row in rows:
+            # Only cut between respondents so a row is never split
+            if len(chunk) >= self.chunk_size and row[0] != chunk[-1][0]:
+                yield chunk
+                chunk = []
+            chunk.append(row)
+
+        if chunk:
+            yield chunk
+
+    def _coerce(self, answers: pd.DataFrame) -> np.ndarray:
+        values = answers["answer"].str.replace("$", ", ", regex=False)
+
+        is_numeric = (
+            answers["question_id"].isin(self.numeric_question_ids)
+            & values.str.fullmatch(r"\s*-?\d+\s*")
+        ).to_numpy()
+
+        # An object array keeps the numbers as python ints for openpyxl
+        coerced = values.to_numpy(dtype=object)
+        coerced[is_numeric] = values[is_numeric].astype("int64").tolist()
+
+        return coerced
+
+    def _pivot(self, chunk: list[tuple[str, int, str]]) -> pd.DataFrame:
+        answers = pd.DataFrame.from_records(
+            chunk, columns=["respondent_id", "question_id", "answer"]
+        )
+        answers["answer"] = self._coerce(answers)
+
+        matrix = (
+            answers.drop_duplicates(["respondent_id", "question_id"], keep="last")
+            .pivot(index="respondent_id", columns="question_id", values="answer")
+            # pivot sorts the respondents, keep the database order instead
+            .reindex(index=answers["respondent_id"].unique(), columns=self.question_ids)
+            .astype(object)
+        )
+
+        return matrix.where(matrix.notna(), None)
+
+    def iter_frames(self) -> Iterator[pd.DataFrame]:
+        for chunk in self._iter_chunks():
+            yield self._pivot(chunk)
+
+    def iter_rows(self) -> Iterator[tuple[str, list]]:
+        for matrix in self.iter_frames():
+            for respondent_id, answers in zip(matrix.index, matrix.values.tolist()):
+                yield respondent_id, answers
@@ -0,0 +1,95 @@
+# Generated by Django 4.1.7 on 2026-10-17 11:02
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Min, Max
+
+
+def remove_duplicate_respondents(apps, schema_editor):
+    Respondent = apps.get_model("survey_packages", "Respondent")
+    QuestionAnswer = apps.get_model("surveys", "QuestionAnswer")
+
+    duplicates = (
+        Respondent.objects.values("workspace_id", "survey_package_id", "respondent_id")
+        .annotate(min_id=Min("id"), count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for d in duplicates:
+        Respondent.objects.filter(
+            workspace_id=d["workspace_id"],
+            survey_package_id=d["survey_package_id"],
+            respondent_id=d["respondent_id"],
+        ).exclude(id=d["min_id"]).delete()
+
+        # Each duplicate submission also stored its answers again,
+        # keep the last answer to every question as the export did
+        answers = QuestionAnswer.objects.filter(
+            workspace_id=d["workspace_id"],
+            survey_package_id=d["survey_package_id"],
+            respondent_id=d["respondent_id"],
+        )
+        last_ids = answers.values("question_id").annotate(max_id=Max("id"))
+        answers.exclude(id__in=[a["max_id"] for a in last_ids]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("survey_packages", "0004_alter_packagecontact_created_at_and_more"),
+        ("surveys", "0007_alter_questionanswer_created_at_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_respondents, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("key", models.CharField(max_length=64)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                (
+                    "response",
+                    models.JSONField(
+                        encoder=django.core.serializers.json.DjangoJSONEncoder
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "idempotency_key",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="respondent",
+            constraint=models.UniqueConstraint(
+                fields=("workspace", "survey_package", "respondent_id"),
+                name="unique_respondent_per_package",
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="survey_package",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to="survey_packages.surveypackage",
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("user", "key"), name="unique_idempotency_key_per_user"
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.1.7 on 2026-10-17 14:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        (
+            "workspaces",
+            "0003_alter_routine_created_at_alter_routine_updated_at_and_more",
+        ),
+        ("survey_packages", "0005_respondent_unique_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnswerSpool",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("respondent_id", models.CharField(max_length=30)),
+                ("answers", models.JSONField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "대기"), ("failed", "실패")],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("error", models.CharField(max_length=200, null=True)),
+                (
+                    "survey_package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="survey_packages.surveypackage",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "workspace",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="workspaces.workspace",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "answer_spool",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="answerspool",
+            index=models.Index(fields=["status", "id"], name="answer_spool_status_idx"),
+        ),
+    ]
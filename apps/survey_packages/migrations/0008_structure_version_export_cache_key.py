@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("survey_packages", "0007_exportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="cache_key",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="surveypackage",
+            name="structure_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="exportjob",
+            index=models.Index(
+                fields=["cache_key", "status"], name="export_job_cache_key_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.7 on 2026-10-17 20:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("survey_packages", "0008_structure_version_export_cache_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportjob",
+            name="options",
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AlterField(
+            model_name="exportjob",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("responses", "응답"),
+                    ("structure", "문항 구성"),
+                    ("workspace", "워크스페이스 전체 응답"),
+                ],
+                max_length=10,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="exportjob",
+            name="survey_package",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="survey_packages.surveypackage",
+            ),
+        ),
+    ]
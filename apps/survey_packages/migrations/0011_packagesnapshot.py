@@ -0,0 +1,34 @@
+# Generated by Django 4.1.7 on 2026-10-17 18:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("survey_packages", "0010_packagecolumnlayout"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackageSnapshot",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("structure_version", models.PositiveIntegerField()),
+                ("content", models.TextField()),
+                (
+                    "survey_package",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshot",
+                        to="survey_packages.surveypackage",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "package_snapshot",
+            },
+        ),
+    ]
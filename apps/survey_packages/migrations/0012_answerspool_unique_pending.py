@@ -0,0 +1,43 @@
+# Generated by Django 4.1.7 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+def mark_pending_entries(apps, schema_editor):
+    AnswerSpool = apps.get_model("survey_packages", "AnswerSpool")
+
+    seen = set()
+    for entry in AnswerSpool.objects.filter(status="pending").order_by("id"):
+        key = (entry.workspace_id, entry.survey_package_id, entry.respondent_id)
+        if key in seen:
+            # Spooled twice before the constraint, the drain would fail it anyway
+            entry.status = "failed"
+            entry.error = "this respondent has already submitted a response for this survey package"
+        else:
+            entry.pending_respondent_id = entry.respondent_id
+            seen.add(key)
+        entry.save(update_fields=["status", "error", "pending_respondent_id"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("survey_packages", "0011_packagesnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answerspool",
+            name="pending_respondent_id",
+            field=models.CharField(max_length=30, null=True),
+        ),
+        migrations.RunPython(
+            mark_pending_entries, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="answerspool",
+            constraint=models.UniqueConstraint(
+                fields=("workspace", "survey_package", "pending_respondent_id"),
+                name="unique_pending_spool_entry",
+            ),
+        ),
+    ]
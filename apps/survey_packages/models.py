@@ -1,12 +1,13 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from shortuuid.django_fields import ShortUUIDField
 
 from apps.surveys.models import Survey
 from apps.users.models import User
-from config.mixins import TimeStampMixin
+from config.mixins import TimeStampMixin, StructureVersionMixin
 
 
-class SurveyPackage(TimeStampMixin):
+class SurveyPackage(TimeStampMixin, StructureVersionMixin):
     id = models.BigAutoField(primary_key=True)
     author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     title = models.CharField(max_length=100, null=False)
@@ -132,9 +133,167 @@ class Respondent(TimeStampMixin):
 
     class Meta:
         db_table = "respondent"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workspace", "survey_package", "respondent_id"],
+                name="unique_respondent_per_package",
+            )
+        ]
 
     def __str__(self):
         return f"[{self.id}] {self.respondent_id}/package: {self.survey_package_id}"
 
     def __repr__(self):
         return f"Respondent({self.id}, {self.respondent_id}, {self.survey_package_id})"
+
+
+class IdempotencyKey(TimeStampMixin):
+    id = models.BigAutoField(primary_key=True)
+    key = models.CharField(max_length=64, null=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    survey_package = models.ForeignKey(SurveyPackage, on_delete=models.CASCADE)
+    status_code = models.PositiveSmallIntegerField(null=False)
+    response = models.JSONField(null=False, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        db_table = "idempotency_key"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key_per_user"
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] {self.key}"
+
+    def __repr__(self):
+        return f"IdempotencyKey({self.id}, {self.key})"
+
+
+class AnswerSpool(TimeStampMixin):
+    class Status(models.TextChoices):
+        PENDING = "pending", "대기"
+        FAILED = "failed", "실패"
+
+    id = models.BigAutoField(primary_key=True)
+    respondent_id = models.CharField(max_length=30, null=False)
+    survey_package = models.ForeignKey(SurveyPackage, on_delete=models.CASCADE)
+    workspace = models.ForeignKey("workspaces.Workspace", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    answers = models.JSONField(null=False)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    error = models.CharField(max_length=200, null=True)
+    # respondent_id while the entry is pending and null after, so the unique
+    # constraint below only holds for pending entries on every backend
+    pending_respondent_id = models.CharField(max_length=30, null=True)
+
+    class Meta:
+        db_table = "answer_spool"
+        indexes = [
+            models.Index(fields=["status", "id"], name="answer_spool_status_idx")
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workspace", "survey_package", "pending_respondent_id"],
+                name="unique_pending_spool_entry",
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] {self.respondent_id}/package: {self.survey_package_id}"
+
+    def __repr__(self):
+        return f"AnswerSpool({self.id}, {self.respondent_id}, {self.status})"
+
+
+class ExportJob(TimeStampMixin):
+    class Kind(models.TextChoices):
+        RESPONSES = "responses", "응답"
+        STRUCTURE = "structure", "문항 구성"
+        WORKSPACE = "workspace", "워크스페이스 전체 응답"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "대기"
+        RUNNING = "running", "진행 중"
+        DONE = "done", "완료"
+        FAILED = "failed", "실패"
+        EXPIRED = "expired", "만료"
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    survey_package = models.ForeignKey(
+        SurveyPackage, on_delete=models.CASCADE, null=True
+    )
+    workspace = models.ForeignKey(
+        "workspaces.Workspace", on_delete=models.CASCADE, null=True
+    )
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True)
+    options = models.JSONField(default=dict)
+    file_name = models.CharField(max_length=255, null=True)
+    cache_key = models.CharField(max_length=64, null=True)
+    artifact = models.CharField(max_length=255, null=True)
+    error = models.CharField(max_length=200, null=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    expires_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = "export_job"
+        indexes = [
+            models.Index(fields=["status", "id"], name="export_job_status_idx"),
+            models.Index(fields=["status", "expires_at"], name="export_job_expiry_idx"),
+            models.Index(
+                fields=["cache_key", "status"], name="export_job_cache_key_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] {self.kind}/package: {self.survey_package_id}"
+
+    def __repr__(self):
+        return f"ExportJob({self.id}, {self.kind}, {self.status})"
+
+
+class PackageColumnLayout(TimeStampMixin):
+    id = models.BigAutoField(primary_key=True)
+    survey_package = models.OneToOneField(
+        SurveyPackage, on_delete=models.CASCADE, related_name="column_layout"
+    )
+    structure_version = models.PositiveIntegerField(null=False)
+    # [header, question id, question type] of every column of a responses export
+    columns = models.JSONField(null=False)
+
+    class Meta:
+        db_table = "package_column_layout"
+
+    def __str__(self):
+        return f"[{self.id}] package: {self.survey_package_id}/version: {self.structure_version}"
+
+    def __repr__(self):
+        return f"PackageColumnLayout({self.id}, {self.survey_package_id}, {self.structure_version})"
+
+
+class PackageSnapshot(TimeStampMixin):
+    id = models.BigAutoField(primary_key=True)
+    survey_package = models.OneToOneField(
+        SurveyPackage, on_delete=models.CASCADE, related_name="snapshot"
+    )
+    structure_version = models.PositiveIntegerField(null=False)
+    # JSON text of the serialized package tree, text keeps the key order as serialized
+    content = models.TextField(null=False)
+
+    class Meta:
+        db_table = "package_snapshot"
+
+    def __str__(self):
+        return f"[{self.id}] package: {self.survey_package_id}/version: {self.structure_version}"
+
+    def __repr__(self):
+        return f"PackageSnapshot({self.id}, {self.survey_package_id}, {self.structure_version})"
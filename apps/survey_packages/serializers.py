@@ -8,6 +8,7 @@ from apps.survey_packages.models import (
     PackageSubject,
     PackageSubjectSurvey,
     Respondent,
+    ExportJob,
 )
 from apps.surveys.serializers import SurveySerializer
 from apps.users.serializers import UserSerializer
@@ -137,7 +138,42 @@ class RespondentSerializer(serializers.ModelSerializer):
         ]
 
 
+class RespondentAnswersSerializer(serializers.ModelSerializer):
+    answers = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Respondent
+        fields = ["respondent_id", "created_at", "answers"]
+        read_only_fields = fields
+
+    def get_answers(self, obj: Respondent) -> list[dict]:
+        return self.context["answers"].get(obj.respondent_id, [])
+
+
 class MiniSurveyPackageSerializer(serializers.ModelSerializer):
     class Meta:
         model = SurveyPackage
         fields = ["id", "title", "created_at", "updated_at"]
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = [
+            "id",
+            "kind",
+            "survey_package",
+            "workspace",
+            "status",
+            "progress",
+            "total",
+            "options",
+            "file_name",
+            "error",
+            "started_at",
+            "finished_at",
+            "expires_at",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = fields
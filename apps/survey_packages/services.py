@@ -1,17 +1,40 @@
-from typing import Union, List
-
-import openpyxl.utils.cell
-from django.db.models import QuerySet, Prefetch
+import codecs
+import csv
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from tempfile import TemporaryFile
+from typing import Union, List, Iterator, IO, Optional, Callable
+
+import django
+import pandas as pd
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction, IntegrityError
+from django.db.models import QuerySet, Max, Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.module_loading import import_string
 from openpyxl.workbook import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
+from rest_framework.exceptions import APIException
 
+from apps.survey_packages.matrix import ResponseMatrixBuilder
 from apps.survey_packages.models import (
     SurveyPackage,
     PackagePart,
     PackageSubjectSurvey,
     Respondent,
-    PackageSubject,
+    ExportJob,
+    PackageColumnLayout,
+    PackageSnapshot,
 )
 from apps.survey_packages.serializers import (
     PackageContactSerializer,
@@ -19,14 +42,21 @@ from apps.survey_packages.serializers import (
     PackageSubjectSerializer,
     PackageSubjectSurveySerializer,
 )
-from apps.surveys.models import QuestionAnswer, SurveySector, SectorQuestion
-from apps.workspaces.models import Workspace, RoutineDetail
+from apps.survey_packages.tree import PackageTreeLoader, logo_url
+from apps.surveys.models import QuestionAnswer, SectorQuestion
+from apps.users.models import User
+from apps.workspaces.models import Workspace, RoutineDetail, WorkspaceComposition
 from config.exceptions import (
     InvalidInputException,
-    InternalServerError,
     InstanceNotFound,
+    ConflictException,
+    InternalServerError,
 )
 
+logger = logging.getLogger("convey")
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 class SurveyPackageService(object):
     def __init__(self, package: Union[SurveyPackage, int]):
@@ -91,14 +121,154 @@ class SurveyPackageService(object):
         PackageSubjectSurvey.objects.filter(subject_id=subject_id).delete()
 
 
+class PackageColumnLayoutService(object):
+    @staticmethod
+    def get(survey_package: SurveyPackage) -> list[tuple[str, int, str]]:
+        """
+        Returns the stored column layout of the package,
+        computing it when the package structure changed since it was stored
+        """
+        layout = PackageColumnLayout.objects.filter(
+            survey_package_id=survey_package.id,
+            structure_version=survey_package.structure_version,
+        ).first()
+        if layout is not None:
+            return [tuple(column) for column in layout.columns]
+
+        columns = PackageColumnLayoutService.compute(survey_package.id)
+        try:
+            with transaction.atomic():
+                PackageColumnLayout.objects.update_or_create(
+                    survey_package_id=survey_package.id,
+                    defaults=dict(
+                        structure_version=survey_package.structure_version,
+                        columns=columns,
+                    ),
+                )
+        except IntegrityError:
+            # Stored concurrently by another export
+            pass
+
+        return columns
+
+    @staticmethod
+    def _format_question_number(prefix: str, number) -> str:
+        # bread crumb format question number
+        formatted_question_number = str(number)
+
+        if formatted_question_number[-1] != "0":
+            formatted_question_number = formatted_question_number.replace(".", "-")
+        else:
+            dot_index = formatted_question_number.index(".")
+            formatted_question_number = formatted_question_number[:dot_index]
+
+        return f"{prefix}-{formatted_question_number}"
+
+    @staticmethod
+    def compute(survey_package_id: int) -> list[tuple[str, int, str]]:
+        parts = PackageTreeLoader.load_parts(survey_package_id=survey_package_id)
+
+        columns = []
+        for part in parts:
+            for subject in part["subjects"]:
+                for subject_survey in subject["surveys"]:
+                    prefix = f"{subject['number']}"
+                    if subject_survey["number"] and subject_survey["number"] != "":
+                        prefix = f"{prefix}-{subject_survey['number']}"
+                    prefix = f"{prefix}-{subject_survey['survey']['abbr']}"
+
+                    for sector in subject_survey["survey"]["sectors"]:
+                        for question in sorted(
+                            sector["questions"], key=lambda q: q["number"]
+                        ):
+                            columns.append(
+                                (
+                                    PackageColumnLayoutService._format_question_number(
+                                        prefix, question["number"]
+                                    ),
+                                    question["id"],
+                                    sector["question_type"],
+                                )
+                            )
+
+        return columns
+
+
+class PackageSnapshotService(object):
+    @staticmethod
+    def get(survey_package_id: Optional[int]) -> dict:
+        """
+        Returns the serialized tree of the package from its snapshot,
+        serializing it again only when the package structure changed since
+        """
+        survey_package = (
+            SurveyPackage.objects.select_related("snapshot")
+            .filter(id=survey_package_id)
+            .first()
+        )
+        if survey_package is None:
+            raise InstanceNotFound("survey package for the provided id does not exist")
+
+        try:
+            snapshot = survey_package.snapshot
+        except PackageSnapshot.DoesNotExist:
+            snapshot = None
+        if (
+            snapshot is not None
+            and snapshot.structure_version == survey_package.structure_version
+        ):
+            data = json.loads(snapshot.content)
+            # The snapshot keeps no storage url, which may be signed and expire
+            data["logo"] = logo_url(survey_package.logo.name)
+            return data
+
+        data = PackageTreeLoader.load_package(survey_package.id)
+        try:
+            with transaction.atomic():
+                PackageSnapshot.objects.update_or_create(
+                    survey_package_id=survey_package.id,
+                    defaults=dict(
+                        structure_version=survey_package.structure_version,
+                        content=json.dumps(
+                            dict(data, logo=None),
+                            cls=DjangoJSONEncoder,
+                            ensure_ascii=False,
+                        ),
+                    ),
+                )
+        except IntegrityError:
+            # Stored concurrently by another request
+            pass
+
+        return data
+
+
 class ResponseExportService(object):
-    def __init__(self, workspace: Workspace, survey_package: SurveyPackage):
+    HEADER = ["워크스페이스", "설문 제목", "차시 (일)", "응답 지정 일시", "피험자ID"]
+
+    def __init__(
+        self,
+        workspace: Workspace,
+        survey_package: SurveyPackage,
+        respondent_range: Optional[tuple[int, int]] = None,
+    ):
+        """
+        `respondent_range` limits the export to respondents whose
+        Respondent.id is in (start, end]
+        """
         self.workspace = workspace
         self.survey_package = survey_package
-        self.respondents = None
-        self.workbook = None
-        self.worksheet = None
-        self._col_num = 6
+        self.respondent_range = respondent_range
+
+    def _get_respondents(self) -> QuerySet:
+        respondents = Respondent.objects.filter(
+            survey_package_id=self.survey_package.id, workspace_id=self.workspace.id
+        )
+        if self.respondent_range is not None:
+            start, end = self.respondent_range
+            respondents = respondents.filter(id__gt=start, id__lte=end)
+
+        return respondents
 
     def _base_data(self) -> list[Union[str, int]]:
         routine_id: int = self.workspace.routine.id
@@ -113,280 +283,685 @@ class ResponseExportService(object):
 
         return [workspace_name, package_name, nth_day, time]
 
-    def _create_worksheet_template(self) -> Worksheet:
-        wb: Workbook = Workbook()
-        self.workbook = wb
-        ws: Worksheet = wb.active
-        self.worksheet = ws
-
-        self.worksheet.append(["워크스페이스", "설문 제목", "차시 (일)", "응답 지정 일시", "피험자ID"])
-        self.worksheet.append(self._base_data())
-        respondent_list = self._set_respondents_list()
-
-        i = 0
-        for row in self.worksheet.iter_rows(
-            min_row=2, min_col=5, max_col=5, max_row=len(respondent_list) + 1
-        ):
-            for cell in row:
-                cell.value = respondent_list[i]
-            i += 1
+    def get_columns(self) -> list[tuple[str, int, str]]:
+        """
+        Returns (header, question id, question type) of every question column,
+        in the order of the package structure
+        """
+        return PackageColumnLayoutService.get(self.survey_package)
+
+    def iter_rows(self, repeat_base_data: bool = False) -> Iterator[list]:
+        """
+        Yields the header and then one row per respondent. The workspace and
+        routine columns are only filled on the first row unless `repeat_base_data`
+        """
+        columns = self.get_columns()
+        if not columns:
+            raise InstanceNotFound("no response data")
 
-        return self.worksheet
+        yield self.HEADER + [header for header, _, _ in columns]
 
-    def _set_respondents_list(self) -> list[dict]:
-        respondents: list[dict] = (
-            Respondent.objects.filter(
-                survey_package_id=self.survey_package.id, workspace_id=self.workspace.id
+        columns = [
+            (question_id, question_type) for _, question_id, question_type in columns
+        ]
+        if self.respondent_range is None:
+            builders = [
+                ResponseMatrixBuilder(
+                    self.workspace.id, self.survey_package.id, columns
+                )
+            ]
+        else:
+            builders = (
+                ResponseMatrixBuilder(
+                    self.workspace.id,
+                    self.survey_package.id,
+                    columns,
+                    respondent_ids=respondent_ids,
+                )
+                for respondent_ids in self._iter_respondent_batches()
             )
-            .order_by("respondent_id")
-            .all()
+
+        base_data = self._base_data()
+        for builder in builders:
+            for respondent_id, answers in builder.iter_rows():
+                yield base_data + [respondent_id] + answers
+                if not repeat_base_data:
+                    base_data = [None] * len(base_data)
+
+    def _iter_respondent_batches(self, size: int = 1000) -> Iterator[list[str]]:
+        respondent_ids = (
+            self._get_respondents()
+            .order_by("id")
             .values_list("respondent_id", flat=True)
-        )
-        self.respondents = respondents
-
-        return self.respondents
-
-    def _add_sector_data(self, sector_data, prefix):
-        question_type = sector_data.question_type
-        questions = sector_data.questions.all()
-
-        for question in questions:
-            col_letter = openpyxl.utils.cell.get_column_letter(self._col_num)
-
-            # bread crumb format question number
-            if self.worksheet[f"{col_letter}1"].value is None:
-                formatted_question_number = str(question.number)
-
-                if formatted_question_number[-1] != "0":
-                    formatted_question_number = formatted_question_number.replace(
-                        ".", "-"
-                    )
-                else:
-                    dot_index = formatted_question_number.index(".")
-                    formatted_question_number = formatted_question_number[:dot_index]
-
-                self.worksheet[
-                    f"{col_letter}1"
-                ] = f"{prefix}-{formatted_question_number}"
-
-            print(self.respondents, question.answers.count())
-            if len(self.respondents) != question.answers.count():
-                raise InternalServerError()
-
-            row = 2
-            for answer in question.answers.all():
-                answer_val = answer.answer
-                if "$" in answer_val:
-                    answer_val = answer_val.replace("$", ", ")
-
-                if question_type in ["likert", "extent", "single_select"]:
-                    try:
-                        answer_val = int(answer_val)
-                        self.worksheet[f"{col_letter}{row}"].number_format = "0"
-                        self.worksheet[f"{col_letter}{row}"].value = answer_val
-                    except Exception:
-                        pass
-
-                self.worksheet[f"{col_letter}{row}"] = answer_val
-
-                row += 1
-
-            self._col_num += 1
-
-    def _add_survey_data(self, survey_data, prefix):
-        if survey_data.number and survey_data.number != "":
-            prefix = f"{prefix}-{survey_data.number}"
-
-        survey = survey_data.survey
-        prefix = f"{prefix}-{survey.abbr}"
-
-        sectors = survey.sectors.all()
-
-        for sector in sectors:
-            self._add_sector_data(sector, prefix)
-
-    def _add_subject_data(self, subject_data):
-        prefix = f"{subject_data.number}"
-        for survey in subject_data.surveys.all():
-            self._add_survey_data(survey, prefix)
-
-    def _add_part_data(self, part_data: PackagePart):
-        print(part_data.subjects)
-        for subject in part_data.subjects.all():
-            self._add_subject_data(subject)
-
-    def export_to_worksheet(self):
-        self._create_worksheet_template()
-
-        queryset: QuerySet = PackagePart.objects.filter(
-            survey_package_id=self.survey_package.id
-        ).prefetch_related(
-            Prefetch(
-                "subjects",
-                queryset=PackageSubject.objects.prefetch_related(
-                    Prefetch(
-                        "surveys",
-                        queryset=PackageSubjectSurvey.objects.select_related(
-                            "survey"
-                        ).prefetch_related(
-                            Prefetch(
-                                "survey__sectors",
-                                queryset=SurveySector.objects.prefetch_related(
-                                    Prefetch(
-                                        "questions",
-                                        queryset=SectorQuestion.objects.prefetch_related(
-                                            Prefetch(
-                                                "answers",
-                                                queryset=QuestionAnswer.objects.filter(
-                                                    survey_package_id=self.survey_package.id
-                                                ).order_by("respondent_id"),
-                                            )
-                                        ).order_by(
-                                            "number"
-                                        ),
-                                    )
-                                ),
-                            )
-                        ),
-                    )
-                ),
-            )
+            .iterator(chunk_size=size)
         )
 
-        if queryset.count() == 0:
-            raise InstanceNotFound("no response data")
+        batch = []
+        for respondent_id in respondent_ids:
+            batch.append(respondent_id)
+            if len(batch) == size:
+                yield batch
+                batch = []
 
-        for part in queryset:
-            self._add_part_data(part)
+        if batch:
+            yield batch
 
-        return self.workbook
+    def count_rows(self) -> int:
+        return self._get_respondents().count()
+
+    def stream(self, export_format: str) -> Iterator[bytes]:
+        """
+        Encodes the rows as csv or gzipped ndjson while they are read
+        """
+        rows = self.iter_rows(repeat_base_data=True)
+        # Taken here so a missing package fails before the response starts
+        header = next(rows)
+
+        if export_format == "csv":
+            return self._iter_csv(header, rows)
+        return self._iter_ndjson_gz(header, rows)
+
+    @staticmethod
+    def _iter_csv(header: list, rows: Iterator[list]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        # The BOM lets Excel read the file as utf-8
+        yield codecs.BOM_UTF8
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= STREAM_CHUNK_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def _iter_ndjson_gz(header: list, rows: Iterator[list]) -> Iterator[bytes]:
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+
+        # A survey used twice under one subject repeats its column labels
+        keys = []
+        seen = {}
+        for label in header:
+            seen[label] = seen.get(label, 0) + 1
+            keys.append(label if seen[label] == 1 else f"{label}#{seen[label]}")
+
+        for row in rows:
+            line = json.dumps(dict(zip(keys, row)), ensure_ascii=False, default=str)
+            chunk = compressor.compress(f"{line}\n".encode("utf-8"))
+            if chunk:
+                yield chunk
+
+        yield compressor.flush()
+
+    def export_to_file(
+        self, file: IO[bytes], on_progress: Optional[Callable[[int], None]] = None
+    ) -> None:
+        """
+        Writes the workbook row by row in write-only mode,
+        so only the current row is held in memory
+        """
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+
+        for written, row in enumerate(self.iter_rows()):
+            worksheet.append(row)
+            if on_progress is not None and written and written % 500 == 0:
+                on_progress(written)
+
+        workbook.save(file)
 
 
 class SurveyPackageExportService(object):
+    HEADER = ["구분", "대주제", "소주제", "문제유형", "연결섹터여부", "공통선지", "문항번호", "문항내용", "문항선지"]
+
     def __init__(self, survey_package_id: int):
         self.survey_package_id = survey_package_id
-        self.workbook = None
-        self.worksheet = None
-
-    def _get_queryset(self):
-        return PackagePart.objects.filter(
-            survey_package_id=self.survey_package_id
-        ).prefetch_related(
-            Prefetch(
-                "subjects",
-                queryset=PackageSubject.objects.prefetch_related(
-                    Prefetch(
-                        "surveys",
-                        queryset=PackageSubjectSurvey.objects.select_related(
-                            "survey"
-                        ).prefetch_related(
-                            Prefetch(
-                                "survey__sectors",
-                                queryset=SurveySector.objects.prefetch_related(
-                                    "common_choices",
-                                    Prefetch(
-                                        "questions",
-                                        queryset=SectorQuestion.objects.prefetch_related(
-                                            "choices"
-                                        ),
-                                    ),
+
+    @staticmethod
+    def _format_choice(choice: dict) -> str:
+        content = choice["content"] or ""
+        if choice["is_descriptive"]:
+            content += choice["desc_form"] or ""
+
+        content = content.replace("%d", "[숫자]")
+        content = content.replace("%s", "[문자]")
+
+        return f"{choice['number']}. {content}"
+
+    def iter_rows(self) -> Iterator[list]:
+        """
+        Yields the header and then one row per question,
+        reading choices only from the loaded tree
+        """
+        parts = PackageTreeLoader.load_parts(survey_package_id=self.survey_package_id)
+
+        header_yielded = False
+        for part in parts:
+            if not header_yielded:
+                yield self.HEADER
+                header_yielded = True
+
+            for subject in part["subjects"]:
+                for subject_survey in subject["surveys"]:
+                    subject_survey_title = subject_survey["title"] or ""
+
+                    for sector in subject_survey["survey"]["sectors"]:
+                        is_linked = "Y" if sector["is_linked"] is True else "N"
+                        common_choices = "/".join(
+                            f"{c['number']}. {c['content']}"
+                            for c in sector["common_choices"]
+                        )
+
+                        for question in sector["questions"]:
+                            yield [
+                                part["title"],
+                                subject["title"],
+                                subject_survey_title,
+                                sector["question_type"],
+                                is_linked,
+                                common_choices,
+                                question["number"],
+                                question["content"],
+                                "/".join(
+                                    self._format_choice(c) for c in question["choices"]
                                 ),
-                            )
-                        ),
-                    )
-                ),
+                            ]
+
+        if not header_yielded:
+            raise InstanceNotFound("no data below this survey package")
+
+    def count_rows(self) -> int:
+        return SectorQuestion.objects.filter(
+            sector__survey__survey_content__subject__package_part__survey_package_id=self.survey_package_id
+        ).count()
+
+    def export_to_file(
+        self, file: IO[bytes], on_progress: Optional[Callable[[int], None]] = None
+    ) -> None:
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet()
+
+        for row in self.iter_rows():
+            worksheet.append(row)
+
+        workbook.save(file)
+
+
+class ResponseExportCursor(object):
+    """
+    Position of an incremental responses export, handed out as a signed token.
+    Respondents are taken up to the highest id that is older than
+    EXPORT_CURSOR_SAFETY_LAG, so a submission whose transaction commits after
+    one with a higher id is not skipped.
+    """
+
+    SALT = "survey_packages.response_export_cursor"
+
+    def __init__(
+        self, workspace_id: int, survey_package_id: int, last_respondent_id: int = 0
+    ):
+        self.workspace_id = workspace_id
+        self.survey_package_id = survey_package_id
+        self.last_respondent_id = last_respondent_id
+
+    @classmethod
+    def load(
+        cls, token: str, workspace_id: int, survey_package_id: int
+    ) -> "ResponseExportCursor":
+        # An empty token starts from the first respondent
+        if token == "":
+            return cls(workspace_id, survey_package_id)
+
+        try:
+            data = signing.loads(token, salt=cls.SALT)
+        except signing.BadSignature:
+            raise InvalidInputException("invalid cursor")
+
+        if data["w"] != workspace_id or data["p"] != survey_package_id:
+            raise InvalidInputException(
+                "cursor does not belong to this survey package and workspace"
             )
-        )
 
-    def _create_worksheet_template(self) -> None:
-        wb: Workbook = Workbook()
-        self.workbook = wb
-        ws: Worksheet = wb.active
-        self.worksheet = ws
+        return cls(workspace_id, survey_package_id, data["r"])
+
+    def dumps(self) -> str:
+        return signing.dumps(
+            dict(
+                w=self.workspace_id, p=self.survey_package_id, r=self.last_respondent_id
+            ),
+            salt=self.SALT,
+        )
 
-        self.worksheet.append(
-            ["구분", "대주제", "소주제", "문제유형", "연결섹터여부", "공통선지", "문항번호", "문항내용", "문항선지"]
+    def advance(self) -> "ResponseExportCursor":
+        last_respondent_id = Respondent.objects.filter(
+            workspace_id=self.workspace_id,
+            survey_package_id=self.survey_package_id,
+            id__gt=self.last_respondent_id,
+            created_at__lte=datetime.now()
+            - timedelta(seconds=settings.EXPORT_CURSOR_SAFETY_LAG),
+        ).aggregate(max_id=Max("id"))["max_id"]
+
+        return ResponseExportCursor(
+            self.workspace_id,
+            self.survey_package_id,
+            last_respondent_id or self.last_respondent_id,
         )
 
-    def _add_row(self, row_data: dict):
-        self.worksheet.append(list(row_data.values()))
 
-    def _add_question(self, question_data: SectorQuestion, row_data: dict):
-        row_data = dict(
-            **row_data,
-            question_number=question_data.number,
-            question_content=question_data.content,
+def build_response_frame(workspace_id: int, survey_package_id: int) -> pd.DataFrame:
+    """
+    Respondent x question frame of one package, labelled with the column headers
+    of the responses export. Runs in export worker processes, so it takes ids only
+    """
+    columns = PackageColumnLayoutService.get(
+        SurveyPackage.objects.get(id=survey_package_id)
+    )
+    headers = [header for header, _, _ in columns]
+
+    builder = ResponseMatrixBuilder(
+        workspace_id,
+        survey_package_id,
+        [(question_id, question_type) for _, question_id, question_type in columns],
+    )
+    frames = list(builder.iter_frames())
+    if not frames:
+        return pd.DataFrame(columns=headers)
+
+    frame = pd.concat(frames)
+    frame.columns = headers
+    return frame
+
+
+class WorkspaceExportService(object):
+    LAYOUTS = ["sheets", "wide"]
+
+    def __init__(
+        self, workspace: Workspace, layout: str = "sheets", pool_size: int = None
+    ):
+        if layout not in self.LAYOUTS:
+            raise InvalidInputException("layout must be either 'sheets' or 'wide'")
+
+        self.workspace = workspace
+        self.layout = layout
+        self.pool_size = (
+            pool_size if pool_size is not None else settings.EXPORT_PROCESS_POOL_SIZE
         )
 
-        question_choices = question_data.choices.all()
+    def get_days(self) -> list[tuple[str, int]]:
+        """
+        Returns (label, survey package id) of every day of the routine
+        """
+        routine_details = (
+            RoutineDetail.objects.filter(
+                routine__workspace_id=self.workspace.id, survey_package__isnull=False
+            )
+            .order_by("nth_day", "time")
+            .values_list("nth_day", "time", "survey_package_id")
+        )
 
-        question_choice_str = ""
-        if question_choices is not None or question_data.choices.count() != 0:
-            for choice in question_data.choices.all():
-                content = ""
-                if choice.content is not None:
-                    content += choice.content
-                if choice.is_descriptive:
-                    content += choice.desc_form
+        # Sheet titles cannot contain ':'
+        return [
+            (f"{nth_day}일차 {time.replace(':', '시')}분", survey_package_id)
+            for nth_day, time, survey_package_id in routine_details
+        ]
+
+    def count_rows(self) -> int:
+        return len(self.get_days())
+
+    def _iter_frames(self, days: list[tuple[str, int]]) -> Iterator[pd.DataFrame]:
+        if self.pool_size <= 1:
+            for _, survey_package_id in days:
+                yield build_response_frame(self.workspace.id, survey_package_id)
+            return
+
+        # Workers are spawned, so none inherits the database connections of this one
+        with ProcessPoolExecutor(
+            max_workers=min(self.pool_size, len(days)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as pool:
+            futures = [
+                pool.submit(build_response_frame, self.workspace.id, survey_package_id)
+                for _, survey_package_id in days
+            ]
+            for future in futures:
+                yield future.result()
 
-                content = content.replace("%d", "[숫자]")
-                content = content.replace("%s", "[문자]")
+    @staticmethod
+    def _append_frame(worksheet, frame: pd.DataFrame) -> None:
+        frame = frame.astype(object).where(frame.notna(), None)
+        worksheet.append(["피험자ID"] + list(frame.columns))
+        for respondent_id, answers in zip(frame.index, frame.values.tolist()):
+            worksheet.append([respondent_id] + answers)
+
+    def export_to_file(
+        self, file: IO[bytes], on_progress: Optional[Callable[[int], None]] = None
+    ) -> None:
+        days = self.get_days()
+        if not days:
+            raise InstanceNotFound("no survey package in the routine of this workspace")
+
+        workbook = Workbook(write_only=True)
+        wide_frames = []
+        for done, ((label, _), frame) in enumerate(
+            zip(days, self._iter_frames(days)), start=1
+        ):
+            if self.layout == "sheets":
+                self._append_frame(workbook.create_sheet(label), frame)
+            else:
+                frame.columns = [f"{label}/{header}" for header in frame.columns]
+                wide_frames.append(frame)
+
+            if on_progress is not None:
+                on_progress(done)
+
+        if self.layout == "wide":
+            # Outer join of the days on respondent id
+            self._append_frame(
+                workbook.create_sheet("응답"), pd.concat(wide_frames, axis=1, sort=True)
+            )
 
-                question_choice_str += f"{choice.number}. {content}/"
-            question_choice_str = question_choice_str[:-1]
+        workbook.save(file)
 
-        row_data["question_choices"] = question_choice_str
-        self._add_row(row_data)
 
-    def _add_sector(self, sector: SurveySector, row_data: dict):
-        row_data = dict(**row_data, question_type=sector.question_type)
-        if sector.is_linked is True:
-            row_data["is_linked"] = "Y"
-        else:
-            row_data["is_linked"] = "N"
+def get_export_storage() -> Storage:
+    return import_string(settings.EXPORT_FILE_STORAGE)()
+
+
+class ExportJobService(object):
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or get_export_storage()
+
+    @staticmethod
+    def prepare(
+        user: User,
+        survey_package_id: int,
+        kind: Optional[str],
+        workspace_id: Optional[int] = None,
+    ) -> ExportJob:
+        """
+        Validates an export request and returns its unsaved job
+        """
+        if kind not in ExportJob.Kind.values:
+            raise InvalidInputException(
+                "kind must be either 'responses' or 'structure'"
+            )
+
+        try:
+            survey_package = get_object_or_404(SurveyPackage, id=survey_package_id)
+        except Http404:
+            raise InstanceNotFound("survey package for the provided id does not exist")
 
-        common_choices_str = ""
-        if sector.common_choices is not None:
-            for common_choice in sector.common_choices.all():
-                common_choices_str += (
-                    f"{common_choice.number}. {common_choice.content}/"
+        if kind == ExportJob.Kind.RESPONSES:
+            if type(workspace_id) != int:
+                raise InvalidInputException(
+                    "workspace id is required for a responses export"
                 )
-            common_choices_str = common_choices_str[:-1]
+            if not WorkspaceComposition.objects.filter(
+                survey_package_id=survey_package_id, workspace_id=workspace_id
+            ).exists():
+                raise InstanceNotFound(
+                    "survey package does not exist in the provided workspace"
+                )
+        else:
+            workspace_id = None
+            if not PackagePart.objects.filter(
+                survey_package_id=survey_package_id
+            ).exists():
+                raise InstanceNotFound("no data below this survey package")
+
+        package_name = survey_package.title.replace(" ", "_")
+        return ExportJob(
+            kind=kind,
+            survey_package=survey_package,
+            workspace_id=workspace_id,
+            requested_by=user,
+            file_name=f'{package_name}-{datetime.now().strftime("%Y%m%d%H%M")}.xlsx',
+            cache_key=ExportJobService.get_cache_key(
+                kind, survey_package, workspace_id
+            ),
+        )
+
+    @staticmethod
+    def create(
+        user: User,
+        survey_package_id: int,
+        kind: Optional[str],
+        workspace_id: Optional[int] = None,
+    ) -> ExportJob:
+        job = ExportJobService.prepare(user, survey_package_id, kind, workspace_id)
+
+        # An equal export that is queued, running or stored is handed out instead
+        reusable = ExportJobService.find_reusable(job.cache_key, include_queued=True)
+        if reusable is not None:
+            return reusable
+
+        job.save()
+        return job
+
+    def export_now(
+        self,
+        user: User,
+        survey_package_id: int,
+        workspace_id: Optional[int] = None,
+        kind: str = ExportJob.Kind.RESPONSES,
+    ) -> ExportJob:
+        """
+        Returns a finished export, built in the request
+        unless a stored one has the same content
+        """
+        job = self.prepare(user, survey_package_id, kind, workspace_id)
+
+        reusable = self.find_reusable(job.cache_key)
+        if reusable is not None:
+            return reusable
+
+        job.status = ExportJob.Status.RUNNING
+        job.started_at = datetime.now()
+        job.save()
+
+        job = self.run(job, raise_api_errors=True)
+        if job.status == ExportJob.Status.FAILED:
+            raise InternalServerError(job.error)
+
+        return job
+
+    @staticmethod
+    def get_cache_key(
+        kind: str, survey_package: SurveyPackage, workspace_id: Optional[int]
+    ) -> Optional[str]:
+        """
+        Identifies the content of an export: any new answer, respondent
+        or change to the package structure gives a different key
+        """
+        if kind == ExportJob.Kind.STRUCTURE:
+            content = f"{kind}:{survey_package.id}:{survey_package.structure_version}"
+            return hashlib.sha256(content.encode()).hexdigest()
+        if kind != ExportJob.Kind.RESPONSES:
+            return None
+
+        answer_watermark = QuestionAnswer.objects.filter(
+            workspace_id=workspace_id, survey_package_id=survey_package.id
+        ).aggregate(max_id=Max("id"))["max_id"]
+        respondent_count = Respondent.objects.filter(
+            workspace_id=workspace_id, survey_package_id=survey_package.id
+        ).count()
+
+        content = (
+            f"{kind}:{workspace_id}:{survey_package.id}:"
+            f"{survey_package.structure_version}:{answer_watermark}:{respondent_count}"
+        )
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    @staticmethod
+    def find_reusable(
+        cache_key: Optional[str], include_queued: bool = False
+    ) -> Optional[ExportJob]:
+        if cache_key is None:
+            return None
+
+        reusable = Q(status=ExportJob.Status.DONE, expires_at__gt=datetime.now())
+        if include_queued:
+            reusable |= Q(status=ExportJob.Status.PENDING) | Q(
+                status=ExportJob.Status.RUNNING,
+                started_at__gt=ExportJobService.get_stale_cutoff(),
+            )
+
+        return (
+            ExportJob.objects.filter(cache_key=cache_key)
+            .filter(reusable)
+            .order_by("-id")
+            .first()
+        )
+
+    @staticmethod
+    def get_stale_cutoff() -> datetime:
+        return datetime.now() - timedelta(seconds=settings.EXPORT_JOB_STALE_AFTER)
 
-        row_data["common_choices"] = common_choices_str
+    @staticmethod
+    def create_for_workspace(
+        user: User, workspace_id: int, layout: Optional[str]
+    ) -> ExportJob:
+        try:
+            workspace = get_object_or_404(Workspace, id=workspace_id)
+        except Http404:
+            raise InstanceNotFound("workspace for the provided id does not exist")
+
+        layout = layout or "sheets"
+        if layout not in WorkspaceExportService.LAYOUTS:
+            raise InvalidInputException("layout must be either 'sheets' or 'wide'")
+
+        workspace_name = workspace.name.replace(" ", "_")
+        return ExportJob.objects.create(
+            kind=ExportJob.Kind.WORKSPACE,
+            workspace=workspace,
+            requested_by=user,
+            options=dict(layout=layout),
+            file_name=f'{workspace_name}-{datetime.now().strftime("%Y%m%d%H%M")}.xlsx',
+        )
 
-        for question in sector.questions.all():
-            self._add_question(question, row_data)
+    @staticmethod
+    def get_exporter(
+        job: ExportJob,
+    ) -> Union[
+        ResponseExportService, SurveyPackageExportService, WorkspaceExportService
+    ]:
+        if job.kind == ExportJob.Kind.RESPONSES:
+            return ResponseExportService(job.workspace, job.survey_package)
+        if job.kind == ExportJob.Kind.WORKSPACE:
+            return WorkspaceExportService(job.workspace, job.options["layout"])
+        return SurveyPackageExportService(job.survey_package_id)
 
-    def _add_subject_survey(self, subject_survey: PackageSubjectSurvey, row_data: dict):
-        if subject_survey.title is not None:
-            row_data = dict(**row_data, subject_survey_title=subject_survey.title)
+    @staticmethod
+    def claim_next() -> Optional[ExportJob]:
+        with transaction.atomic():
+            job = (
+                ExportJob.objects.select_for_update(skip_locked=True)
+                .filter(status=ExportJob.Status.PENDING)
+                .order_by("id")
+                .first()
+            )
+            if job is None:
+                return None
+
+            job.status = ExportJob.Status.RUNNING
+            job.started_at = datetime.now()
+            job.save(update_fields=["status", "started_at", "updated_at"])
+
+        return job
+
+    def run(self, job: ExportJob, raise_api_errors: bool = False) -> ExportJob:
+        """
+        Builds and stores the file of a job, failing the job on any error.
+        With `raise_api_errors` an APIException of the exporter, such as a
+        package without data, is raised again once the job is failed.
+        """
+        exporter = self.get_exporter(job)
+
+        error = None
+        try:
+            job.total = exporter.count_rows()
+            job.save(update_fields=["total", "updated_at"])
+
+            with TemporaryFile() as tmp:
+                exporter.export_to_file(
+                    tmp,
+                    on_progress=lambda written: ExportJob.objects.filter(
+                        id=job.id
+                    ).update(progress=written),
+                )
+                tmp.seek(0)
+                job.artifact = self.storage.save(
+                    f"{job.kind}/{job.id}-{job.file_name}", File(tmp)
+                )
+        except Exception as e:
+            logger.exception(f"export job {job.id} failed")
+            error = e
+            job.status = ExportJob.Status.FAILED
+            job.error = str(e)[:200]
         else:
-            row_data = dict(**row_data, subject_survey_title="")
+            job.status = ExportJob.Status.DONE
+            job.progress = job.total or 0
+            job.expires_at = datetime.now() + timedelta(
+                seconds=settings.EXPORT_ARTIFACT_TTL
+            )
 
-        survey = subject_survey.survey
+        job.finished_at = datetime.now()
+        job.save()
 
-        for sector in survey.sectors.all():
-            self._add_sector(sector, row_data)
+        if raise_api_errors and isinstance(error, APIException):
+            raise error
+        return job
 
-    def _add_subject(self, subject: PackageSubject, part_title: str):
-        row_data = dict(part_title=part_title, subject_title=subject.title)
-        for subject_survey in subject.surveys.all():
-            self._add_subject_survey(subject_survey, row_data)
+    def run_next(self) -> Optional[ExportJob]:
+        job = self.claim_next()
+        if job is None:
+            return None
 
-    def _add_part(self, part_data: PackagePart):
-        title = part_data.title
-        for subject in part_data.subjects.all():
-            self._add_subject(subject, title)
+        return self.run(job)
 
-    def export_to_workbook(self):
-        self._create_worksheet_template()
-        queryset = self._get_queryset()
+    @staticmethod
+    def fail_stale() -> int:
+        """
+        Fails the running jobs whose worker stopped before finishing them,
+        so that equal exports are built again instead of waiting on them
+        """
+        return ExportJob.objects.filter(
+            status=ExportJob.Status.RUNNING,
+            started_at__lte=ExportJobService.get_stale_cutoff(),
+        ).update(
+            status=ExportJob.Status.FAILED,
+            error="export job timed out",
+            finished_at=datetime.now(),
+            updated_at=datetime.now(),
+        )
 
-        if queryset.count() == 0:
-            raise InstanceNotFound("no data below this survey package")
+    def purge_expired(self) -> int:
+        expired_jobs = ExportJob.objects.filter(
+            status=ExportJob.Status.DONE, expires_at__lte=datetime.now()
+        )
 
-        for part in queryset:
-            self._add_part(part)
+        purged = 0
+        for job in expired_jobs:
+            if job.artifact is not None:
+                self.storage.delete(job.artifact)
+            job.status = ExportJob.Status.EXPIRED
+            job.artifact = None
+            job.save(update_fields=["status", "artifact", "updated_at"])
+            purged += 1
+
+        return purged
+
+    def open_artifact(self, job: ExportJob) -> File:
+        if job.status == ExportJob.Status.EXPIRED or (
+            job.status == ExportJob.Status.DONE and job.expires_at <= datetime.now()
+        ):
+            raise InstanceNotFound("export artifact has expired")
+        if job.status != ExportJob.Status.DONE:
+            raise ConflictException("export job is not done yet")
 
-        return self.workbook
+        return self.storage.open(job.artifact, "rb")
@@ -0,0 +1,71 @@
+from typing import Iterable
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from apps.survey_packages.models import (
+    SurveyPackage,
+    PackageContact,
+    PackagePart,
+    PackageSubject,
+    PackageSubjectSurvey,
+)
+from apps.surveys.models import Survey
+
+# Sent with `package_ids` whenever a node of a survey package tree is written
+package_structure_changed = Signal()
+
+
+def _packages_using(**lookup) -> set[int]:
+    return set(
+        PackagePart.objects.filter(**lookup)
+        .values_list("survey_package_id", flat=True)
+        .distinct()
+    )
+
+
+def affected_package_ids(instance) -> set[int]:
+    if isinstance(instance, SurveyPackage):
+        return {instance.id}
+    if isinstance(instance, (PackagePart, PackageContact)):
+        return {instance.survey_package_id}
+    if isinstance(instance, PackageSubject):
+        return _packages_using(id=instance.package_part_id)
+    if isinstance(instance, PackageSubjectSurvey):
+        return _packages_using(subjects__id=instance.subject_id)
+    if isinstance(instance, Survey):
+        return _packages_using(subjects__surveys__survey_id=instance.id)
+    return set()
+
+
+def notify_structure_changed(package_ids: Iterable[int]) -> None:
+    package_ids = set(package_ids)
+    if package_ids:
+        package_structure_changed.send(sender=None, package_ids=package_ids)
+
+
+@receiver(post_save, sender=SurveyPackage)
+@receiver(post_save, sender=PackageContact)
+@receiver(post_save, sender=PackagePart)
+@receiver(post_save, sender=PackageSubject)
+@receiver(post_save, sender=PackageSubjectSurvey)
+@receiver(post_save, sender=Survey)
+@receiver(post_delete, sender=SurveyPackage)
+@receiver(post_delete, sender=PackageContact)
+@receiver(post_delete, sender=PackagePart)
+@receiver(post_delete, sender=PackageSubject)
+@receiver(post_delete, sender=PackageSubjectSurvey)
+@receiver(post_delete, sender=Survey)
+def on_package_tree_written(sender, instance, **kwargs):
+    # Sectors, questions and choices are written in bulk by SurveyService,
+    # which notifies once per write instead of once per row
+    notify_structure_changed(affected_package_ids(instance))
+
+
+@receiver(package_structure_changed)
+def bump_structure_version(sender, package_ids, **kwargs):
+    # A queryset update, so no post_save is sent for the package again
+    SurveyPackage.objects.filter(id__in=package_ids).update(
+        structure_version=F("structure_version") + 1
+    )
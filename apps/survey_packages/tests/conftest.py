@@ -108,3 +108,9 @@ def get_package_part_id(db):
 @pytest.fixture(autouse=False, scope="function")
 def get_package_subject_id(db):
     return PackageSubject.objects.filter(title="사회 정서 발달").first().id
+
+
+@pytest.fixture(autouse=False, scope="function")
+def export_storage(settings, tmp_path):
+    settings.EXPORT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+    settings.MEDIA_ROOT = str(tmp_path)
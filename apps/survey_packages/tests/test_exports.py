@@ -0,0 +1,390 @@
+import csv
+import gzip
+import io
+import json
+from io import BytesIO
+
+import openpyxl
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.shortcuts import get_object_or_404
+from django.test.utils import CaptureQueriesContext
+
+from apps.survey_packages.models import (
+    ExportJob,
+    PackageColumnLayout,
+    SurveyPackage,
+)
+from apps.survey_packages.services import PackageColumnLayoutService
+from apps.surveys.models import SectorQuestion, SurveySector
+from apps.surveys.services import SurveyService
+from apps.workspaces.models import Workspace
+from apps.workspaces.tests.conftest import *
+
+base_url = "/api/survey-packages/"
+
+
+@pytest.fixture(autouse=False, scope="function")
+def submit_answers(client_request, db):
+    workspace = get_object_or_404(Workspace, id=999)
+    answers = [
+        dict(question_id=q.id, answer="1")
+        for q in SectorQuestion.objects.filter(sector__survey_id=999)
+    ]
+    for respondent_id in ["respondent1", "respondent2"]:
+        client_request(
+            "post",
+            base_url + "999/answers",
+            dict(key=f"{workspace.uuid}{respondent_id}", answers=answers),
+        )
+
+
+@pytest.mark.django_db
+def test_export_responses_in_background(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    res = client_request(
+        "post", base_url + "999/exports", dict(kind="responses", workspace=999)
+    )
+    assert res.status_code == 202
+    assert res.data["status"] == "pending"
+    job_id = res.data["id"]
+
+    res = client_request("get", base_url + f"exports/{job_id}/download")
+    assert res.status_code == 409
+
+    call_command("run_export_jobs", "--once")
+
+    res = client_request("get", base_url + f"exports/{job_id}")
+    assert res.data["status"] == "done"
+    assert res.data["total"] == 2
+
+    res = client_request("get", base_url + f"exports/{job_id}/download")
+    assert res.status_code == 200
+    rows = list(
+        openpyxl.load_workbook(BytesIO(b"".join(res.streaming_content))).active.values
+    )
+    assert [row[4] for row in rows[1:]] == ["respondent1", "respondent2"]
+
+
+@pytest.mark.django_db
+def test_export_structure_and_expire(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    res = client_request("post", base_url + "999/exports", dict(kind="structure"))
+    job_id = res.data["id"]
+    call_command("run_export_jobs", "--once")
+    assert get_object_or_404(ExportJob, id=job_id).status == ExportJob.Status.DONE
+
+    ExportJob.objects.filter(id=job_id).update(expires_at="2000-01-01 00:00:00")
+    call_command("run_export_jobs", "--once")
+
+    res = client_request("get", base_url + f"exports/{job_id}/download")
+    assert res.status_code == 404
+    assert get_object_or_404(ExportJob, id=job_id).status == ExportJob.Status.EXPIRED
+
+
+@pytest.mark.django_db
+def test_stale_running_export_is_failed(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    res = client_request("post", base_url + "999/exports", dict(kind="structure"))
+    job_id = res.data["id"]
+    ExportJob.objects.filter(id=job_id).update(
+        status=ExportJob.Status.RUNNING, started_at="2000-01-01 00:00:00"
+    )
+
+    res = client_request("post", base_url + "999/exports", dict(kind="structure"))
+    assert res.data["id"] != job_id
+
+    call_command("run_export_jobs", "--once")
+    assert get_object_or_404(ExportJob, id=job_id).status == ExportJob.Status.FAILED
+
+
+@pytest.mark.django_db
+def test_export_responses_requires_workspace(
+    client_request, create_empty_survey_packages
+):
+    res = client_request("post", base_url + "999/exports", dict(kind="responses"))
+
+    assert res.status_code == 400
+    assert ExportJob.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_download_reuses_export_until_new_answers(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    url = base_url + "999/responses/download?workspace=999"
+
+    assert client_request("get", url).status_code == 200
+    assert client_request("get", url).status_code == 200
+    assert ExportJob.objects.count() == 1
+
+    workspace = get_object_or_404(Workspace, id=999)
+    client_request(
+        "post",
+        base_url + "999/answers",
+        dict(
+            key=f"{workspace.uuid}respondent3",
+            answers=[
+                dict(question_id=q.id, answer="1")
+                for q in SectorQuestion.objects.filter(sector__survey_id=999)
+            ],
+        ),
+    )
+    res = client_request("get", url)
+
+    assert ExportJob.objects.count() == 2
+    rows = list(
+        openpyxl.load_workbook(BytesIO(b"".join(res.streaming_content))).active.values
+    )
+    assert len(rows) == 4
+
+
+@pytest.mark.django_db
+def test_download_empty_package(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+):
+    res = client_request("get", base_url + "998/responses/download?workspace=999")
+
+    assert res.status_code == 404
+    assert res.data["detail"] == "no response data"
+
+
+@pytest.mark.django_db
+def test_async_download_is_queued(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    url = base_url + "999/responses/download?workspace=999&async=true"
+
+    res = client_request("get", url)
+    assert res.status_code == 202
+    assert res["Location"] == base_url + f"exports/{res.data['id']}"
+    assert client_request("get", url).data["id"] == res.data["id"]
+
+    call_command("run_export_jobs", "--once")
+    assert client_request("get", url).status_code == 200
+    assert ExportJob.objects.count() == 1
+
+    assert client_request("get", url + "&format=csv").status_code == 400
+    assert client_request("get", url + "&cursor=").status_code == 400
+
+
+@pytest.mark.django_db
+def test_export_cache_follows_structure_version(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    url = base_url + "999/responses/download?workspace=999"
+    client_request("get", url)
+
+    SurveyService(999).notify_structure_changed()
+    client_request("get", url)
+
+    assert ExportJob.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_export_workspace_routine(
+    client_request,
+    settings,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    settings.EXPORT_PROCESS_POOL_SIZE = 1
+    sheets_job = client_request("post", "/api/workspaces/999/exports", dict()).data
+    wide_job = client_request(
+        "post", "/api/workspaces/999/exports", dict(layout="wide")
+    ).data
+
+    call_command("run_export_jobs", "--once")
+
+    res = client_request("get", base_url + f"exports/{sheets_job['id']}/download")
+    workbook = openpyxl.load_workbook(BytesIO(b"".join(res.streaming_content)))
+    assert workbook.sheetnames == ["1일차 09시00분", "2일차 09시00분"]
+    assert [row[0] for row in workbook.worksheets[0].values][1:] == [
+        "respondent1",
+        "respondent2",
+    ]
+
+    res = client_request("get", base_url + f"exports/{wide_job['id']}/download")
+    rows = list(
+        openpyxl.load_workbook(BytesIO(b"".join(res.streaming_content))).active.values
+    )
+    assert rows[0][1].startswith("1일차 09시00분/")
+    assert [row[0] for row in rows[1:]] == ["respondent1", "respondent2"]
+
+
+@pytest.mark.django_db
+def test_download_responses_incrementally(
+    client_request,
+    settings,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    settings.EXPORT_CURSOR_SAFETY_LAG = 0
+    url = base_url + "999/responses/download?workspace=999&cursor="
+
+    def respondents(res):
+        content = BytesIO(b"".join(res.streaming_content))
+        return [row[4] for row in openpyxl.load_workbook(content).active.values][1:]
+
+    res = client_request("get", url)
+    assert respondents(res) == ["respondent1", "respondent2"]
+    cursor = res.headers["X-Export-Cursor"]
+
+    workspace = get_object_or_404(Workspace, id=999)
+    client_request(
+        "post",
+        base_url + "999/answers",
+        dict(
+            key=f"{workspace.uuid}respondent3",
+            answers=[
+                dict(question_id=q.id, answer="1")
+                for q in SectorQuestion.objects.filter(sector__survey_id=999)
+            ],
+        ),
+    )
+    res = client_request("get", url + cursor)
+    assert respondents(res) == ["respondent3"]
+
+    res = client_request("get", url + res.headers["X-Export-Cursor"])
+    assert respondents(res) == []
+
+    assert client_request("get", url + cursor[:-1]).status_code == 400
+
+
+@pytest.mark.django_db
+def test_download_responses_as_csv_and_ndjson(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    submit_answers,
+):
+    url = base_url + "999/responses/download?workspace=999&format="
+
+    res = client_request("get", url + "csv")
+    assert res.status_code == 200
+    rows = list(
+        csv.reader(io.StringIO(b"".join(res.streaming_content).decode("utf-8-sig")))
+    )
+
+    res = client_request("get", url + "ndjson.gz")
+    assert res.status_code == 200
+    lines = gzip.decompress(b"".join(res.streaming_content)).decode().splitlines()
+    objects = [json.loads(line) for line in lines]
+
+    assert [row[4] for row in rows[1:]] == ["respondent1", "respondent2"]
+    assert [o["피험자ID"] for o in objects] == ["respondent1", "respondent2"]
+    assert len(objects[0]) == len(rows[0])
+    assert list(objects[0].keys())[:6] == rows[0][:6]
+    assert objects[1]["워크스페이스"] == rows[2][0] == "workspace1"
+
+    assert client_request("get", url + "pdf").status_code == 400
+
+
+@pytest.mark.django_db
+def test_column_layout_stored_per_structure_version(
+    create_empty_survey_packages, compose_empty_survey_package
+):
+    package = get_object_or_404(SurveyPackage, id=999)
+    columns = PackageColumnLayoutService.get(package)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert PackageColumnLayoutService.get(package) == columns
+    assert not any('"package_part"' in q["sql"] for q in queries.captured_queries)
+
+    sector = SurveySector.objects.filter(survey_id=999).first()
+    question = SectorQuestion.objects.create(sector=sector, number=99, content="new")
+    SurveyService(999).notify_structure_changed()
+    package.refresh_from_db()
+
+    assert question.id in [c[1] for c in PackageColumnLayoutService.get(package)]
+    assert PackageColumnLayout.objects.get(survey_package_id=999).structure_version == (
+        package.structure_version
+    )
+
+
+@pytest.mark.django_db
+def test_download_structure_cached_per_structure_version(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    url = base_url + "999/download"
+
+    res = client_request("get", url)
+    assert res.status_code == 200
+    rows = list(
+        openpyxl.load_workbook(BytesIO(b"".join(res.streaming_content))).active.values
+    )
+    assert rows[0][0] == "구분"
+    assert (
+        len(rows)
+        == 1
+        + SectorQuestion.objects.filter(
+            sector__survey__survey_content__subject__package_part__survey_package_id=999
+        ).count()
+    )
+
+    client_request("get", url)
+    assert ExportJob.objects.count() == 1
+
+    SurveyService(999).notify_structure_changed()
+    client_request("get", url)
+    assert ExportJob.objects.count() == 2
+
+    assert client_request("get", base_url + "998/download").status_code == 404
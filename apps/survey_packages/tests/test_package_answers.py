@@ -0,0 +1,551 @@
+import json
+from io import BytesIO
+
+import openpyxl
+import pytest
+from django.core.management import call_command
+from django.shortcuts import get_object_or_404
+from rest_framework.test import APIClient
+
+from apps.survey_packages.matrix import ResponseMatrixBuilder, NUMERIC_QUESTION_TYPES
+from apps.survey_packages.models import Respondent, SurveyPackage
+from apps.survey_packages.services import ResponseExportService
+from apps.users.models import User
+from apps.survey_packages.validators import PackageAnswerValidator
+from apps.surveys.models import QuestionAnswer, SectorQuestion, SurveySector
+from apps.surveys.services import AnswerSpoolService, SurveyService
+from apps.workspaces.models import Workspace
+from apps.workspaces.tests.conftest import *
+from config.exceptions import InvalidInputException
+
+base_url = "/api/survey-packages/"
+
+
+@pytest.fixture(autouse=False, scope="function")
+def sample_answers_data(db):
+    return [
+        dict(question_id=q.id, answer="1")
+        for q in SectorQuestion.objects.filter(sector__survey_id=999)
+    ]
+
+
+@pytest.mark.django_db
+def test_create_answers(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    data = dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data)
+    res = client_request("post", url, data)
+
+    assert res.status_code == 201
+    assert len(res.data["answers"]) == len(sample_answers_data)
+    assert QuestionAnswer.objects.filter(
+        survey_package_id=999, respondent_id="respondent1"
+    ).count() == len(sample_answers_data)
+    assert Respondent.objects.filter(respondent_id="respondent1").count() == 1
+    assert [a["id"] for a in res.data["answers"]] == list(
+        QuestionAnswer.objects.filter(respondent_id="respondent1")
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_create_answers_with_unknown_question(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    data = dict(
+        key=f"{workspace.uuid}respondent1",
+        answers=sample_answers_data + [dict(question_id=123456789, answer="1")],
+    )
+    res = client_request("post", url, data)
+
+    assert res.status_code == 404
+    assert QuestionAnswer.objects.filter(respondent_id="respondent1").count() == 0
+
+
+@pytest.mark.django_db
+def test_resubmit_answers_with_idempotency_key(
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    client = APIClient()
+    client.force_authenticate(get_object_or_404(User, id=999))
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    data = json.dumps(
+        dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data)
+    )
+
+    first = client.post(
+        url, data, content_type="application/json", HTTP_IDEMPOTENCY_KEY="retry-1"
+    )
+    second = client.post(
+        url, data, content_type="application/json", HTTP_IDEMPOTENCY_KEY="retry-1"
+    )
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.data == first.data
+    assert QuestionAnswer.objects.filter(respondent_id="respondent1").count() == len(
+        sample_answers_data
+    )
+
+    # The key does not replay the response of another package, nor write to it
+    other = client.post(
+        base_url + "998/answers",
+        json.dumps(dict(key=f"{workspace.uuid}respondent1", answers=[])),
+        content_type="application/json",
+        HTTP_IDEMPOTENCY_KEY="retry-1",
+    )
+    assert other.status_code == 409
+    assert (
+        other.data["detail"]
+        == "Idempotency-Key was already used for another survey package"
+    )
+    assert not Respondent.objects.filter(survey_package_id=998).exists()
+
+
+@pytest.mark.django_db
+def test_duplicate_submission_writes_nothing(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    data = dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data)
+
+    client_request("post", url, data)
+    res = client_request("post", url, data)
+
+    assert res.status_code == 409
+    assert QuestionAnswer.objects.filter(respondent_id="respondent1").count() == len(
+        sample_answers_data
+    )
+
+
+@pytest.mark.django_db
+def test_spool_answers_and_drain(
+    client_request,
+    settings,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    settings.ANSWER_INGESTION_MODE = "spool"
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+
+    for respondent_id in ["respondent1", "respondent2"]:
+        data = dict(key=f"{workspace.uuid}{respondent_id}", answers=sample_answers_data)
+        res = client_request("post", url, data)
+        assert res.status_code == 202
+
+    duplicate = client_request(
+        "post",
+        url,
+        dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data),
+    )
+
+    assert duplicate.status_code == 409
+    assert QuestionAnswer.objects.count() == 0
+    assert AnswerSpoolService.metrics()["depth"] == 2
+
+    call_command("drain_answer_spool", "--once")
+
+    assert AnswerSpoolService.metrics()["depth"] == 0
+    assert Respondent.objects.filter(survey_package_id=999).count() == 2
+    assert QuestionAnswer.objects.count() == 2 * len(sample_answers_data)
+
+
+@pytest.mark.django_db
+def test_create_answers_in_batch(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "answers/batch"
+    data = dict(
+        submissions=[
+            dict(
+                key=f"{workspace.uuid}respondent1",
+                package=999,
+                answers=sample_answers_data,
+            ),
+            dict(
+                key=f"{workspace.uuid}respondent2",
+                package=999,
+                answers=sample_answers_data,
+            ),
+            dict(
+                key=f"{workspace.uuid}respondent1",
+                package=999,
+                answers=sample_answers_data,
+            ),
+            dict(
+                key=f"{workspace.uuid}respondent3",
+                package=998,
+                answers=sample_answers_data,
+            ),
+            dict(
+                key="notaworkspaceuuid00000respondent1",
+                package=999,
+                answers=sample_answers_data,
+            ),
+        ]
+    )
+    res = client_request("post", url, data)
+
+    assert res.status_code == 200
+    assert [r["status"] for r in res.data["results"]] == [
+        "created",
+        "created",
+        "duplicate",
+        "invalid",
+        "invalid",
+    ]
+    assert Respondent.objects.filter(survey_package_id=999).count() == 2
+    assert QuestionAnswer.objects.count() == 2 * len(sample_answers_data)
+
+
+@pytest.mark.django_db
+def test_create_answers_with_invalid_choice(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    likert_question = SectorQuestion.objects.filter(
+        sector__survey_id=999, sector__question_type="likert"
+    ).first()
+    answers = [
+        dict(question_id=a["question_id"], answer="9")
+        if a["question_id"] == likert_question.id
+        else a
+        for a in sample_answers_data
+    ]
+    url = base_url + "999/answers"
+    data = dict(key=f"{workspace.uuid}respondent1", answers=answers)
+    res = client_request("post", url, data)
+
+    assert res.status_code == 400
+    assert QuestionAnswer.objects.filter(respondent_id="respondent1").count() == 0
+
+
+@pytest.mark.django_db
+def test_create_answers_for_question_outside_package(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "998/answers"
+    data = dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data)
+    res = client_request("post", url, data)
+
+    assert res.status_code == 404
+    assert QuestionAnswer.objects.filter(respondent_id="respondent1").count() == 0
+
+
+@pytest.mark.django_db
+def test_answer_validator_invalidated_on_package_change(
+    create_empty_survey_packages, compose_empty_survey_package
+):
+    validator = PackageAnswerValidator.for_package(999)
+    sector = SurveySector.objects.filter(survey_id=999).first()
+    question = SectorQuestion.objects.create(sector=sector, number=99, content="new")
+    SurveyService(999).notify_structure_changed()
+
+    assert question.id not in validator.questions
+    assert question.id in PackageAnswerValidator.for_package(999).questions
+
+
+@pytest.mark.django_db
+def test_hot_queries_use_indexes(
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+):
+    call_command("explain_hot_queries", "--package", "999", "--workspace", "999")
+
+
+@pytest.mark.django_db
+def test_download_answers(
+    client_request,
+    export_storage,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    client_request(
+        "post",
+        url,
+        dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data),
+    )
+    client_request(
+        "post",
+        url,
+        dict(key=f"{workspace.uuid}respondent2", answers=sample_answers_data[1:]),
+    )
+
+    res = client_request("get", base_url + "999/responses/download?workspace=999")
+    assert res.status_code == 200
+
+    rows = list(
+        openpyxl.load_workbook(BytesIO(b"".join(res.streaming_content))).active.values
+    )
+    columns = ResponseExportService(
+        workspace, get_object_or_404(SurveyPackage, id=999)
+    ).get_columns()
+    skipped = 5 + [c[1] for c in columns].index(sample_answers_data[0]["question_id"])
+
+    assert len(rows) == 3
+    assert len(rows[0]) == 5 + len(columns)
+    assert [row[4] for row in rows[1:]] == ["respondent1", "respondent2"]
+    assert rows[1][skipped] == 1
+    assert rows[2][skipped] is None
+
+
+@pytest.mark.django_db
+def test_response_matrix_in_chunks(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    for respondent_id in ["respondent2", "respondent1"]:
+        client_request(
+            "post",
+            url,
+            dict(
+                key=f"{workspace.uuid}{respondent_id}", answers=sample_answers_data[1:]
+            ),
+        )
+
+    question_ids = [a["question_id"] for a in sample_answers_data]
+    columns = dict(
+        SectorQuestion.objects.filter(id__in=question_ids).values_list(
+            "id", "sector__question_type"
+        )
+    )
+    builder = ResponseMatrixBuilder(
+        999, 999, [(q, columns[q]) for q in question_ids], chunk_size=1
+    )
+    rows = list(builder.iter_rows())
+
+    assert [respondent_id for respondent_id, _ in rows] == [
+        "respondent1",
+        "respondent2",
+    ]
+    for _, answers in rows:
+        assert answers[0] is None
+        assert all(
+            type(a) == int or columns[q] not in NUMERIC_QUESTION_TYPES
+            for q, a in zip(question_ids[1:], answers[1:])
+        )
+
+
+@pytest.mark.django_db
+def test_response_matrix_keeps_last_answer(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    client_request(
+        "post",
+        base_url + "999/answers",
+        dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data[1:]),
+    )
+
+    # A repeated answer stored before submissions were deduplicated
+    first = QuestionAnswer.objects.filter(respondent_id="respondent1").first()
+    QuestionAnswer.objects.create(
+        survey_package_id=999,
+        workspace_id=999,
+        question_id=first.question_id,
+        respondent_id="respondent1",
+        answer="last",
+    )
+
+    builder = ResponseMatrixBuilder(999, 999, [(first.question_id, "")])
+    assert list(builder.iter_rows()) == [("respondent1", ["last"])]
+
+
+@pytest.mark.django_db
+def test_answer_aggregates_follow_ingestion(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    likert_question = SectorQuestion.objects.filter(
+        sector__survey_id=999, sector__question_type="likert"
+    ).first()
+    url = base_url + "999/answers"
+    for respondent_id, likert_answer in [("respondent1", "1"), ("respondent2", "3")]:
+        answers = [
+            dict(question_id=a["question_id"], answer=likert_answer)
+            if a["question_id"] == likert_question.id
+            else a
+            for a in sample_answers_data
+        ]
+        client_request(
+            "post", url, dict(key=f"{workspace.uuid}{respondent_id}", answers=answers)
+        )
+
+    res = client_request("get", base_url + "999/responses/aggregates?workspace=999")
+    assert res.status_code == 200
+    assert len(res.data) == len(sample_answers_data)
+
+    likert = next(a for a in res.data if a["question"] == likert_question.id)
+    assert likert["response_count"] == 2
+    assert likert["choice_counts"] == {"1": 1, "3": 1}
+    assert likert["mean"] == 2.0
+    assert likert["variance"] == 1.0
+
+    call_command("rebuild_question_aggregates", "--workspace", "999")
+    rebuilt = client_request(
+        "get", base_url + "999/responses/aggregates?workspace=999"
+    ).data
+    assert [dict(a, updated_at=None) for a in rebuilt] == [
+        dict(a, updated_at=None) for a in res.data
+    ]
+
+
+@pytest.mark.django_db
+def test_list_respondents_by_keyset(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = base_url + "999/answers"
+    for respondent_id in ["respondent3", "respondent1", "respondent2"]:
+        client_request(
+            "post",
+            url,
+            dict(key=f"{workspace.uuid}{respondent_id}", answers=sample_answers_data),
+        )
+
+    res = client_request("get", base_url + "999/responses?workspace=999&page_size=2")
+    assert res.status_code == 200
+    assert [r["respondent_id"] for r in res.data["results"]] == [
+        "respondent1",
+        "respondent2",
+    ]
+    assert [a["question"] for a in res.data["results"][0]["answers"]] == [
+        a["question_id"] for a in sample_answers_data
+    ]
+
+    res = client_request("get", res.data["next"])
+    assert [r["respondent_id"] for r in res.data["results"]] == ["respondent3"]
+    assert res.data["next"] is None
+
+    assert client_request("get", base_url + "999/responses").status_code == 400
+
+
+@pytest.mark.django_db
+def test_answers_store_numeric_values(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    add_survey_packages_to_workspace,
+    sample_answers_data,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    client_request(
+        "post",
+        base_url + "999/answers",
+        dict(key=f"{workspace.uuid}respondent1", answers=sample_answers_data),
+    )
+    likert_answers = QuestionAnswer.objects.filter(
+        question__sector__question_type="likert"
+    )
+    assert set(likert_answers.values_list("numeric_value", flat=True)) == {1}
+
+    stored = list(
+        QuestionAnswer.objects.order_by("id").values_list(
+            "numeric_value", "selection_mask"
+        )
+    )
+    QuestionAnswer.objects.update(numeric_value=None, selection_mask=None)
+    call_command("backfill_answer_values", "--batch-size", "2")
+
+    assert (
+        list(
+            QuestionAnswer.objects.order_by("id").values_list(
+                "numeric_value", "selection_mask"
+            )
+        )
+        == stored
+    )
+
+    validator = PackageAnswerValidator(
+        999,
+        {
+            1: (SurveySector.QuestionType.MULTI_SELECT, frozenset(), frozenset()),
+            2: (SurveySector.QuestionType.MULTI_SELECT, frozenset(), frozenset({3})),
+            3: (SurveySector.QuestionType.SINGLE_SELECT, frozenset(), frozenset({2})),
+            4: (SurveySector.QuestionType.SHORT_ANSWER, frozenset(), frozenset()),
+        },
+    )
+    assert validator.parse(1, "1$3") == (None, 0b101)
+    assert validator.parse(2, "3$5") == (None, 0b100)
+    assert validator.parse(3, "2$text") == (2, None)
+    assert validator.parse(4, "1_000") == (None, None)
+    assert validator.parse(1, "1$64") == (None, None)
+    with pytest.raises(InvalidInputException):
+        validator.validate([dict(question_id=1, answer="1$64")])
@@ -1,7 +1,21 @@
-import pytest
+import json
 
-from apps.survey_packages.models import PackagePart, PackageSubject
-from apps.surveys.models import Survey
+import pytest
+from django.db import connection
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from django.test.utils import CaptureQueriesContext
+
+from apps.survey_packages.models import (
+    PackagePart,
+    PackageSnapshot,
+    PackageSubject,
+    SurveyPackage,
+)
+from apps.survey_packages.serializers import SurveyPackageSerializer
+from apps.survey_packages.tree import PackageTreeLoader
+from apps.surveys.models import Survey, SurveySector, SectorQuestion
+from apps.surveys.serializers import SurveySerializer
+from apps.surveys.services import SurveyService
 
 
 @pytest.mark.django_db
@@ -44,6 +58,155 @@ def test_get_survey_package_by_id(
     assert len(res.data["parts"][0]["subjects"]) == 2
 
 
+@pytest.mark.django_db
+def test_get_survey_package_from_snapshot(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    url = "/api/survey-packages/999"
+    first = client_request("get", url)
+
+    with CaptureQueriesContext(connection) as queries:
+        second = client_request("get", url)
+    assert second.data == first.data
+    assert not any('"package_part"' in q["sql"] for q in queries.captured_queries)
+
+    sector = SurveySector.objects.filter(survey_id=999).first()
+    SectorQuestion.objects.create(sector=sector, number=99, content="new")
+    SurveyService(999).notify_structure_changed()
+    res = client_request("get", url)
+
+    assert res.data != first.data
+    assert "new" in [
+        q["content"]
+        for part in res.data["parts"]
+        for subject in part["subjects"]
+        for subject_survey in subject["surveys"]
+        for s in subject_survey["survey"]["sectors"]
+        for q in s["questions"]
+    ]
+
+
+@pytest.mark.django_db
+def test_snapshot_leaves_out_logo_url(client_request, create_empty_survey_packages):
+    SurveyPackage.objects.filter(id=999).update(logo="package_logo/logo.png")
+    url = "/api/survey-packages/999"
+    client_request("get", url)
+    res = client_request("get", url)
+
+    assert res.data["logo"].endswith("package_logo/logo.png")
+    assert "logo.png" not in PackageSnapshot.objects.get(survey_package_id=999).content
+
+
+@pytest.mark.django_db
+def test_package_tree_matches_serializer(
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    for package in SurveyPackage.objects.all():
+        expected = SurveyPackageSerializer(package).data
+
+        with CaptureQueriesContext(connection) as queries:
+            loaded = PackageTreeLoader.load_package(package.id)
+        selects = [q for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+
+        assert json.dumps(loaded) == json.dumps(expected)
+        # One query per table of the tree, however many nodes it has
+        assert len(selects) <= 11
+
+
+@pytest.mark.django_db
+def test_tree_views_render_like_serializers(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    renderer = CamelCaseJSONRenderer()
+
+    res = client_request("get", "/api/survey-packages/999")
+    package = SurveyPackage.objects.get(id=999)
+    assert res.content == renderer.render(SurveyPackageSerializer(package).data)
+
+    res = client_request("get", "/api/surveys/999")
+    survey = Survey.objects.get(id=999)
+    assert res.content == renderer.render(SurveySerializer(survey).data)
+
+
+@pytest.mark.django_db
+def test_get_survey_package_outline(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    url = "/api/survey-packages/999?depth=3&fields=id,title,parts,subjects,surveys,survey,createdAt"
+    with CaptureQueriesContext(connection) as queries:
+        res = client_request("get", url)
+
+    assert res.status_code == 200
+    assert list(res.data.keys()) == ["id", "title", "parts", "created_at"]
+    subject_survey = res.data["parts"][0]["subjects"][0]["surveys"][0]
+    assert list(subject_survey["survey"].keys()) == ["id", "title", "created_at"]
+    assert not any('"survey_sector"' in q["sql"] for q in queries.captured_queries)
+
+    res = client_request("get", "/api/surveys/999?depth=1")
+    assert "questions" not in res.data["sectors"][0]
+
+    res = client_request("get", "/api/survey-packages/999?depth=many")
+    assert res.status_code == 400
+
+
+@pytest.mark.django_db
+def test_get_survey_package_not_modified(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+):
+    package_etag = client_request("get", "/api/survey-packages/999")["ETag"]
+    survey_etag = client_request("get", "/api/surveys/999")["ETag"]
+
+    res = client_request.client.get(
+        "/api/survey-packages/999", HTTP_IF_NONE_MATCH=package_etag
+    )
+    assert res.status_code == 304
+    assert res["ETag"] == package_etag
+
+    sector = SurveySector.objects.filter(survey_id=999).first()
+    SectorQuestion.objects.create(sector=sector, number=99, content="new")
+    SurveyService(999).notify_structure_changed()
+
+    res = client_request.client.get(
+        "/api/survey-packages/999", HTTP_IF_NONE_MATCH=package_etag
+    )
+    assert res.status_code == 200
+    assert res["ETag"] != package_etag
+
+    res = client_request.client.get("/api/surveys/999", HTTP_IF_NONE_MATCH=survey_etag)
+    assert res.status_code == 200
+    assert res["ETag"] != survey_etag
+
+
+@pytest.mark.django_db
+def test_save_keeps_structure_version(
+    create_empty_survey_packages, compose_empty_survey_package
+):
+    package = SurveyPackage.objects.get(id=999)
+    survey = Survey.objects.get(id=999)
+    # Written while the loaded instances above hold the earlier versions
+    SurveyService(999).notify_structure_changed()
+
+    package.title = "renamed"
+    package.save()
+    survey.title = "renamed"
+    survey.save()
+
+    # The later saves bump the versions once more instead of writing theirs back
+    assert SurveyPackage.objects.get(id=999).structure_version == (
+        package.structure_version + 3
+    )
+    assert Survey.objects.get(id=999).structure_version == survey.structure_version + 2
+
+
 @pytest.mark.django_db
 def test_get_all_survey_packages(
     client_request, create_empty_survey, create_empty_survey_packages
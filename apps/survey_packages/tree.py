@@ -0,0 +1,437 @@
+from typing import Optional
+
+from django.db.models import Q, QuerySet
+from djangorestframework_camel_case.settings import api_settings
+from djangorestframework_camel_case.util import camel_to_underscore
+from drf_yasg import openapi
+from rest_framework.fields import DateTimeField
+
+from apps.survey_packages.models import (
+    SurveyPackage,
+    PackageContact,
+    PackagePart,
+    PackageSubject,
+    PackageSubjectSurvey,
+)
+from apps.surveys.models import Survey, SurveySector, SectorQuestion, QuestionChoice
+from apps.users.models import User
+from config.exceptions import InvalidInputException
+
+# Keys of every node in the order the serializers of the node write them
+USER_FIELDS = [
+    "id",
+    "email",
+    "name",
+    "social_provider",
+    "privacy_policy_agreed",
+    "created_at",
+    "updated_at",
+]
+CHOICE_FIELDS = [
+    "id",
+    "created_at",
+    "updated_at",
+    "number",
+    "content",
+    "is_descriptive",
+    "desc_form",
+    "related_sector",
+    "related_question",
+]
+QUESTION_FIELDS = [
+    "id",
+    "sector",
+    "choices",
+    "number",
+    "content",
+    "created_at",
+    "updated_at",
+]
+SECTOR_FIELDS = [
+    "id",
+    "survey",
+    "instruction",
+    "description",
+    "question_type",
+    "common_choices",
+    "questions",
+    "is_linked",
+    "created_at",
+    "updated_at",
+]
+SURVEY_FIELDS = [
+    "id",
+    "title",
+    "description",
+    "abbr",
+    "author",
+    "sectors",
+    "created_at",
+    "updated_at",
+]
+SUBJECT_SURVEY_FIELDS = [
+    "id",
+    "survey",
+    "created_at",
+    "updated_at",
+    "title",
+    "number",
+    "subject",
+]
+SUBJECT_FIELDS = [
+    "id",
+    "surveys",
+    "created_at",
+    "updated_at",
+    "number",
+    "title",
+    "package_part",
+]
+PART_FIELDS = ["id", "subjects", "created_at", "updated_at", "title", "survey_package"]
+CONTACT_FIELDS = [
+    "id",
+    "created_at",
+    "updated_at",
+    "type",
+    "content",
+    "survey_package",
+]
+PACKAGE_FIELDS = [
+    "id",
+    "author",
+    "title",
+    "logo",
+    "access_code",
+    "uuid",
+    "is_closed",
+    "description",
+    "manager",
+    "contacts",
+    "parts",
+    "created_at",
+    "updated_at",
+]
+
+_datetime_field = DateTimeField()
+
+TREE_QUERY_PARAMETERS = [
+    openapi.Parameter(
+        "depth",
+        openapi.IN_QUERY,
+        description="불러올 하위 단계의 수. 생략하면 모든 단계를 불러옵니다",
+        type=openapi.TYPE_INTEGER,
+    ),
+    openapi.Parameter(
+        "fields",
+        openapi.IN_QUERY,
+        description="모든 단계에서 남길 필드, 쉼표로 구분합니다. ex) id,title,parts,subjects",
+        type=openapi.TYPE_STRING,
+    ),
+]
+
+
+def logo_url(name: Optional[str]) -> Optional[str]:
+    return SurveyPackage.logo.field.storage.url(name) if name else None
+
+
+def _expands(depth: Optional[int]) -> bool:
+    return depth is None or depth > 0
+
+
+def _deeper(depth: Optional[int]) -> Optional[int]:
+    return None if depth is None else depth - 1
+
+
+def _keeps(fields: Optional[set[str]], key: str) -> bool:
+    return fields is None or key in fields
+
+
+Nodes = tuple[dict[int, dict], dict[int, dict]]
+
+
+class PackageTreeLoader(object):
+    """
+    Loads survey package and survey trees as plain dicts shaped like the
+    output of their serializers. Every level is read with one `values()`
+    query keyed by the ids of its parents, and attached through id maps.
+
+    `depth` is the number of nested levels to load below the requested
+    nodes and `fields` the keys to keep at every level, the levels and keys
+    left out are not queried.
+    """
+
+    @staticmethod
+    def _rows(
+        queryset: QuerySet,
+        keys: list[str],
+        children: list[str],
+        fields: Optional[set[str]] = None,
+        links: tuple[str, ...] = (),
+        expand: bool = True,
+    ) -> Nodes:
+        """
+        Returns the nodes by id, and by id the column values they were built
+        from. `links` are the columns read to attach the nodes to their parents,
+        the `children` keys are left out unless the nodes are expanded
+        """
+        keys = [k for k in keys if _keeps(fields, k) and (expand or k not in children)]
+        columns = {k for k in keys if k not in children} | {"id", *links}
+
+        rows, values = {}, {}
+        for v in queryset.order_by("id").values(*columns):
+            row = {k: [] if k in children else v[k] for k in keys}
+            for k in ["created_at", "updated_at"]:
+                if k in row:
+                    row[k] = _datetime_field.to_representation(row[k])
+            rows[v["id"]] = row
+            values[v["id"]] = v
+
+        return rows, values
+
+    @staticmethod
+    def _attach(parents: dict[int, dict], children: Nodes, key: str, fk: str):
+        rows, values = children
+        for child_id, child in rows.items():
+            parents[values[child_id][fk]][key].append(child)
+
+    @classmethod
+    def load_users(cls, ids, fields: Optional[set[str]] = None) -> dict[int, dict]:
+        users, _ = cls._rows(User.objects.filter(id__in=ids), USER_FIELDS, [], fields)
+        return users
+
+    @classmethod
+    def _load_surveys(
+        cls, depth: Optional[int], fields: Optional[set[str]], **lookup
+    ) -> Nodes:
+        surveys, survey_values = cls._rows(
+            Survey.objects.filter(**lookup),
+            SURVEY_FIELDS,
+            ["sectors"],
+            fields,
+            ("author",),
+            _expands(depth),
+        )
+        if _keeps(fields, "author"):
+            users = cls.load_users(
+                {v["author"] for v in survey_values.values()}, fields
+            )
+            for survey in surveys.values():
+                survey["author"] = users.get(survey["author"], None)
+
+        if not _expands(depth) or not _keeps(fields, "sectors"):
+            return surveys, survey_values
+        depth = _deeper(depth)
+
+        sectors, sector_values = cls._rows(
+            SurveySector.objects.filter(survey_id__in=surveys.keys()),
+            SECTOR_FIELDS,
+            ["common_choices", "questions"],
+            fields,
+            ("survey",),
+            _expands(depth),
+        )
+        cls._attach(surveys, (sectors, sector_values), "sectors", "survey")
+
+        if not _expands(depth):
+            return surveys, survey_values
+        depth = _deeper(depth)
+
+        # Common choices are on the level of the questions, their choices one below
+        with_common_choices = _keeps(fields, "common_choices")
+        with_choices = (
+            _expands(depth)
+            and _keeps(fields, "questions")
+            and _keeps(fields, "choices")
+        )
+
+        questions = {}
+        if _keeps(fields, "questions"):
+            questions, question_values = cls._rows(
+                SectorQuestion.objects.filter(sector_id__in=sectors.keys()),
+                QUESTION_FIELDS,
+                ["choices"],
+                fields,
+                ("sector",),
+                with_choices,
+            )
+            cls._attach(sectors, (questions, question_values), "questions", "sector")
+
+        if not (with_common_choices or with_choices):
+            return surveys, survey_values
+
+        lookups = Q()
+        if with_common_choices:
+            lookups |= Q(related_sector_id__in=sectors.keys())
+        if with_choices:
+            lookups |= Q(related_question_id__in=questions.keys())
+        choices, choice_values = cls._rows(
+            QuestionChoice.objects.filter(lookups),
+            CHOICE_FIELDS,
+            [],
+            fields,
+            ("related_sector", "related_question"),
+        )
+        for choice_id, choice in choices.items():
+            question_id = choice_values[choice_id]["related_question"]
+            sector_id = choice_values[choice_id]["related_sector"]
+            if with_choices and question_id is not None:
+                questions[question_id]["choices"].append(choice)
+            if with_common_choices and sector_id is not None:
+                sectors[sector_id]["common_choices"].append(choice)
+
+        return surveys, survey_values
+
+    @classmethod
+    def _load_subjects(
+        cls, depth: Optional[int], fields: Optional[set[str]], **lookup
+    ) -> Nodes:
+        subjects, subject_values = cls._rows(
+            PackageSubject.objects.filter(**lookup),
+            SUBJECT_FIELDS,
+            ["surveys"],
+            fields,
+            ("package_part",),
+            _expands(depth),
+        )
+        if not _expands(depth) or not _keeps(fields, "surveys"):
+            return subjects, subject_values
+
+        subject_surveys, subject_survey_values = cls._rows(
+            PackageSubjectSurvey.objects.filter(subject_id__in=subjects.keys()),
+            SUBJECT_SURVEY_FIELDS,
+            [],
+            fields,
+            ("subject", "survey"),
+        )
+        if _keeps(fields, "survey"):
+            # A survey is on the level of the subject survey it is nested in
+            surveys, _ = cls._load_surveys(
+                _deeper(depth),
+                fields,
+                id__in={v["survey"] for v in subject_survey_values.values()},
+            )
+            for subject_survey_id, subject_survey in subject_surveys.items():
+                survey_id = subject_survey_values[subject_survey_id]["survey"]
+                subject_survey["survey"] = surveys[survey_id]
+        cls._attach(
+            subjects, (subject_surveys, subject_survey_values), "surveys", "subject"
+        )
+
+        return subjects, subject_values
+
+    @classmethod
+    def _load_parts(
+        cls, depth: Optional[int], fields: Optional[set[str]], **lookup
+    ) -> Nodes:
+        parts, part_values = cls._rows(
+            PackagePart.objects.filter(**lookup),
+            PART_FIELDS,
+            ["subjects"],
+            fields,
+            ("survey_package",),
+            _expands(depth),
+        )
+        if _expands(depth) and _keeps(fields, "subjects"):
+            cls._attach(
+                parts,
+                cls._load_subjects(
+                    _deeper(depth), fields, package_part_id__in=parts.keys()
+                ),
+                "subjects",
+                "package_part",
+            )
+
+        return parts, part_values
+
+    @classmethod
+    def load_surveys(
+        cls,
+        depth: Optional[int] = None,
+        fields: Optional[set[str]] = None,
+        **lookup,
+    ) -> list[dict]:
+        surveys, _ = cls._load_surveys(depth, fields, **lookup)
+        return list(surveys.values())
+
+    @classmethod
+    def load_subjects(
+        cls,
+        depth: Optional[int] = None,
+        fields: Optional[set[str]] = None,
+        **lookup,
+    ) -> list[dict]:
+        subjects, _ = cls._load_subjects(depth, fields, **lookup)
+        return list(subjects.values())
+
+    @classmethod
+    def load_parts(
+        cls,
+        depth: Optional[int] = None,
+        fields: Optional[set[str]] = None,
+        **lookup,
+    ) -> list[dict]:
+        parts, _ = cls._load_parts(depth, fields, **lookup)
+        return list(parts.values())
+
+    @classmethod
+    def load_package(
+        cls,
+        survey_package_id: int,
+        depth: Optional[int] = None,
+        fields: Optional[set[str]] = None,
+    ) -> Optional[dict]:
+        packages, package_values = cls._rows(
+            SurveyPackage.objects.filter(id=survey_package_id),
+            PACKAGE_FIELDS,
+            ["contacts", "parts"],
+            fields,
+            ("author",),
+            _expands(depth),
+        )
+        if not packages:
+            return None
+
+        package_id, package = next(iter(packages.items()))
+        author_id = package_values[package_id]["author"]
+        if "author" in package and author_id is not None:
+            package["author"] = cls.load_users([author_id], fields).get(author_id, None)
+        if "logo" in package:
+            package["logo"] = logo_url(package["logo"])
+
+        if "contacts" in package:
+            contacts, _ = cls._rows(
+                PackageContact.objects.filter(survey_package_id=package_id),
+                CONTACT_FIELDS,
+                [],
+                fields,
+            )
+            package["contacts"] = list(contacts.values())
+        if "parts" in package:
+            package["parts"] = cls.load_parts(
+                _deeper(depth), fields, survey_package_id=package_id
+            )
+
+        return package
+
+
+class TreeQueryMixin(object):
+    """
+    Reads the `depth` and `fields` of PackageTreeLoader from the query
+    """
+
+    def get_tree_options(self) -> dict:
+        depth = self.request.query_params.get("depth", None)
+        if depth is not None:
+            if not depth.isdigit():
+                raise InvalidInputException("depth must be a non-negative integer")
+            depth = int(depth)
+
+        fields = self.request.query_params.get("fields", None)
+        if fields is not None:
+            fields = {
+                camel_to_underscore(f.strip(), **api_settings.JSON_UNDERSCOREIZE)
+                for f in fields.split(",")
+                if f.strip()
+            }
+
+        return dict(depth=depth, fields=fields)
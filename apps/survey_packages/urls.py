@@ -3,6 +3,7 @@ from django.urls import path, URLPattern
 from apps.survey_packages.views import (
     base_views,
     answers_views,
+    exports_views,
     parts_views,
     subjects_views,
 )
@@ -25,11 +26,41 @@ urlpatterns: list[URLPattern] = [
         answers_views.SurveyPackageAnswerCreateView.as_view(),
         name="survey_package_answers_list",
     ),
+    path(
+        "/answers/batch",
+        answers_views.SurveyPackageAnswerBatchCreateView.as_view(),
+        name="survey_package_answers_batch",
+    ),
     path(
         "/<int:pk>/responses/download",
         answers_views.SurveyPackageAnswerDownloadView.as_view(),
         name="survey_package_answers_download",
     ),
+    path(
+        "/<int:pk>/responses",
+        answers_views.SurveyPackageRespondentListView.as_view(),
+        name="survey_package_respondents",
+    ),
+    path(
+        "/<int:pk>/responses/aggregates",
+        answers_views.SurveyPackageAnswerAggregateView.as_view(),
+        name="survey_package_answers_aggregates",
+    ),
+    path(
+        "/<int:pk>/exports",
+        exports_views.ExportJobCreateView.as_view(),
+        name="export_job_create",
+    ),
+    path(
+        "/exports/<int:job_id>",
+        exports_views.ExportJobDetailView.as_view(),
+        name="export_job_details",
+    ),
+    path(
+        "/exports/<int:job_id>/download",
+        exports_views.ExportJobDownloadView.as_view(),
+        name="export_job_download",
+    ),
     path("/kick-off", base_views.KickOffSurveyView.as_view(), name="kickoff_survey"),
     path(
         "/<int:pk>/parts",
@@ -0,0 +1,200 @@
+import re
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from apps.survey_packages.models import PackageSubjectSurvey, SurveyPackage
+from apps.surveys.models import SurveySector, SectorQuestion, QuestionChoice
+from config.exceptions import InstanceNotFound, InvalidInputException
+
+CHOICE_QUESTION_TYPES = [
+    SurveySector.QuestionType.LIKERT,
+    SurveySector.QuestionType.SINGLE_SELECT,
+    SurveySector.QuestionType.EXTENT,
+]
+# Multi select choices are stored as the bits of a signed 64 bit selection mask
+MAX_MULTI_SELECT_CHOICE = 63
+
+
+def _cache_key(package_id: int, structure_version: Optional[int]) -> str:
+    return f"package_answer_validator:{package_id}:{structure_version}"
+
+
+class PackageAnswerValidator(object):
+    """
+    Checks answers against the question tree of one survey package.
+    `questions` maps a question id to its question type, the allowed choice
+    numbers and the numbers of descriptive choices.
+    """
+
+    def __init__(
+        self, package_id: int, questions: dict[int, tuple[str, frozenset, frozenset]]
+    ):
+        self.package_id = package_id
+        self.questions = questions
+
+    @classmethod
+    def for_package(cls, package_id: int) -> "PackageAnswerValidator":
+        # Keyed by the structure version, so a change made through any process
+        # is seen by all of them without a shared cache
+        structure_version = (
+            SurveyPackage.objects.filter(id=package_id)
+            .values_list("structure_version", flat=True)
+            .first()
+        )
+        key = _cache_key(package_id, structure_version)
+
+        questions = cache.get(key)
+        if questions is None:
+            questions = cls.compile(package_id)
+            cache.set(
+                key,
+                questions,
+                settings.PACKAGE_VALIDATOR_CACHE_TIMEOUT,
+            )
+
+        return cls(package_id, questions)
+
+    @staticmethod
+    def compile(package_id: int) -> dict[int, tuple[str, frozenset, frozenset]]:
+        survey_ids = PackageSubjectSurvey.objects.filter(
+            subject__package_part__survey_package_id=package_id
+        ).values_list("survey_id", flat=True)
+
+        sector_types: dict[int, str] = dict(
+            SurveySector.objects.filter(survey_id__in=list(survey_ids)).values_list(
+                "id", "question_type"
+            )
+        )
+        question_sectors: dict[int, int] = dict(
+            SectorQuestion.objects.filter(
+                sector_id__in=sector_types.keys()
+            ).values_list("id", "sector_id")
+        )
+
+        sector_choices: dict[int, list] = {}
+        question_choices: dict[int, list] = {}
+        for (
+            number,
+            is_descriptive,
+            sector_id,
+            question_id,
+        ) in QuestionChoice.objects.filter(
+            Q(related_sector_id__in=sector_types.keys())
+            | Q(related_question_id__in=question_sectors.keys())
+        ).values_list(
+            "number", "is_descriptive", "related_sector_id", "related_question_id"
+        ):
+            if question_id is not None:
+                question_choices.setdefault(question_id, []).append(
+                    (number, is_descriptive)
+                )
+            else:
+                sector_choices.setdefault(sector_id, []).append(
+                    (number, is_descriptive)
+                )
+
+        questions = {}
+        for question_id, sector_id in question_sectors.items():
+            choices = question_choices.get(
+                question_id, sector_choices.get(sector_id, [])
+            )
+            questions[question_id] = (
+                sector_types[sector_id],
+                frozenset(number for number, _ in choices),
+                frozenset(
+                    number for number, is_descriptive in choices if is_descriptive
+                ),
+            )
+
+        return questions
+
+    def validate(self, answers: list[dict]) -> None:
+        unknown_question_ids = [
+            a["question_id"] for a in answers if a["question_id"] not in self.questions
+        ]
+        if unknown_question_ids:
+            raise InstanceNotFound(
+                f"question not found in this survey package: {unknown_question_ids}"
+            )
+
+        for a in answers:
+            question_type, allowed, descriptive = self.questions[a["question_id"]]
+            if question_type in CHOICE_QUESTION_TYPES:
+                valid = self._is_valid_single_choice(a["answer"], allowed, descriptive)
+            elif question_type == SurveySector.QuestionType.MULTI_SELECT:
+                valid = self._is_valid_multi_choice(a["answer"], allowed, descriptive)
+            else:
+                valid = True
+
+            if not valid:
+                raise InvalidInputException(
+                    f"invalid answer for question {a['question_id']}: {a['answer']}"
+                )
+
+    def parse(
+        self, question_id: int, answer: str
+    ) -> tuple[Optional[int], Optional[int]]:
+        """
+        Returns the numeric value and the selection mask stored with an answer.
+        A choice answer is valued by its choice number, any other answer only
+        when it is a whole number. Numbers past 9 digits are left out, and an
+        answer with a choice that does not fit the mask has no mask at all.
+        """
+        question_type, _, descriptive = self.questions.get(
+            question_id, (None, frozenset(), frozenset())
+        )
+        tokens = answer.split("$")
+
+        if question_type == SurveySector.QuestionType.MULTI_SELECT:
+            # Filled-in values of descriptive choices are not selections
+            selected = tokens[:1] if descriptive else tokens
+            mask = 0
+            for t in selected:
+                if not t.isdigit():
+                    continue
+                if not 0 < int(t) <= MAX_MULTI_SELECT_CHOICE:
+                    return None, None
+                mask |= 1 << (int(t) - 1)
+            return None, mask
+
+        value = tokens[0] if question_type in CHOICE_QUESTION_TYPES else answer.strip()
+        if re.fullmatch(r"-?\d{1,9}", value) is None:
+            return None, None
+        return int(value), None
+
+    @staticmethod
+    def _is_valid_single_choice(
+        answer: str, allowed: frozenset, descriptive: frozenset
+    ) -> bool:
+        number, *rest = answer.split("$")
+        if not number.isdigit():
+            return False
+        if not allowed:
+            return True
+        if int(number) not in allowed:
+            return False
+        # Only a descriptive choice carries filled-in values after its number
+        return not rest or int(number) in descriptive
+
+    @staticmethod
+    def _is_valid_multi_choice(
+        answer: str, allowed: frozenset, descriptive: frozenset
+    ) -> bool:
+        tokens = answer.split("$")
+        if not tokens[0].isdigit():
+            return False
+        # Selections the selection mask cannot hold are refused, not dropped
+        selected = tokens[:1] if descriptive else tokens
+        if any(
+            t.isdigit() and not 0 < int(t) <= MAX_MULTI_SELECT_CHOICE for t in selected
+        ):
+            return False
+        if not allowed:
+            return True
+        if descriptive:
+            # Filled-in values may be numeric, so only the first choice is checked
+            return int(tokens[0]) in allowed
+        return all(t.isdigit() and int(t) in allowed for t in tokens)
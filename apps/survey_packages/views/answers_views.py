@@ -1,9 +1,12 @@
 from datetime import datetime
-from tempfile import NamedTemporaryFile
-from typing import Any
+from tempfile import TemporaryFile
+from typing import Any, Optional
+from urllib.parse import quote
 
+from django.conf import settings
+from django.db import transaction, IntegrityError
 from django.db.models import QuerySet
-from django.http import Http404, HttpResponse
+from django.http import Http404, FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -12,23 +15,53 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from apps.survey_packages.services import ResponseExportService
-from apps.surveys.models import QuestionAnswer
-from apps.surveys.serializers import QuestionAnswerSerializer
-from apps.surveys.services import QuestionAnswerService
+from apps.survey_packages.models import ExportJob, IdempotencyKey, Respondent
+from apps.survey_packages.serializers import RespondentAnswersSerializer
+from apps.survey_packages.services import (
+    ExportJobService,
+    ResponseExportCursor,
+    ResponseExportService,
+)
+from apps.survey_packages.views.exports_views import (
+    ASYNC_EXPORT_PARAMETER,
+    is_async_export,
+    queued_export_response,
+)
+from apps.surveys.models import QuestionAnswer, QuestionAggregate
+from apps.surveys.serializers import (
+    QuestionAnswerSerializer,
+    QuestionAggregateSerializer,
+)
+from apps.surveys.services import (
+    QuestionAnswerService,
+    AnswerSpoolService,
+    AnswerBatchService,
+)
 from apps.workspaces.models import (
     Workspace,
     WorkspaceComposition,
     RoutineDetail,
     Routine,
 )
+from apps.workspaces.resolvers import workspace_key_resolver
 from apps.workspaces.serializers import (
     WorkspaceCompositionSerializer,
     RoutineSerializer,
 )
-from config.exceptions import InstanceNotFound, InvalidInputException
+from config.custom_pagination import CustomCursorPagination
+from config.exceptions import (
+    InstanceNotFound,
+    InvalidInputException,
+    ConflictException,
+)
 from config.permissions import AdminOnly
 
+EXPORT_CONTENT_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson.gz": "application/gzip",
+}
+
 
 class SurveyPackageAnswerCreateView(generics.CreateAPIView):
     queryset = QuestionAnswer.objects.all()
@@ -45,7 +78,13 @@ class SurveyPackageAnswerCreateView(generics.CreateAPIView):
                 openapi.IN_QUERY,
                 type=openapi.TYPE_STRING,
                 description="루틴 정보를 함께 받을 것인지 표기합니다. 루틴 정보를 함께 받으려면 ?routine=y 의 형태로 query string 을 포함시켜주세요. 받지 않으려면 query string 을 제외합니다",
-            )
+            ),
+            openapi.Parameter(
+                "Idempotency-Key",
+                openapi.IN_HEADER,
+                type=openapi.TYPE_STRING,
+                description="재전송 시 동일한 값을 보내면 응답이 중복 저장되지 않고 처음의 응답이 그대로 반환됩니다. 최대 길이 64",
+            ),
         ],
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
@@ -86,7 +125,8 @@ class SurveyPackageAnswerCreateView(generics.CreateAPIView):
                         description="/workspace/{id}/routines 와 동일",
                     ),
                 },
-            )
+            ),
+            202: "spool 모드에서 응답이 접수되었으며 곧 저장됩니다. body 는 201 과 동일",
         },
     )
     def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -94,40 +134,299 @@ class SurveyPackageAnswerCreateView(generics.CreateAPIView):
         if key is None:
             raise InvalidInputException("key is required")
 
+        idempotency_key = request.headers.get("Idempotency-Key", None)
+        if idempotency_key is not None:
+            if len(idempotency_key) > 64:
+                raise InvalidInputException(
+                    "Idempotency-Key must be at most 64 characters long"
+                )
+            stored = self._get_stored_response(idempotency_key)
+            if stored is not None:
+                return stored
+
         workspace_uuid = key[:22]
         respondent_id = key[22:]
 
-        try:
-            workspace = get_object_or_404(Workspace, uuid=workspace_uuid)
-        except Http404:
+        workspace_key = workspace_key_resolver.resolve(workspace_uuid)
+        if workspace_key is None:
             raise InstanceNotFound("no workspace by the provided key")
 
         service = QuestionAnswerService(
-            workspace.id, kwargs.get("pk"), request.user, respondent_id
+            workspace_key.workspace_id, kwargs.get("pk"), request.user, respondent_id
         )
 
-        answers = service.create_answers(request.data.get("answers", None))
-        service.record_respondent()
+        answers_list = request.data.get("answers", None)
+        if settings.ANSWER_INGESTION_MODE == "spool":
+            status_code = status.HTTP_202_ACCEPTED
+        else:
+            status_code = status.HTTP_201_CREATED
 
-        serializer = self.get_serializer(answers, many=True)
+        try:
+            with transaction.atomic():
+                if status_code == status.HTTP_202_ACCEPTED:
+                    validated_answers = service.validate_answers(answers_list)
+                    AnswerSpoolService.enqueue(service, validated_answers)
+                    answers = service.make_answers(validated_answers)
+                else:
+                    answers = service.submit(answers_list)
 
-        routine_data = None
-        if request.GET.get("routine"):
-            try:
-                routine = get_object_or_404(Routine, workspace_id=workspace.id)
-                routine_data = RoutineSerializer(routine).data
-            except Http404:
-                pass
-
-        return Response(
-            {"answers": serializer.data, "routine": routine_data},
-            status=status.HTTP_201_CREATED,
+                serializer = self.get_serializer(answers, many=True)
+
+                routine_data = None
+                if request.GET.get("routine") and workspace_key.routine_id is not None:
+                    routine = Routine.objects.filter(
+                        id=workspace_key.routine_id
+                    ).first()
+                    if routine is not None:
+                        routine_data = RoutineSerializer(routine).data
+
+                response_data = {"answers": serializer.data, "routine": routine_data}
+
+                if idempotency_key is not None:
+                    IdempotencyKey.objects.create(
+                        key=idempotency_key,
+                        user_id=request.user.id,
+                        survey_package_id=kwargs.get("pk"),
+                        status_code=status_code,
+                        response=response_data,
+                    )
+        except (ConflictException, IntegrityError):
+            # A concurrent retry with the same key may have committed first
+            if idempotency_key is not None:
+                stored = self._get_stored_response(idempotency_key)
+                if stored is not None:
+                    return stored
+                if IdempotencyKey.objects.filter(
+                    key=idempotency_key, user_id=request.user.id
+                ).exists():
+                    raise ConflictException(
+                        "Idempotency-Key was already used for another survey package"
+                    )
+            raise
+
+        return Response(response_data, status=status_code)
+
+    def _get_stored_response(self, idempotency_key: str) -> Optional[Response]:
+        stored = IdempotencyKey.objects.filter(
+            key=idempotency_key,
+            user_id=self.request.user.id,
+            survey_package_id=self.kwargs.get("pk"),
+        ).first()
+
+        if stored is None:
+            return None
+
+        return Response(stored.response, status=stored.status_code)
+
+
+class SurveyPackageAnswerBatchCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        tags=["survey-answer"],
+        operation_summary="여러 survey package 에 대한 피험자들의 응답을 한 번에 생성합니다",
+        operation_description="오프라인 상태에서 모아둔 응답들을 한 번의 요청으로 동기화합니다. 각 응답의 처리 결과는 요청 순서대로 반환됩니다",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["submissions"],
+            properties={
+                "submissions": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=["key", "package", "answers"],
+                        properties={
+                            "key": openapi.Schema(
+                                type=openapi.TYPE_STRING,
+                                description="워크스페이스 uuid + 피험자 고유 번호",
+                            ),
+                            "package": openapi.Schema(
+                                type=openapi.TYPE_INTEGER,
+                                description="survey package id",
+                            ),
+                            "answers": openapi.Schema(
+                                type=openapi.TYPE_ARRAY,
+                                description="/survey-packages/{id}/answers 의 answers 와 동일",
+                                items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                            ),
+                        },
+                    ),
+                ),
+            },
+        ),
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "results": openapi.Schema(
+                        type=openapi.TYPE_ARRAY,
+                        items=openapi.Schema(
+                            type=openapi.TYPE_OBJECT,
+                            properties={
+                                "key": openapi.Schema(type=openapi.TYPE_STRING),
+                                "package": openapi.Schema(type=openapi.TYPE_INTEGER),
+                                "status": openapi.Schema(
+                                    type=openapi.TYPE_STRING,
+                                    description="created, duplicate, invalid 중 하나",
+                                ),
+                                "detail": openapi.Schema(
+                                    type=openapi.TYPE_STRING,
+                                    description="duplicate, invalid 인 경우의 사유",
+                                ),
+                            },
+                        ),
+                    )
+                },
+            )
+        },
+    )
+    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        service = AnswerBatchService(request.user)
+        results = service.submit(request.data.get("submissions", None))
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class WorkspaceQueryMixin(object):
+    def get_workspace_id(self) -> int:
+        """
+        Reads the workspace of the survey package in `pk` from the query string
+        """
+        workspace_query: str = self.request.GET.get("workspace", None)
+
+        if workspace_query is None:
+            raise InvalidInputException("workspace id not set in query string")
+
+        if not workspace_query.isnumeric():
+            raise InvalidInputException("workspace must be in number format")
+
+        if not WorkspaceComposition.objects.filter(
+            survey_package_id=self.kwargs["pk"], workspace_id=int(workspace_query)
+        ).exists():
+            raise InstanceNotFound(
+                "survey package does not exist in the provided workspace"
+            )
+
+        return int(workspace_query)
+
+
+class SurveyPackageAnswerAggregateView(WorkspaceQueryMixin, generics.ListAPIView):
+    serializer_class = QuestionAggregateSerializer
+    permission_classes = [AdminOnly]
+    pagination_class = None
+
+    def get_queryset(self) -> QuerySet:
+        return (
+            QuestionAggregate.objects.filter(
+                survey_package_id=self.kwargs["pk"],
+                workspace_id=self.get_workspace_id(),
+            )
+            .select_related("question__sector")
+            .order_by("question_id")
         )
 
+    @swagger_auto_schema(
+        operation_summary="survey package 의 문항별 응답 분포를 조회합니다",
+        operation_description="응답이 제출될 때마다 갱신되는 문항별 응답 수, 선지별 응답 수 (choice_counts), 리커트/정도 문항의 평균과 분산을 반환합니다",
+        tags=["survey-answer"],
+        manual_parameters=[
+            openapi.Parameter(
+                "id",
+                openapi.IN_PATH,
+                description="survey package id",
+                type=openapi.TYPE_INTEGER,
+                required=True,
+            ),
+            openapi.Parameter(
+                "workspace",
+                openapi.IN_QUERY,
+                description="survey package 가 속해있는 workspace id",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+        ],
+        responses={200: QuestionAggregateSerializer(many=True)},
+    )
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        return self.list(request, *args, **kwargs)
+
+
+class RespondentCursorPagination(CustomCursorPagination):
+    ordering = "respondent_id"
+
+
+class SurveyPackageRespondentListView(WorkspaceQueryMixin, generics.ListAPIView):
+    serializer_class = RespondentAnswersSerializer
+    permission_classes = [AdminOnly]
+    pagination_class = RespondentCursorPagination
+
+    def get_queryset(self) -> QuerySet:
+        return Respondent.objects.filter(
+            survey_package_id=self.kwargs["pk"], workspace_id=self.get_workspace_id()
+        )
+
+    @swagger_auto_schema(
+        operation_summary="survey package 의 피험자별 응답을 조회합니다",
+        operation_description="피험자 id 순으로 페이지를 나누어 반환합니다. 다음 페이지는 응답의 next 링크로 조회합니다",
+        tags=["survey-answer"],
+        manual_parameters=[
+            openapi.Parameter(
+                "id",
+                openapi.IN_PATH,
+                description="survey package id",
+                type=openapi.TYPE_INTEGER,
+                required=True,
+            ),
+            openapi.Parameter(
+                "workspace",
+                openapi.IN_QUERY,
+                description="survey package 가 속해있는 workspace id",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+            openapi.Parameter(
+                "page_size",
+                openapi.IN_QUERY,
+                description="한 페이지의 피험자 수 (기본값 20, 최대 500)",
+                type=openapi.TYPE_INTEGER,
+            ),
+        ],
+        responses={200: RespondentAnswersSerializer(many=True)},
+    )
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        page = self.paginate_queryset(self.get_queryset())
+
+        # The answers of the whole page are read in one query
+        answers: dict[str, list[dict]] = {}
+        if page:
+            for respondent_id, question_id, answer in (
+                QuestionAnswer.objects.filter(
+                    workspace_id=page[0].workspace_id,
+                    survey_package_id=page[0].survey_package_id,
+                    respondent_id__in=[r.respondent_id for r in page],
+                )
+                .order_by("respondent_id", "id")
+                .values_list("respondent_id", "question_id", "answer")
+            ):
+                answers.setdefault(respondent_id, []).append(
+                    dict(question=question_id, answer=answer)
+                )
+
+        serializer = self.get_serializer(
+            page,
+            many=True,
+            context=dict(self.get_serializer_context(), answers=answers),
+        )
+        return self.get_paginated_response(serializer.data)
+
 
 class SurveyPackageAnswerDownloadView(APIView):
     permission_classes = [AdminOnly]
 
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= names the file format here, not a DRF renderer
+        return super().perform_content_negotiation(request, force=True)
+
     def get_object(self, pk):
         survey_package_id = pk
         workspace_query: str = self.request.GET.get("workspace", None)
@@ -174,34 +473,114 @@ class SurveyPackageAnswerDownloadView(APIView):
                 type=openapi.TYPE_STRING,
                 required=True,
             ),
+            openapi.Parameter(
+                "format",
+                openapi.IN_QUERY,
+                description="xlsx (기본값), csv, ndjson.gz 중 하나. csv 와 ndjson.gz 는 바로 스트리밍되며, 모든 행에 워크스페이스 정보가 반복됩니다",
+                type=openapi.TYPE_STRING,
+            ),
+            openapi.Parameter(
+                "cursor",
+                openapi.IN_QUERY,
+                description="지난 다운로드 이후에 추가된 피험자의 응답만 받습니다. 응답 헤더 X-Export-Cursor 의 값을 다음 요청에 그대로 보내주세요. 처음 받을 때는 빈 값 (?cursor=) 을 보냅니다",
+                type=openapi.TYPE_STRING,
+            ),
+            ASYNC_EXPORT_PARAMETER,
         ],
-        responses={200: "download success"},
+        responses={
+            200: "download success",
+            202: "async 요청의 파일이 백그라운드에서 생성됩니다. Location 헤더의 export job 을 조회해 주세요",
+        },
     )
-    def get(self, request, pk, format=None) -> HttpResponse:
+    def get(self, request, pk, format=None) -> StreamingHttpResponse:
         instance: WorkspaceComposition = self.get_object(pk)
 
-        service = ResponseExportService(
-            instance.workspace,
-            instance.survey_package,
-        )
+        export_format = request.GET.get("format", "xlsx")
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise InvalidInputException(
+                "format must be one of 'xlsx', 'csv' and 'ndjson.gz'"
+            )
+
+        cursor_token = request.GET.get("cursor", None)
+        if is_async_export(request) and (
+            cursor_token is not None or export_format != "xlsx"
+        ):
+            raise InvalidInputException(
+                "async downloads are built for the full xlsx export only"
+            )
 
-        package_name = instance.survey_package.title
-        package_name = package_name.replace(" ", "_")
+        if cursor_token is None and export_format == "xlsx":
+            # An unchanged dataset is served from the stored file of an earlier export
+            service = ExportJobService()
+            if is_async_export(request):
+                job = service.create(
+                    request.user,
+                    instance.survey_package_id,
+                    ExportJob.Kind.RESPONSES,
+                    instance.workspace_id,
+                )
+                if job.status != ExportJob.Status.DONE:
+                    return queued_export_response(job)
+            else:
+                job = service.export_now(
+                    request.user, instance.survey_package_id, instance.workspace_id
+                )
 
-        wb = service.export_to_worksheet()
+            return FileResponse(
+                service.open_artifact(job),
+                as_attachment=True,
+                filename=job.file_name,
+                content_type=EXPORT_CONTENT_TYPES["xlsx"],
+                status=200,
+            )
 
-        with NamedTemporaryFile() as tmp:
-            wb.save(tmp.name)
-            tmp.seek(0)
-            stream = tmp.read()
+        next_cursor = None
+        respondent_range = None
+        if cursor_token is not None:
+            cursor = ResponseExportCursor.load(
+                cursor_token, instance.workspace_id, instance.survey_package_id
+            )
+            next_cursor = cursor.advance()
+            respondent_range = (
+                cursor.last_respondent_id,
+                next_cursor.last_respondent_id,
+            )
 
-        response = HttpResponse(
-            content=stream,
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            status=200,
+        service = ResponseExportService(
+            instance.workspace, instance.survey_package, respondent_range
+        )
+        package_name = instance.survey_package.title.replace(" ", "_")
+        filename = (
+            f'{package_name}-{datetime.now().strftime("%Y%m%d%H%M")}.{export_format}'
         )
-        response.headers[
-            "Content-Disposition"
-        ] = f'attachment; filename={package_name}-{datetime.now().strftime("%Y%m%d%H%M")}.xlsx'
+
+        if export_format == "xlsx":
+            tmp = TemporaryFile()
+            try:
+                service.export_to_file(tmp)
+            except Exception:
+                tmp.close()
+                raise
+            tmp.seek(0)
+
+            response = FileResponse(
+                tmp,
+                as_attachment=True,
+                filename=filename,
+                content_type=EXPORT_CONTENT_TYPES["xlsx"],
+                status=200,
+            )
+        else:
+            response = StreamingHttpResponse(
+                service.stream(export_format),
+                content_type=EXPORT_CONTENT_TYPES[export_format],
+                status=200,
+            )
+            response.headers[
+                "Content-Disposition"
+            ] = f"attachment; filename*=utf-8''{quote(filename)}"
+
+        if next_cursor is not None:
+            response.headers["X-Export-Cursor"] = next_cursor.dumps()
 
         return response
@@ -1,8 +1,7 @@
-from tempfile import NamedTemporaryFile
-from typing import Any
+from typing import Any, Optional
 
-from django.db.models import QuerySet, Prefetch
-from django.http import Http404, HttpResponse
+from django.db.models import QuerySet
+from django.http import FileResponse, Http404
 from datetime import datetime
 
 from django.shortcuts import get_object_or_404
@@ -10,7 +9,6 @@ from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status, permissions
-from rest_framework.generics import get_object_or_404 as _get_object_or_404
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -18,9 +16,7 @@ from rest_framework.views import APIView
 from apps.survey_packages.models import (
     SurveyPackage,
     PackageContact,
-    PackagePart,
-    PackageSubject,
-    PackageSubjectSurvey,
+    ExportJob,
 )
 from apps.survey_packages.serializers import (
     SurveyPackageSerializer,
@@ -28,11 +24,24 @@ from apps.survey_packages.serializers import (
 )
 from apps.survey_packages.services import (
     SurveyPackageService,
-    SurveyPackageExportService,
+    ExportJobService,
+    PackageSnapshotService,
 )
-from apps.surveys.models import SectorQuestion, Survey, SurveySector
+from apps.survey_packages.tree import (
+    PackageTreeLoader,
+    TreeQueryMixin,
+    TREE_QUERY_PARAMETERS,
+)
+from apps.survey_packages.views.exports_views import (
+    ASYNC_EXPORT_PARAMETER,
+    is_async_export,
+    queued_export_response,
+)
+from apps.surveys.models import Survey
 from apps.workspaces.models import Routine, Workspace
+from apps.workspaces.resolvers import WorkspaceKey, workspace_key_resolver
 from config.custom_pagination import CustomPagination
+from config.etag import ETagMixin, version_etag
 from config.exceptions import (
     InstanceNotFound,
     UnprocessableException,
@@ -40,6 +49,7 @@ from config.exceptions import (
 )
 from config.paginator_inspector import CustomPaginationInspector
 from config.permissions import AdminOnly, IsAuthorOrReadOnly
+from config.renderer import TreeJSONRenderer
 
 
 @method_decorator(
@@ -137,48 +147,41 @@ class SurveyPackageListView(generics.ListCreateAPIView):
     name="get",
     decorator=swagger_auto_schema(
         operation_summary="설문 패키지의 정보를 전부 가져옵니다",
+        manual_parameters=TREE_QUERY_PARAMETERS,
         responses={200: openapi.Response("ok", SurveyPackageSerializer)},
     ),
 )
-class SurveyPackageDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SurveyPackageDetailView(
+    ETagMixin, TreeQueryMixin, generics.RetrieveUpdateDestroyAPIView
+):
     allowed_methods = ["DELETE", "GET", "PATCH"]
     queryset = SurveyPackage.objects.all()
     serializer_class = SurveyPackageSerializer
     permission_classes = [IsAuthorOrReadOnly]
+    renderer_classes = [TreeJSONRenderer]
 
-    def get_queryset(self) -> QuerySet:
-        return self.queryset.select_related("author").prefetch_related(
-            "contacts",
-            Prefetch(
-                "parts",
-                queryset=PackagePart.objects.prefetch_related(
-                    Prefetch(
-                        "subjects",
-                        queryset=PackageSubject.objects.prefetch_related(
-                            Prefetch(
-                                "surveys",
-                                queryset=PackageSubjectSurvey.objects.select_related(
-                                    "survey"
-                                ).prefetch_related(
-                                    Prefetch(
-                                        "survey__sectors",
-                                        queryset=SurveySector.objects.prefetch_related(
-                                            "common_choices",
-                                            Prefetch(
-                                                "questions",
-                                                queryset=SectorQuestion.objects.prefetch_related(
-                                                    "choices"
-                                                ),
-                                            ),
-                                        ),
-                                    )
-                                ),
-                            )
-                        ),
-                    )
-                ),
-            ),
+    def get_etag(self) -> Optional[str]:
+        version = (
+            SurveyPackage.objects.filter(id=self.kwargs.get("pk"))
+            .values_list("structure_version", flat=True)
+            .first()
         )
+        return version_etag("package", self.kwargs.get("pk"), version)
+
+    def get_queryset(self) -> QuerySet:
+        return self.queryset.select_related("author").prefetch_related("contacts")
+
+    def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        options = self.get_tree_options()
+        if options["depth"] is None and options["fields"] is None:
+            # Served from the stored snapshot of the tree, which is safe to read
+            return Response(PackageSnapshotService.get(kwargs.get("pk")))
+
+        package = PackageTreeLoader.load_package(kwargs.get("pk"), **options)
+        if package is None:
+            raise InstanceNotFound("survey package for the provided id does not exist")
+
+        return Response(package)
 
     @swagger_auto_schema(
         operation_summary="설문 패키지 기본 정보를 수정합니다",
@@ -266,70 +269,40 @@ class SurveyPackageDetailView(generics.RetrieveUpdateDestroyAPIView):
         responses={200: openapi.Response("ok", SurveyPackageSerializer)},
     ),
 )
-class KickOffSurveyView(generics.RetrieveAPIView):
+class KickOffSurveyView(ETagMixin, generics.RetrieveAPIView):
     serializer_class = SurveyPackageSerializer
     queryset = SurveyPackage.objects.all()
+    renderer_classes = [TreeJSONRenderer]
+
+    def get_etag(self) -> Optional[str]:
+        kick_off_id = self.get_workspace_key().kick_off_id
+        version = (
+            SurveyPackage.objects.filter(id=kick_off_id)
+            .values_list("structure_version", flat=True)
+            .first()
+        )
+        return version_etag("package", kick_off_id, version)
 
-    def get_routine(self) -> Routine:
+    def get_workspace_key(self) -> WorkspaceKey:
         key = self.request.GET.get("key", None)
         code = self.request.GET.get("code", None)
 
         if not (key and code):
             raise InvalidInputException("'key' and 'code'should be set in query string")
 
-        uuid = key[:22]
-        subject_id = key[22:]
-
-        try:
-            workspace = (
-                Workspace.objects.filter(uuid=uuid).select_related("routine").first()
-            )
-            if workspace.access_code != code:
-                raise UnprocessableException("access code does not match")
-        except Http404:
+        workspace_key = workspace_key_resolver.resolve(key[:22])
+        if workspace_key is None:
             raise InstanceNotFound("no workspace by the provided key")
+        if workspace_key.access_code != code:
+            raise UnprocessableException("access code does not match")
+        if workspace_key.routine_id is None:
+            raise InstanceNotFound("no routine set for the workspace")
 
-        return workspace.routine
+        return workspace_key
 
-    def get_queryset(self) -> QuerySet:
-        return self.queryset.select_related("author").prefetch_related(
-            "contacts",
-            Prefetch(
-                "parts",
-                queryset=PackagePart.objects.prefetch_related(
-                    Prefetch(
-                        "subjects",
-                        queryset=PackageSubject.objects.prefetch_related(
-                            Prefetch(
-                                "surveys",
-                                queryset=PackageSubjectSurvey.objects.select_related(
-                                    "survey"
-                                ).prefetch_related(
-                                    Prefetch(
-                                        "survey__sectors",
-                                        queryset=SurveySector.objects.prefetch_related(
-                                            "common_choices",
-                                            Prefetch(
-                                                "questions",
-                                                queryset=SectorQuestion.objects.prefetch_related(
-                                                    "choices"
-                                                ),
-                                            ),
-                                        ),
-                                    )
-                                ),
-                            )
-                        ),
-                    )
-                ),
-            ),
-        )
-
-    def get_object(self) -> SurveyPackage:
-        associated_routine = self.get_routine()
-        return _get_object_or_404(
-            self.get_queryset(), id=associated_routine.kick_off_id
-        )
+    def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        workspace_key = self.get_workspace_key()
+        return Response(PackageSnapshotService.get(workspace_key.kick_off_id))
 
 
 class SurveyPackageDownloadView(APIView):
@@ -346,34 +319,26 @@ class SurveyPackageDownloadView(APIView):
                 type=openapi.TYPE_INTEGER,
                 required=True,
             ),
+            ASYNC_EXPORT_PARAMETER,
         ],
-        responses={200: "download success"},
+        responses={
+            200: "download success",
+            202: "async 요청의 파일이 백그라운드에서 생성됩니다. Location 헤더의 export job 을 조회해 주세요",
+        },
     )
-    def get(self, request, pk, format=None) -> HttpResponse:
-        try:
-            survey_package = get_object_or_404(SurveyPackage, id=pk)
-        except Http404:
-            raise InstanceNotFound("survey package for the provided id does not exist")
-
-        service = SurveyPackageExportService(survey_package.id)
-
-        package_name = survey_package.title
-        package_name = package_name.replace(" ", "_")
-
-        wb = service.export_to_workbook()
-
-        with NamedTemporaryFile() as tmp:
-            wb.save(tmp.name)
-            tmp.seek(0)
-            stream = tmp.read()
-
-        response = HttpResponse(
-            content=stream,
+    def get(self, request, pk, format=None) -> FileResponse:
+        service = ExportJobService()
+        if is_async_export(request):
+            job = service.create(request.user, pk, ExportJob.Kind.STRUCTURE)
+            if job.status != ExportJob.Status.DONE:
+                return queued_export_response(job)
+        else:
+            job = service.export_now(request.user, pk, kind=ExportJob.Kind.STRUCTURE)
+
+        return FileResponse(
+            service.open_artifact(job),
+            as_attachment=True,
+            filename=job.file_name,
             content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             status=200,
         )
-        response.headers[
-            "Content-Disposition"
-        ] = f'attachment; filename={package_name}-{datetime.now().strftime("%Y%m%d%H%M")}.xlsx'
-
-        return response
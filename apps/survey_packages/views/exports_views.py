@@ -0,0 +1,127 @@
+from typing import Any
+
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status, permissions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from apps.survey_packages.models import ExportJob
+from apps.survey_packages.serializers import ExportJobSerializer
+from apps.survey_packages.services import ExportJobService
+from config.exceptions import InstanceNotFound
+from config.permissions import AdminOnly
+
+
+ASYNC_EXPORT_PARAMETER = openapi.Parameter(
+    "async",
+    openapi.IN_QUERY,
+    description="true 이면 파일을 백그라운드에서 생성합니다. 같은 내용의 파일이 없으면 202 와 export job 을 응답하며, Location 헤더의 job 이 완료된 뒤 다운로드할 수 있습니다",
+    type=openapi.TYPE_BOOLEAN,
+)
+
+
+def is_async_export(request: Request) -> bool:
+    return request.GET.get("async", "false").lower() == "true"
+
+
+def queued_export_response(job: ExportJob) -> Response:
+    """
+    Answers a download whose file is not built yet with the export job,
+    to be polled at the url of the Location header
+    """
+    return Response(
+        ExportJobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": reverse("export_job_details", args=[job.id])},
+    )
+
+
+class ExportJobCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated, AdminOnly]
+
+    @swagger_auto_schema(
+        tags=["export"],
+        operation_summary="survey package 의 엑셀 파일 생성 작업을 요청합니다",
+        operation_description="파일은 백그라운드에서 생성되며, 응답의 id 로 진행 상황을 조회할 수 있습니다",
+        manual_parameters=[
+            openapi.Parameter(
+                "id",
+                openapi.IN_PATH,
+                description="survey package id",
+                type=openapi.TYPE_INTEGER,
+                required=True,
+            ),
+        ],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["kind"],
+            properties={
+                "kind": openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="responses (응답) 또는 structure (문항 구성)",
+                ),
+                "workspace": openapi.Schema(
+                    type=openapi.TYPE_INTEGER,
+                    description="응답을 다운로드할 workspace id. kind 가 responses 인 경우 필수",
+                ),
+            },
+        ),
+        responses={202: ExportJobSerializer},
+    )
+    def post(self, request: Request, pk: int, *args: Any, **kwargs: Any) -> Response:
+        job = ExportJobService.create(
+            request.user,
+            pk,
+            request.data.get("kind", None),
+            request.data.get("workspace", None),
+        )
+
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated, AdminOnly]
+
+    def get_object(self, job_id: int) -> ExportJob:
+        try:
+            return get_object_or_404(ExportJob, id=job_id)
+        except Http404:
+            raise InstanceNotFound("export job for the provided id does not exist")
+
+    @swagger_auto_schema(
+        tags=["export"],
+        operation_summary="엑셀 파일 생성 작업의 상태와 진행 상황을 조회합니다",
+        operation_description="status 는 pending, running, done, failed, expired 중 하나입니다. progress 는 현재까지 작성한 행의 수, total 은 전체 행의 수입니다",
+        responses={200: ExportJobSerializer},
+    )
+    def get(self, request: Request, job_id: int, *args: Any, **kwargs: Any) -> Response:
+        job = self.get_object(job_id)
+
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class ExportJobDownloadView(ExportJobDetailView):
+    @swagger_auto_schema(
+        tags=["export"],
+        operation_summary="완료된 엑셀 파일을 다운로드 합니다",
+        operation_description="작업이 아직 끝나지 않았으면 409, 파일이 만료되었으면 404 를 반환합니다",
+        responses={200: "download success"},
+    )
+    def get(
+        self, request: Request, job_id: int, *args: Any, **kwargs: Any
+    ) -> FileResponse:
+        job = self.get_object(job_id)
+        artifact = ExportJobService().open_artifact(job)
+
+        return FileResponse(
+            artifact,
+            as_attachment=True,
+            filename=job.file_name,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            status=200,
+        )
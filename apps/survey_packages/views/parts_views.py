@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 
-from django.db.models import QuerySet, Prefetch
+from django.db.models import QuerySet
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
@@ -11,57 +11,50 @@ from rest_framework import generics, status
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from apps.survey_packages.models import (
-    PackagePart,
-    SurveyPackage,
-    PackageSubject,
-    PackageSubjectSurvey,
-)
+from apps.survey_packages.models import PackagePart, SurveyPackage
 from apps.survey_packages.serializers import PackagePartSerializer
 from apps.survey_packages.services import SurveyPackageService
-from apps.surveys.models import SurveySector, SectorQuestion
+from apps.survey_packages.tree import (
+    PackageTreeLoader,
+    TreeQueryMixin,
+    TREE_QUERY_PARAMETERS,
+)
+from config.etag import ETagMixin, version_etag
 from config.exceptions import InstanceNotFound
+from config.renderer import TreeJSONRenderer
 
 
 @method_decorator(
     name="get",
     decorator=swagger_auto_schema(
         operation_summary="설문 패키지 하위의 모든 parts 를 가져옵니다",
+        manual_parameters=TREE_QUERY_PARAMETERS,
         responses={200: openapi.Response("ok", PackagePartSerializer(many=True))},
     ),
 )
-class PackagePartListView(generics.ListCreateAPIView):
+class PackagePartListView(ETagMixin, TreeQueryMixin, generics.ListCreateAPIView):
     serializer_class = PackagePartSerializer
     queryset = PackagePart.objects.all()
+    renderer_classes = [TreeJSONRenderer]
+
+    def get_etag(self) -> Optional[str]:
+        version = (
+            SurveyPackage.objects.filter(id=self.kwargs.get("pk"))
+            .values_list("structure_version", flat=True)
+            .first()
+        )
+        return version_etag("package-parts", self.kwargs.get("pk"), version)
 
     def get_queryset(self) -> QuerySet:
-        return self.queryset.filter(
-            survey_package_id=self.kwargs.get("pk")
-        ).prefetch_related(
-            Prefetch(
-                "subjects",
-                queryset=PackageSubject.objects.prefetch_related(
-                    Prefetch(
-                        "surveys",
-                        queryset=PackageSubjectSurvey.objects.select_related(
-                            "survey"
-                        ).prefetch_related(
-                            Prefetch(
-                                "survey__sectors",
-                                queryset=SurveySector.objects.prefetch_related(
-                                    "common_choices",
-                                    Prefetch(
-                                        "questions",
-                                        queryset=SectorQuestion.objects.prefetch_related(
-                                            "choices"
-                                        ),
-                                    ),
-                                ),
-                            )
-                        ),
-                    )
-                ),
-            )
+        return self.queryset.filter(survey_package_id=self.kwargs.get("pk")).order_by(
+            "id"
+        )
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        page = self.paginate_queryset(self.get_queryset().values_list("id", flat=True))
+
+        return self.get_paginated_response(
+            PackageTreeLoader.load_parts(**self.get_tree_options(), id__in=page)
         )
 
     @swagger_auto_schema(
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 
-from django.db.models import QuerySet, Prefetch
+from django.db.models import QuerySet
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
@@ -11,18 +11,20 @@ from rest_framework import generics, status
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from apps.survey_packages.models import (
-    PackageSubjectSurvey,
-    PackageSubject,
-    PackagePart,
-)
+from apps.survey_packages.models import PackageSubject, PackagePart
 from apps.survey_packages.serializers import (
     PackageSubjectSerializer,
     PackageSubjectSurveySerializer,
 )
 from apps.survey_packages.services import SurveyPackageService
-from apps.surveys.models import SurveySector, SectorQuestion
+from apps.survey_packages.tree import (
+    PackageTreeLoader,
+    TreeQueryMixin,
+    TREE_QUERY_PARAMETERS,
+)
+from config.etag import ETagMixin, version_etag
 from config.exceptions import InstanceNotFound
+from config.renderer import TreeJSONRenderer
 
 
 @method_decorator(
@@ -32,37 +34,34 @@ from config.exceptions import InstanceNotFound
         manual_parameters=[
             openapi.Parameter(
                 "id", openapi.IN_PATH, description="part id", type=openapi.TYPE_INTEGER
-            )
+            ),
+            *TREE_QUERY_PARAMETERS,
         ],
     ),
 )
-class PackageSubjectListView(generics.ListCreateAPIView):
+class PackageSubjectListView(ETagMixin, TreeQueryMixin, generics.ListCreateAPIView):
     serializer_class = PackageSubjectSerializer
     queryset = PackageSubject.objects.all()
+    renderer_classes = [TreeJSONRenderer]
+
+    def get_etag(self) -> Optional[str]:
+        version = (
+            PackagePart.objects.filter(id=self.kwargs.get("pk"))
+            .values_list("survey_package__structure_version", flat=True)
+            .first()
+        )
+        return version_etag("part-subjects", self.kwargs.get("pk"), version)
 
     def get_queryset(self) -> QuerySet:
-        return self.queryset.filter(
-            package_part_id=self.kwargs.get("pk")
-        ).prefetch_related(
-            Prefetch(
-                "surveys",
-                queryset=PackageSubjectSurvey.objects.select_related(
-                    "survey"
-                ).prefetch_related(
-                    Prefetch(
-                        "survey__sectors",
-                        queryset=SurveySector.objects.prefetch_related(
-                            "common_choices",
-                            Prefetch(
-                                "questions",
-                                queryset=SectorQuestion.objects.prefetch_related(
-                                    "choices"
-                                ),
-                            ),
-                        ),
-                    )
-                ),
-            )
+        return self.queryset.filter(package_part_id=self.kwargs.get("pk")).order_by(
+            "id"
+        )
+
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        page = self.paginate_queryset(self.get_queryset().values_list("id", flat=True))
+
+        return self.get_paginated_response(
+            PackageTreeLoader.load_subjects(**self.get_tree_options(), id__in=page)
         )
 
     @swagger_auto_schema(
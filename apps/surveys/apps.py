@@ -5,3 +5,6 @@ class SurveysConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.surveys"
     label = "surveys"
+
+    def ready(self):
+        from apps.surveys import signals  # noqa: F401
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-17 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("surveys", "0007_alter_questionanswer_created_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="questionanswer",
+            index=models.Index(
+                fields=["survey_package", "question", "respondent_id"],
+                name="answer_package_question_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="questionanswer",
+            index=models.Index(
+                fields=["workspace", "survey_package", "respondent_id"],
+                name="answer_workspace_package_idx",
+            ),
+        ),
+    ]
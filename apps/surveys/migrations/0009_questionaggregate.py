@@ -0,0 +1,60 @@
+# Generated by Django 4.1.7 on 2026-10-17 16:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("survey_packages", "0010_packagecolumnlayout"),
+        ("workspaces", "0004_alter_workspace_uuid"),
+        ("surveys", "0008_question_answer_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionAggregate",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("response_count", models.PositiveIntegerField(default=0)),
+                ("choice_counts", models.JSONField(default=dict)),
+                ("numeric_count", models.PositiveIntegerField(default=0)),
+                ("numeric_sum", models.FloatField(default=0)),
+                ("numeric_sum_of_squares", models.FloatField(default=0)),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aggregates",
+                        to="surveys.sectorquestion",
+                    ),
+                ),
+                (
+                    "survey_package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="survey_packages.surveypackage",
+                    ),
+                ),
+                (
+                    "workspace",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="workspaces.workspace",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "question_aggregate",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="questionaggregate",
+            constraint=models.UniqueConstraint(
+                fields=("workspace", "survey_package", "question"),
+                name="unique_question_aggregate",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("surveys", "0009_questionaggregate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="questionanswer",
+            name="numeric_value",
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="questionanswer",
+            name="selection_mask",
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name="questionanswer",
+            index=models.Index(
+                fields=["survey_package", "question", "numeric_value"],
+                name="answer_numeric_value_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("surveys", "0010_answer_numeric_value"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="survey",
+            name="structure_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
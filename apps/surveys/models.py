@@ -1,10 +1,12 @@
+from typing import Optional
+
 from django.db import models
 
 from apps.users.models import User
-from config.mixins import TimeStampMixin
+from config.mixins import TimeStampMixin, StructureVersionMixin
 
 
-class Survey(TimeStampMixin):
+class Survey(TimeStampMixin, StructureVersionMixin):
     id = models.BigAutoField(primary_key=True)
     title = models.CharField(max_length=50, null=False)
     description = models.CharField(max_length=200, null=False)
@@ -103,13 +105,85 @@ class QuestionAnswer(TimeStampMixin):
         "workspaces.Workspace", on_delete=models.SET_NULL, null=True
     )
     answer = models.CharField(max_length=500, null=False)
+    # Parsed from `answer` on ingestion: the selected or written number, and
+    # for multi select questions the selected choices with bit n - 1 for choice n
+    numeric_value = models.IntegerField(null=True)
+    selection_mask = models.BigIntegerField(null=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
     class Meta:
         db_table = "question_answer"
+        indexes = [
+            models.Index(
+                fields=["survey_package", "question", "respondent_id"],
+                name="answer_package_question_idx",
+            ),
+            models.Index(
+                fields=["workspace", "survey_package", "respondent_id"],
+                name="answer_workspace_package_idx",
+            ),
+            models.Index(
+                fields=["survey_package", "question", "numeric_value"],
+                name="answer_numeric_value_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"[{self.id}] {self.respondent_id}"
 
     def __repr__(self):
         return f"QuestionAnswer({self.id}, {self.respondent_id})"
+
+
+class QuestionAggregate(TimeStampMixin):
+    """
+    Running totals of the answers to one question of a survey package in a workspace.
+    `choice_counts` maps a choice number to the number of answers that selected it,
+    the numeric sums cover likert and extent answers.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    workspace = models.ForeignKey(
+        "workspaces.Workspace", on_delete=models.CASCADE, null=False
+    )
+    survey_package = models.ForeignKey(
+        "survey_packages.SurveyPackage", on_delete=models.CASCADE, null=False
+    )
+    question = models.ForeignKey(
+        SectorQuestion, on_delete=models.CASCADE, null=False, related_name="aggregates"
+    )
+    response_count = models.PositiveIntegerField(null=False, default=0)
+    choice_counts = models.JSONField(null=False, default=dict)
+    numeric_count = models.PositiveIntegerField(null=False, default=0)
+    numeric_sum = models.FloatField(null=False, default=0)
+    numeric_sum_of_squares = models.FloatField(null=False, default=0)
+
+    class Meta:
+        db_table = "question_aggregate"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workspace", "survey_package", "question"],
+                name="unique_question_aggregate",
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] {self.question_id}"
+
+    def __repr__(self):
+        return f"QuestionAggregate({self.id}, {self.question_id})"
+
+    @property
+    def mean(self) -> Optional[float]:
+        if not self.numeric_count:
+            return None
+        return self.numeric_sum / self.numeric_count
+
+    @property
+    def variance(self) -> Optional[float]:
+        if not self.numeric_count:
+            return None
+        # Population variance, clamped against rounding below zero
+        return max(
+            self.numeric_sum_of_squares / self.numeric_count - self.mean**2, 0.0
+        )
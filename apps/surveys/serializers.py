@@ -7,6 +7,7 @@ from apps.surveys.models import (
     SectorQuestion,
     QuestionChoice,
     QuestionAnswer,
+    QuestionAggregate,
 )
 from apps.users.serializers import UserSerializer
 
@@ -127,3 +128,26 @@ class QuestionAnswerSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
+
+
+class QuestionAggregateSerializer(serializers.ModelSerializer):
+    question_number = serializers.FloatField(source="question.number", read_only=True)
+    question_type = serializers.CharField(
+        source="question.sector.question_type", read_only=True
+    )
+    mean = serializers.FloatField(read_only=True)
+    variance = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = QuestionAggregate
+        fields = [
+            "question",
+            "question_number",
+            "question_type",
+            "response_count",
+            "choice_counts",
+            "mean",
+            "variance",
+            "updated_at",
+        ]
+        read_only_fields = fields
@@ -1,15 +1,27 @@
-from typing import Union
+from datetime import datetime
+from itertools import islice
+from typing import Union, Optional
 
-from django.http import Http404
+import pandas as pd
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from django.db.models import QuerySet, F
 from django.shortcuts import get_object_or_404
 
-from apps.survey_packages.models import Respondent
-from apps.survey_packages.serializers import RespondentSerializer
+from rest_framework.exceptions import APIException
+
+from apps.survey_packages.models import SurveyPackage, Respondent, AnswerSpool
+from apps.survey_packages.signals import affected_package_ids, notify_structure_changed
+from apps.survey_packages.validators import (
+    PackageAnswerValidator,
+    CHOICE_QUESTION_TYPES,
+)
 from apps.surveys.models import (
     Survey,
     SurveySector,
     SectorQuestion,
     QuestionAnswer,
+    QuestionAggregate,
 )
 from apps.surveys.serializers import (
     SurveySectorSerializer,
@@ -18,6 +30,8 @@ from apps.surveys.serializers import (
     QuestionAnswerSerializer,
 )
 from apps.users.models import User
+from apps.workspaces.resolvers import workspace_key_resolver
+from apps.workspaces.services import RoutineProgressService, WorkspaceService
 from config.exceptions import InstanceNotFound, ConflictException, InvalidInputException
 
 
@@ -28,6 +42,16 @@ class SurveyService(object):
         else:
             self.survey = survey
 
+    def notify_structure_changed(self) -> None:
+        """
+        Bumps the structure versions of the survey and of the survey packages
+        using it, once for a whole write of its sectors, questions and choices
+        """
+        Survey.objects.filter(id=self.survey.id).update(
+            structure_version=F("structure_version") + 1
+        )
+        notify_structure_changed(affected_package_ids(self.survey))
+
     def create_sectors(self, sectors: list[dict]) -> list[SurveySector]:
         created_sectors: list[SurveySector] = []
 
@@ -35,6 +59,7 @@ class SurveyService(object):
             sector = self._create_sector(data)
             created_sectors.append(sector)
 
+        self.notify_structure_changed()
         return created_sectors
 
     def _make_common_choices(
@@ -95,62 +120,613 @@ class SurveyService(object):
 
     def delete_related_sectors(self) -> None:
         SurveySector.objects.filter(survey_id=self.survey.id).delete()
+        self.notify_structure_changed()
 
 
 class QuestionAnswerService(object):
     def __init__(
-        self, workspace_id: int, package_id: int, user: User, respondent_id: str
+        self,
+        workspace_id: int,
+        package_id: int,
+        user: Optional[User],
+        respondent_id: str,
     ):
         self.workspace_id = workspace_id
         self.package_id = package_id
         self.user = user
         self.respondent_id = respondent_id
 
-    def create_answers(self, answers_list: list[dict]) -> list[QuestionAnswer]:
-        print(type(answers_list))
+    @property
+    def respondent_key(self) -> tuple[int, int, str]:
+        return self.workspace_id, self.package_id, self.respondent_id
+
+    def validate_answers(
+        self,
+        answers_list: list[dict],
+        validator: Optional[PackageAnswerValidator] = None,
+    ) -> list[dict]:
         if type(answers_list) != list:
             raise InvalidInputException("'answers' should be an array")
 
-        answers: list[QuestionAnswer] = []
-        for a in answers_list:
-            answers.append(self._create_answer(a))
-
-        return answers
-
-    def _create_answer(self, answer_data: dict) -> QuestionAnswer:
-        question_id = answer_data.get("question_id")
         try:
-            question = get_object_or_404(SectorQuestion, id=question_id)
-        except Http404:
-            raise InstanceNotFound(f"question not found: {question_id}")
+            question_ids = [int(a.get("question_id")) for a in answers_list]
+        except (AttributeError, TypeError, ValueError):
+            raise InvalidInputException("'question_id' should be a number")
 
         serializer = QuestionAnswerSerializer(
-            data=dict(
-                respondent_id=self.respondent_id, answer=answer_data.get("answer", None)
-            )
+            data=[
+                dict(respondent_id=self.respondent_id, answer=a.get("answer", None))
+                for a in answers_list
+            ],
+            many=True,
         )
-        if serializer.is_valid(raise_exception=True):
-            return serializer.save(
-                survey_package_id=self.package_id,
-                question_id=question_id,
-                workspace_id=self.workspace_id,
-                user_id=self.user.id,
+        serializer.is_valid(raise_exception=True)
+
+        validated_answers = [
+            dict(question_id=question_id, answer=validated_data["answer"])
+            for question_id, validated_data in zip(
+                question_ids, serializer.validated_data
+            )
+        ]
+
+        if validator is None:
+            validator = PackageAnswerValidator.for_package(self.package_id)
+        validator.validate(validated_answers)
+
+        return validated_answers
+
+    def make_answers(
+        self,
+        validated_answers: list[dict],
+        validator: Optional[PackageAnswerValidator] = None,
+    ) -> list[QuestionAnswer]:
+        if validator is None:
+            validator = PackageAnswerValidator.for_package(self.package_id)
+
+        answers = []
+        for a in validated_answers:
+            numeric_value, selection_mask = validator.parse(
+                a["question_id"], a["answer"]
             )
+            answers.append(
+                QuestionAnswer(
+                    survey_package_id=self.package_id,
+                    question_id=a["question_id"],
+                    workspace_id=self.workspace_id,
+                    user=self.user,
+                    respondent_id=self.respondent_id,
+                    answer=a["answer"],
+                    numeric_value=numeric_value,
+                    selection_mask=selection_mask,
+                )
+            )
+
+        return answers
 
-    def record_respondent(self):
-        existing_response = Respondent.objects.filter(
+    def build_answers(
+        self,
+        answers_list: list[dict],
+        validator: Optional[PackageAnswerValidator] = None,
+    ) -> list[QuestionAnswer]:
+        if validator is None:
+            validator = PackageAnswerValidator.for_package(self.package_id)
+        return self.make_answers(
+            self.validate_answers(answers_list, validator), validator
+        )
+
+    def has_responded(self) -> bool:
+        return Respondent.objects.filter(
             respondent_id=self.respondent_id,
             survey_package_id=self.package_id,
             workspace_id=self.workspace_id,
-        ).first()
+        ).exists()
+
+    def submit(self, answers_list: list[dict]) -> list[QuestionAnswer]:
+        answers = self.build_answers(answers_list)
+
+        try:
+            created = self.bulk_submit([(self, answers)])
+        except IntegrityError:
+            created = [False]
 
-        if existing_response is not None:
+        if not created[0]:
             raise ConflictException(
                 "this respondent has already submitted a response for this survey package"
             )
 
-        serializer = RespondentSerializer(data=dict(respondent_id=self.respondent_id))
-        if serializer.is_valid(raise_exception=True):
-            serializer.save(
-                survey_package_id=self.package_id, workspace_id=self.workspace_id
+        # bulk_create does not set primary keys on MySQL, the rows are read back
+        return list(
+            QuestionAnswer.objects.filter(
+                workspace_id=self.workspace_id,
+                survey_package_id=self.package_id,
+                respondent_id=self.respondent_id,
+            ).order_by("id")
+        )
+
+    @staticmethod
+    def bulk_submit(
+        submissions: list[tuple["QuestionAnswerService", list[QuestionAnswer]]]
+    ) -> list[bool]:
+        """
+        Records respondents and writes answers of many submissions with a fixed
+        number of statements. Returns, per submission, whether it was written;
+        submissions of respondents who already responded are skipped.
+        """
+        if not submissions:
+            return []
+
+        keys = [service.respondent_key for service, _ in submissions]
+        existing_keys = set(
+            Respondent.objects.filter(
+                workspace_id__in={k[0] for k in keys},
+                survey_package_id__in={k[1] for k in keys},
+                respondent_id__in={k[2] for k in keys},
+            ).values_list("workspace_id", "survey_package_id", "respondent_id")
+        )
+
+        created: list[bool] = []
+        respondents: list[Respondent] = []
+        answers: list[QuestionAnswer] = []
+        for key, (service, service_answers) in zip(keys, submissions):
+            if key in existing_keys:
+                created.append(False)
+                continue
+
+            existing_keys.add(key)
+            created.append(True)
+            respondents.append(
+                Respondent(
+                    workspace_id=service.workspace_id,
+                    survey_package_id=service.package_id,
+                    respondent_id=service.respondent_id,
+                )
+            )
+            answers.extend(service_answers)
+
+        with transaction.atomic():
+            # Taken before any insert: the inserts share-lock the workspace row
+            # through their foreign keys, and upgrading that lock afterwards
+            # deadlocks with a concurrent submission. A rebuild takes it as well.
+            WorkspaceService.lock({r.workspace_id for r in respondents})
+
+            # The respondents are written first so a duplicate submission is
+            # rejected by the unique constraint before any answer is written
+            Respondent.objects.bulk_create(respondents)
+            QuestionAnswer.objects.bulk_create(answers)
+            RoutineProgressService.record(respondents)
+            QuestionAggregateService.apply(QuestionAggregateService.summarize(answers))
+
+        return created
+
+
+class QuestionAggregateService(object):
+    """
+    Maintains QuestionAggregate rows. Ingestion and the rebuild both go through
+    `summarize`, so a rebuilt table is identical to an incrementally kept one.
+    """
+
+    SCALE_QUESTION_TYPES = [
+        SurveySector.QuestionType.LIKERT,
+        SurveySector.QuestionType.EXTENT,
+    ]
+    KEY = ["workspace_id", "survey_package_id", "question_id"]
+    FIELDS = [
+        "response_count",
+        "numeric_count",
+        "numeric_sum",
+        "numeric_sum_of_squares",
+    ]
+
+    @staticmethod
+    def _attach_question_types(answers: pd.DataFrame) -> pd.DataFrame:
+        questions = {}
+        for package_id in answers["survey_package_id"].unique():
+            validator = PackageAnswerValidator.for_package(int(package_id))
+            for question_id, (
+                question_type,
+                _,
+                descriptive,
+            ) in validator.questions.items():
+                questions[(package_id, question_id)] = (
+                    question_type,
+                    bool(descriptive),
+                )
+
+        types = [
+            questions.get(key, (None, False))
+            for key in zip(answers["survey_package_id"], answers["question_id"])
+        ]
+        return answers.assign(
+            question_type=[t for t, _ in types],
+            has_descriptive=[d for _, d in types],
+        )
+
+    @classmethod
+    def summarize(
+        cls, answers: Union[list[QuestionAnswer], pd.DataFrame]
+    ) -> dict[tuple[int, int, int], dict]:
+        """
+        Returns the totals of the given answers per (workspace, package, question)
+        """
+        if type(answers) == list:
+            answers = pd.DataFrame.from_records(
+                [
+                    (a.workspace_id, a.survey_package_id, a.question_id, a.answer)
+                    for a in answers
+                ],
+                columns=cls.KEY + ["answer"],
+            )
+        if answers.empty:
+            return {}
+
+        answers = cls._attach_question_types(answers)
+        tokens = answers["answer"].str.split("$")
+        first = tokens.str[0]
+        is_number = first.str.fullmatch(r"\d+")
+
+        # Descriptive multi select answers carry filled-in values after the
+        # first choice, so only that one is counted
+        is_multi = answers["question_type"] == SurveySector.QuestionType.MULTI_SELECT
+        choices = pd.concat(
+            [
+                answers.loc[
+                    answers["question_type"].isin(CHOICE_QUESTION_TYPES)
+                ].assign(choice=first),
+                answers.loc[is_multi & ~answers["has_descriptive"]]
+                .assign(choice=tokens)
+                .explode("choice"),
+                answers.loc[is_multi & answers["has_descriptive"]].assign(choice=first),
+            ]
+        )
+        choices = choices.loc[choices["choice"].str.fullmatch(r"\d+").fillna(False)]
+        choice_counts = choices.groupby(
+            cls.KEY + [choices["choice"].astype(int)]
+        ).size()
+
+        values = first.where(
+            is_number & answers["question_type"].isin(cls.SCALE_QUESTION_TYPES)
+        ).astype(float)
+        totals = (
+            answers.assign(value=values, square=values**2)
+            .groupby(cls.KEY)
+            .agg(
+                response_count=("answer", "size"),
+                numeric_count=("value", "count"),
+                numeric_sum=("value", "sum"),
+                numeric_sum_of_squares=("square", "sum"),
             )
+        )
+
+        summary = {
+            tuple(int(k) for k in key): dict(
+                response_count=int(row.response_count),
+                numeric_count=int(row.numeric_count),
+                numeric_sum=float(row.numeric_sum),
+                numeric_sum_of_squares=float(row.numeric_sum_of_squares),
+                choice_counts={},
+            )
+            for key, row in zip(totals.index, totals.itertuples(index=False))
+        }
+        for (*key, choice), count in choice_counts.items():
+            summary[tuple(int(k) for k in key)]["choice_counts"][str(choice)] = int(
+                count
+            )
+
+        return summary
+
+    @classmethod
+    def merge(cls, totals: dict[tuple, dict], summary: dict[tuple, dict]) -> None:
+        for key, delta in summary.items():
+            if key not in totals:
+                totals[key] = delta
+                continue
+
+            total = totals[key]
+            for field in cls.FIELDS:
+                total[field] += delta[field]
+            for choice, count in delta["choice_counts"].items():
+                total["choice_counts"][choice] = (
+                    total["choice_counts"].get(choice, 0) + count
+                )
+
+    @classmethod
+    def apply(cls, summary: dict[tuple[int, int, int], dict]) -> None:
+        """
+        Adds a summary to the stored aggregates, inside the caller's transaction
+        and under the workspace lock it took before writing the answers
+        """
+        if not summary:
+            return
+
+        # Missing rows are created empty first, so concurrent submissions
+        # always meet on a row lock instead of on the unique constraint
+        QuestionAggregate.objects.bulk_create(
+            [
+                QuestionAggregate(workspace_id=w, survey_package_id=p, question_id=q)
+                for w, p, q in summary.keys()
+            ],
+            ignore_conflicts=True,
+        )
+        aggregates = (
+            QuestionAggregate.objects.select_for_update()
+            .filter(
+                workspace_id__in={w for w, _, _ in summary.keys()},
+                survey_package_id__in={p for _, p, _ in summary.keys()},
+                question_id__in={q for _, _, q in summary.keys()},
+            )
+            .order_by("id")
+        )
+
+        updated = []
+        for aggregate in aggregates:
+            key = (
+                aggregate.workspace_id,
+                aggregate.survey_package_id,
+                aggregate.question_id,
+            )
+            if key not in summary:
+                continue
+
+            totals = {field: getattr(aggregate, field) for field in cls.FIELDS}
+            totals["choice_counts"] = aggregate.choice_counts
+            cls.merge({key: totals}, {key: summary[key]})
+
+            for field, value in totals.items():
+                setattr(aggregate, field, value)
+            aggregate.updated_at = datetime.now()
+            updated.append(aggregate)
+
+        QuestionAggregate.objects.bulk_update(
+            updated, cls.FIELDS + ["choice_counts", "updated_at"]
+        )
+
+    @classmethod
+    def _rebuild_workspace(
+        cls,
+        workspace_id: int,
+        answers: QuerySet,
+        aggregates: QuerySet,
+        chunk_size: int,
+    ) -> int:
+        with transaction.atomic():
+            # Answers recorded meanwhile wait for the replaced rows
+            WorkspaceService.lock({workspace_id})
+
+            rows = (
+                answers.filter(workspace_id=workspace_id)
+                .values_list(*cls.KEY, "answer")
+                .iterator(chunk_size=chunk_size)
+            )
+            totals: dict[tuple, dict] = {}
+            while chunk := list(islice(rows, chunk_size)):
+                cls.merge(
+                    totals,
+                    cls.summarize(
+                        pd.DataFrame.from_records(chunk, columns=cls.KEY + ["answer"])
+                    ),
+                )
+
+            aggregates.filter(workspace_id=workspace_id).delete()
+            QuestionAggregate.objects.bulk_create(
+                [
+                    QuestionAggregate(
+                        workspace_id=w, survey_package_id=p, question_id=q, **total
+                    )
+                    for (w, p, q), total in totals.items()
+                ],
+                batch_size=1000,
+            )
+
+        return len(totals)
+
+    @classmethod
+    def rebuild(
+        cls,
+        workspace_id: Optional[int] = None,
+        survey_package_id: Optional[int] = None,
+        chunk_size: int = 50000,
+    ) -> int:
+        """
+        Recomputes the aggregates from the stored answers, one workspace and a
+        chunk of answers at a time. Returns the number of aggregate rows written.
+        """
+        answers = QuestionAnswer.objects.filter(
+            workspace_id__isnull=False, survey_package_id__isnull=False
+        )
+        aggregates = QuestionAggregate.objects.all()
+        if workspace_id is not None:
+            answers = answers.filter(workspace_id=workspace_id)
+            aggregates = aggregates.filter(workspace_id=workspace_id)
+        if survey_package_id is not None:
+            answers = answers.filter(survey_package_id=survey_package_id)
+            aggregates = aggregates.filter(survey_package_id=survey_package_id)
+
+        workspace_ids = set(
+            answers.order_by().values_list("workspace_id", flat=True).distinct()
+        ) | set(aggregates.order_by().values_list("workspace_id", flat=True).distinct())
+
+        return sum(
+            cls._rebuild_workspace(w, answers, aggregates, chunk_size)
+            for w in sorted(workspace_ids)
+        )
+
+
+class AnswerBatchService(object):
+    class Status(object):
+        CREATED = "created"
+        DUPLICATE = "duplicate"
+        INVALID = "invalid"
+
+    def __init__(self, user: User):
+        self.user = user
+
+    def submit(self, envelopes: list[dict]) -> list[dict]:
+        """
+        Validates and writes many {key, package, answers} envelopes with a fixed
+        number of queries. Returns a status for each envelope in request order.
+        """
+        if type(envelopes) != list:
+            raise InvalidInputException("'submissions' should be an array")
+
+        results: list[dict] = []
+        for e in envelopes:
+            if isinstance(e, dict):
+                results.append(dict(key=e.get("key"), package=e.get("package")))
+            else:
+                results.append(dict(key=None, package=None))
+
+        workspace_ids = {
+            uuid: entry.workspace_id
+            for uuid, entry in workspace_key_resolver.resolve_many(
+                {r["key"][:22] for r in results if type(r["key"]) == str}
+            ).items()
+        }
+        package_ids = set(
+            SurveyPackage.objects.filter(
+                id__in=[r["package"] for r in results if type(r["package"]) == int]
+            ).values_list("id", flat=True)
+        )
+        submissions = []
+        valid_results = []
+        for envelope, result in zip(envelopes, results):
+            key, package_id = result["key"], result["package"]
+            try:
+                if type(key) != str or key[:22] not in workspace_ids:
+                    raise InstanceNotFound("no workspace by the provided key")
+                if package_id not in package_ids:
+                    raise InstanceNotFound("no survey package by the provided id")
+
+                service = QuestionAnswerService(
+                    workspace_ids[key[:22]], package_id, self.user, key[22:]
+                )
+                answers = service.build_answers(
+                    envelope.get("answers", None),
+                    PackageAnswerValidator.for_package(package_id),
+                )
+            except APIException as e:
+                result.update(status=self.Status.INVALID, detail=e.detail)
+                continue
+
+            submissions.append((service, answers))
+            valid_results.append(result)
+
+        try:
+            created = QuestionAnswerService.bulk_submit(submissions)
+        except IntegrityError:
+            # A respondent was recorded concurrently, retry one by one
+            created = []
+            for submission in submissions:
+                try:
+                    with transaction.atomic():
+                        created += QuestionAnswerService.bulk_submit([submission])
+                except IntegrityError:
+                    created.append(False)
+
+        for result, c in zip(valid_results, created):
+            if c:
+                result.update(status=self.Status.CREATED, detail=None)
+            else:
+                result.update(
+                    status=self.Status.DUPLICATE,
+                    detail="this respondent has already submitted a response for this survey package",
+                )
+
+        return results
+
+
+class AnswerSpoolService(object):
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.ANSWER_SPOOL_BATCH_SIZE
+
+    @staticmethod
+    def enqueue(
+        service: QuestionAnswerService, validated_answers: list[dict]
+    ) -> AnswerSpool:
+        workspace_id, package_id, respondent_id = service.respondent_key
+        if service.has_responded():
+            raise ConflictException(
+                "this respondent has already submitted a response for this survey package"
+            )
+
+        try:
+            with transaction.atomic():
+                return AnswerSpool.objects.create(
+                    workspace_id=workspace_id,
+                    survey_package_id=package_id,
+                    respondent_id=respondent_id,
+                    pending_respondent_id=respondent_id,
+                    user=service.user,
+                    answers=validated_answers,
+                )
+        except IntegrityError:
+            # Another submission of the respondent is pending
+            raise ConflictException(
+                "this respondent has already submitted a response for this survey package"
+            )
+
+    def drain(self) -> tuple[int, int]:
+        """
+        Writes one batch of pending submissions.
+        Returns the number of written and failed submissions.
+        """
+        with transaction.atomic():
+            entries: list[AnswerSpool] = list(
+                AnswerSpool.objects.select_for_update(skip_locked=True)
+                .filter(status=AnswerSpool.Status.PENDING)
+                .select_related("user")
+                .order_by("id")[: self.batch_size]
+            )
+            if not entries:
+                return 0, 0
+
+            submissions = []
+            for entry in entries:
+                service = QuestionAnswerService(
+                    entry.workspace_id,
+                    entry.survey_package_id,
+                    entry.user,
+                    entry.respondent_id,
+                )
+                submissions.append((service, service.make_answers(entry.answers)))
+
+            try:
+                with transaction.atomic():
+                    created = QuestionAnswerService.bulk_submit(submissions)
+            except IntegrityError:
+                # A respondent was recorded concurrently, retry one by one
+                created = []
+                for submission in submissions:
+                    try:
+                        with transaction.atomic():
+                            created += QuestionAnswerService.bulk_submit([submission])
+                    except IntegrityError:
+                        created.append(False)
+
+            written_ids = [e.id for e, c in zip(entries, created) if c]
+            failed_ids = [e.id for e, c in zip(entries, created) if not c]
+
+            AnswerSpool.objects.filter(id__in=written_ids).delete()
+            AnswerSpool.objects.filter(id__in=failed_ids).update(
+                status=AnswerSpool.Status.FAILED,
+                pending_respondent_id=None,
+                error="this respondent has already submitted a response for this survey package",
+            )
+
+        return len(written_ids), len(failed_ids)
+
+    @staticmethod
+    def metrics() -> dict:
+        pending = AnswerSpool.objects.filter(status=AnswerSpool.Status.PENDING)
+        oldest_created_at = (
+            pending.order_by("id").values_list("created_at", flat=True).first()
+        )
+
+        return dict(
+            depth=pending.count(),
+            failed=AnswerSpool.objects.filter(status=AnswerSpool.Status.FAILED).count(),
+            oldest_pending_seconds=(
+                (datetime.now() - oldest_created_at).total_seconds()
+                if oldest_created_at is not None
+                else 0
+            ),
+        )
@@ -0,0 +1,14 @@
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from apps.surveys.models import Survey
+
+
+@receiver(post_save, sender=Survey)
+def bump_survey_structure_version(sender, instance, **kwargs):
+    # Sectors, questions and choices are bumped for by SurveyService, once per
+    # write instead of once per row. A queryset update, so no post_save again
+    Survey.objects.filter(id=instance.id).update(
+        structure_version=F("structure_version") + 1
+    )
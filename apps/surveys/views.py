@@ -1,6 +1,6 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from django.db.models import QuerySet, Prefetch
+from django.db.models import QuerySet
 from datetime import datetime
 from django.utils.decorators import method_decorator
 from drf_yasg import openapi
@@ -9,7 +9,12 @@ from rest_framework import generics, permissions, status
 from rest_framework.request import Request
 from rest_framework.response import Response
 
-from apps.surveys.models import SurveySector, Survey, SectorQuestion
+from apps.survey_packages.tree import (
+    PackageTreeLoader,
+    TreeQueryMixin,
+    TREE_QUERY_PARAMETERS,
+)
+from apps.surveys.models import SurveySector, Survey
 from apps.surveys.serializers import (
     SimpleSurveySerializer,
     SurveySerializer,
@@ -17,8 +22,11 @@ from apps.surveys.serializers import (
 )
 from apps.surveys.services import SurveyService
 from config.custom_pagination import CustomPagination
+from config.etag import ETagMixin, version_etag
+from config.exceptions import InstanceNotFound
 from config.paginator_inspector import CustomPaginationInspector
 from config.permissions import AdminOnly, IsAdminOrReadOnly, IsAuthorOrReadOnly
+from config.renderer import TreeJSONRenderer
 
 
 @method_decorator(
@@ -68,6 +76,7 @@ class SurveyListView(generics.ListCreateAPIView):
     name="get",
     decorator=swagger_auto_schema(
         operation_summary="survey의 기본 정보와 하위 sector 들을 모두 가져옵니다",
+        manual_parameters=TREE_QUERY_PARAMETERS,
         responses={200: openapi.Response("ok", SurveySerializer)},
     ),
 )
@@ -78,7 +87,9 @@ class SurveyListView(generics.ListCreateAPIView):
         responses={204: "no content"},
     ),
 )
-class SurveyDetailView(generics.RetrieveUpdateDestroyAPIView):
+class SurveyDetailView(
+    ETagMixin, TreeQueryMixin, generics.RetrieveUpdateDestroyAPIView
+):
     allowed_methods = ["PUT", "GET", "DELETE", "PATCH"]
     queryset = Survey.objects.all()
     serializer_class = SurveySerializer
@@ -87,20 +98,27 @@ class SurveyDetailView(generics.RetrieveUpdateDestroyAPIView):
         IsAdminOrReadOnly,
         IsAuthorOrReadOnly,
     ]
+    renderer_classes = [TreeJSONRenderer]
+
+    def get_etag(self) -> Optional[str]:
+        version = (
+            Survey.objects.filter(id=self.kwargs.get("pk"))
+            .values_list("structure_version", flat=True)
+            .first()
+        )
+        return version_etag("survey", self.kwargs.get("pk"), version)
 
     def get_queryset(self) -> QuerySet:
-        return self.queryset.select_related("author").prefetch_related(
-            Prefetch(
-                "sectors",
-                queryset=SurveySector.objects.prefetch_related(
-                    "common_choices",
-                    Prefetch(
-                        "questions",
-                        queryset=SectorQuestion.objects.prefetch_related("choices"),
-                    ),
-                ),
-            )
+        return self.queryset.select_related("author")
+
+    def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        surveys = PackageTreeLoader.load_surveys(
+            **self.get_tree_options(), id=kwargs.get("pk")
         )
+        if not surveys:
+            raise InstanceNotFound("survey for the provided id does not exist")
+
+        return Response(surveys[0])
 
     @swagger_auto_schema(
         operation_summary="설문의 내용을 구성합니다. 기본 정보를 제외한 기존의 설문 내용은 삭제되고 새로 생성됩니다",
@@ -188,11 +206,7 @@ class SurveyDetailView(generics.RetrieveUpdateDestroyAPIView):
 
         sectors = service.create_sectors(request.data)
 
-        survey.refresh_from_db()
-
-        serializer = self.get_serializer(survey)
-
-        return Response(serializer.data)
+        return Response(PackageTreeLoader.load_surveys(id=survey.id)[0])
 
     @swagger_auto_schema(
         operation_summary="설문의 기본 정보를 수정합니다",
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        (
+            "workspaces",
+            "0003_alter_routine_created_at_alter_routine_updated_at_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="workspace",
+            name="uuid",
+            field=models.CharField(max_length=22, unique=True),
+        ),
+    ]
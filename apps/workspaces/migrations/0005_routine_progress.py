@@ -0,0 +1,98 @@
+# Generated by Django 4.1.7 on 2026-10-17 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("workspaces", "0004_alter_workspace_uuid"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoutineDetailCompletion",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("completed_count", models.PositiveIntegerField(default=0)),
+                (
+                    "routine_detail",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="completion",
+                        to="workspaces.routinedetail",
+                    ),
+                ),
+                (
+                    "workspace",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="workspaces.workspace",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "routine_detail_completion",
+            },
+        ),
+        migrations.CreateModel(
+            name="RoutineDayCompletion",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("nth_day", models.PositiveSmallIntegerField()),
+                ("completed_count", models.PositiveIntegerField(default=0)),
+                (
+                    "workspace",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="workspaces.workspace",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "routine_day_completion",
+            },
+        ),
+        migrations.CreateModel(
+            name="RespondentProgress",
+            fields=[
+                ("created_at", models.DateTimeField(auto_now_add=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True, null=True)),
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("respondent_id", models.CharField(max_length=30)),
+                ("completed_days_bitmap", models.BinaryField(default=b"")),
+                (
+                    "workspace",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="workspaces.workspace",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "respondent_progress",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="routinedetailcompletion",
+            index=models.Index(
+                fields=["workspace", "routine_detail"], name="detail_completion_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="routinedaycompletion",
+            constraint=models.UniqueConstraint(
+                fields=("workspace", "nth_day"), name="unique_day_completion"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="respondentprogress",
+            constraint=models.UniqueConstraint(
+                fields=("workspace", "respondent_id"), name="unique_respondent_progress"
+            ),
+        ),
+    ]
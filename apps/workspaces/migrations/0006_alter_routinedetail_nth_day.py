@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-17 15:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("workspaces", "0005_routine_progress"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="routinedetail",
+            name="nth_day",
+            field=models.PositiveSmallIntegerField(
+                validators=[django.core.validators.MinValueValidator(1)]
+            ),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import shortuuid
+from django.core.validators import MinValueValidator
 from django.db import models
 
 from apps.users.models import User
@@ -10,7 +11,7 @@ class Workspace(TimeStampMixin):
     id = models.BigAutoField(primary_key=True)
     owner = models.ForeignKey(User, on_delete=models.DO_NOTHING)
     name = models.CharField(max_length=30)
-    uuid = models.CharField(max_length=22, null=False)
+    uuid = models.CharField(max_length=22, null=False, unique=True)
     access_code = models.CharField(max_length=128, null=False)
 
     class Meta:
@@ -67,7 +68,10 @@ class RoutineDetail(TimeStampMixin):
     routine = models.ForeignKey(
         Routine, on_delete=models.CASCADE, related_name="routines"
     )
-    nth_day = models.PositiveSmallIntegerField(null=False)
+    # Days are counted from 1, a day is bit nth_day - 1 of the progress bitmaps
+    nth_day = models.PositiveSmallIntegerField(
+        null=False, validators=[MinValueValidator(1)]
+    )
     time = models.CharField(max_length=5, null=False)
     survey_package = models.ForeignKey(
         SurveyPackage, on_delete=models.CASCADE, null=True
@@ -82,3 +86,95 @@ class RoutineDetail(TimeStampMixin):
 
     def __repr__(self):
         return f"RoutineDetail({self.id}, {self.routine_id}-{self.nth_day})"
+
+
+class RoutineDetailCompletion(TimeStampMixin):
+    """
+    Number of subjects who submitted the survey package of a routine detail
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE)
+    routine_detail = models.OneToOneField(
+        RoutineDetail, on_delete=models.CASCADE, related_name="completion"
+    )
+    completed_count = models.PositiveIntegerField(null=False, default=0)
+
+    class Meta:
+        db_table = "routine_detail_completion"
+        indexes = [
+            models.Index(
+                fields=["workspace", "routine_detail"],
+                name="detail_completion_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] routine detail: {self.routine_detail_id}/completed: {self.completed_count}"
+
+    def __repr__(self):
+        return f"RoutineDetailCompletion({self.id}, {self.routine_detail_id})"
+
+
+class RoutineDayCompletion(TimeStampMixin):
+    """
+    Number of subjects who submitted every survey package scheduled on a day of the routine
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE)
+    nth_day = models.PositiveSmallIntegerField(null=False)
+    completed_count = models.PositiveIntegerField(null=False, default=0)
+
+    class Meta:
+        db_table = "routine_day_completion"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workspace", "nth_day"], name="unique_day_completion"
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] workspace: {self.workspace_id}/nth_day: {self.nth_day}"
+
+    def __repr__(self):
+        return f"RoutineDayCompletion({self.id}, {self.workspace_id}-{self.nth_day})"
+
+
+class RespondentProgress(TimeStampMixin):
+    """
+    Routine days a subject has completed, as a bitmap where bit n - 1 stands for day n
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE)
+    respondent_id = models.CharField(max_length=30, null=False)
+    completed_days_bitmap = models.BinaryField(null=False, default=b"")
+
+    class Meta:
+        db_table = "respondent_progress"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["workspace", "respondent_id"],
+                name="unique_respondent_progress",
+            )
+        ]
+
+    def __str__(self):
+        return f"[{self.id}] {self.respondent_id}/workspace: {self.workspace_id}"
+
+    def __repr__(self):
+        return f"RespondentProgress({self.id}, {self.respondent_id})"
+
+    @staticmethod
+    def to_bitmap(days: int) -> bytes:
+        return days.to_bytes((days.bit_length() + 7) // 8, "little")
+
+    @property
+    def completed_days(self) -> int:
+        return int.from_bytes(bytes(self.completed_days_bitmap), "little")
+
+    @property
+    def completed_day_numbers(self) -> list[int]:
+        days = self.completed_days
+        return [n + 1 for n in range(days.bit_length()) if days >> n & 1]
@@ -0,0 +1,77 @@
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+from cachetools import TTLCache
+from django.conf import settings
+
+from apps.workspaces.models import Workspace
+
+
+class WorkspaceKey(NamedTuple):
+    workspace_id: int
+    access_code: str
+    routine_id: Optional[int]
+    kick_off_id: Optional[int]
+
+
+class WorkspaceKeyResolver(object):
+    """
+    In-process LRU/TTL cache from a workspace uuid (the first 22 characters of a
+    subject key) to what the subject-facing endpoints need about the workspace.
+    Entries are dropped by model signals when a workspace or its routine changes.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def resolve(self, uuid: str) -> Optional[WorkspaceKey]:
+        return self.resolve_many([uuid]).get(uuid, None)
+
+    def resolve_many(self, uuids: Iterable[str]) -> dict[str, WorkspaceKey]:
+        resolved = {}
+        missing = set()
+        with self._lock:
+            for uuid in uuids:
+                entry = self._cache.get(uuid, None)
+                if entry is None:
+                    missing.add(uuid)
+                else:
+                    resolved[uuid] = entry
+
+        if missing:
+            loaded = self._load(missing)
+            with self._lock:
+                self._cache.update(loaded)
+            resolved.update(loaded)
+
+        return resolved
+
+    def invalidate(self, workspace_id: int) -> None:
+        with self._lock:
+            stale = [
+                uuid
+                for uuid, entry in self._cache.items()
+                if entry.workspace_id == workspace_id
+            ]
+            for uuid in stale:
+                self._cache.pop(uuid, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _load(uuids: set[str]) -> dict[str, WorkspaceKey]:
+        rows = Workspace.objects.filter(uuid__in=uuids).values_list(
+            "uuid", "id", "access_code", "routine__id", "routine__kick_off_id"
+        )
+        return {
+            uuid: WorkspaceKey(workspace_id, access_code, routine_id, kick_off_id)
+            for uuid, workspace_id, access_code, routine_id, kick_off_id in rows
+        }
+
+
+workspace_key_resolver = WorkspaceKeyResolver(
+    maxsize=settings.WORKSPACE_KEY_CACHE_SIZE, ttl=settings.WORKSPACE_KEY_CACHE_TTL
+)
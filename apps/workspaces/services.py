@@ -1,10 +1,22 @@
+import threading
+from collections import Counter
 from typing import List, Union
 
+from django.db import transaction
+from django.db.models import F
 from django.http import Http404
 from django.shortcuts import get_object_or_404
 
-from apps.survey_packages.models import SurveyPackage
-from apps.workspaces.models import Routine, Workspace, WorkspaceComposition
+from apps.survey_packages.models import SurveyPackage, Respondent
+from apps.workspaces.models import (
+    Routine,
+    Workspace,
+    WorkspaceComposition,
+    RoutineDetail,
+    RoutineDetailCompletion,
+    RoutineDayCompletion,
+    RespondentProgress,
+)
 from apps.workspaces.serializers import (
     RoutineDetailSerializer,
     WorkspaceCompositionSerializer,
@@ -20,36 +32,40 @@ class RoutineService(object):
             self.routine = routine
 
     def add_routine_details(self, routine_details: List[dict]):
-        for r in routine_details:
-            survey_package_id = r.get("survey_package", None)
-            external_resource = r.get("external_resource", None)
-
-            if not survey_package_id and not external_resource:
-                raise InvalidInputException(
-                    "either survey package id or external resource should be provided for all routine details"
-                )
+        with transaction.atomic():
+            for r in routine_details:
+                survey_package_id = r.get("survey_package", None)
+                external_resource = r.get("external_resource", None)
 
-            if survey_package_id is not None:
-                try:
-                    in_workspace = get_object_or_404(
-                        WorkspaceComposition,
-                        survey_package_id=survey_package_id,
-                        workspace_id=self.routine.workspace_id,
-                    )
-                except Http404:
-                    raise InstanceNotFound(
-                        f"survey package with the id {survey_package_id} does not exist or is not included in workspace"
+                if not survey_package_id and not external_resource:
+                    raise InvalidInputException(
+                        "either survey package id or external resource should be provided for all routine details"
                     )
 
-                s = RoutineDetailSerializer(data=r)
-                if s.is_valid(raise_exception=True):
-                    s.save(
-                        survey_package_id=survey_package_id, routine_id=self.routine.id
-                    )
-            else:
-                s = RoutineDetailSerializer(data=r)
-                if s.is_valid(raise_exception=True):
-                    s.save(routine_id=self.routine.id)
+                if survey_package_id is not None:
+                    try:
+                        in_workspace = get_object_or_404(
+                            WorkspaceComposition,
+                            survey_package_id=survey_package_id,
+                            workspace_id=self.routine.workspace_id,
+                        )
+                    except Http404:
+                        raise InstanceNotFound(
+                            f"survey package with the id {survey_package_id} does not exist or is not included in workspace"
+                        )
+
+                    s = RoutineDetailSerializer(data=r)
+                    if s.is_valid(raise_exception=True):
+                        s.save(
+                            survey_package_id=survey_package_id,
+                            routine_id=self.routine.id,
+                        )
+                else:
+                    s = RoutineDetailSerializer(data=r)
+                    if s.is_valid(raise_exception=True):
+                        s.save(routine_id=self.routine.id)
+
+            RoutineProgressService.rebuild_on_commit(self.routine.workspace_id)
 
         return self.routine
 
@@ -86,3 +102,283 @@ class WorkspaceService(object):
 
         self.workspace.refresh_from_db()
         return self.workspace
+
+    @staticmethod
+    def lock(workspace_ids: set[int]) -> None:
+        """
+        Locks the workspace rows until the end of the caller's transaction, so
+        the counters derived from the answers of a workspace are written by one
+        transaction at a time
+        """
+        list(
+            Workspace.objects.select_for_update()
+            .filter(id__in=workspace_ids)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+
+class RoutineProgressService(object):
+    """
+    Keeps the routine completion counters and the per subject day bitmaps.
+    A routine detail is completed once the subject submits its survey package,
+    a day once every survey package scheduled on it is submitted.
+    """
+
+    # Workspaces whose rebuild waits for the commit of this thread's transaction
+    _pending_rebuilds = threading.local()
+
+    @staticmethod
+    def _get_schedule(
+        workspace_ids: set[int],
+    ) -> tuple[dict[tuple[int, int], list[int]], dict[tuple[int, int], set[int]]]:
+        """
+        Returns the routine detail ids per (workspace, survey package)
+        and the survey package ids per (workspace, nth_day)
+        """
+        details_by_package: dict[tuple[int, int], list[int]] = {}
+        packages_by_day: dict[tuple[int, int], set[int]] = {}
+        for (
+            detail_id,
+            workspace_id,
+            nth_day,
+            package_id,
+        ) in RoutineDetail.objects.filter(
+            routine__workspace_id__in=workspace_ids, survey_package_id__isnull=False
+        ).values_list(
+            "id", "routine__workspace_id", "nth_day", "survey_package_id"
+        ):
+            details_by_package.setdefault((workspace_id, package_id), []).append(
+                detail_id
+            )
+            packages_by_day.setdefault((workspace_id, nth_day), set()).add(package_id)
+
+        return details_by_package, packages_by_day
+
+    @staticmethod
+    def _completed_days(
+        workspace_id: int,
+        submitted: set[int],
+        packages_by_day: dict[tuple[int, int], set[int]],
+    ) -> int:
+        days = 0
+        for (day_workspace_id, nth_day), packages in packages_by_day.items():
+            # Details stored before days were validated may be on day 0
+            if nth_day < 1:
+                continue
+            if day_workspace_id == workspace_id and packages <= submitted:
+                days |= 1 << (nth_day - 1)
+        return days
+
+    @classmethod
+    def record(cls, respondents: list[Respondent]) -> None:
+        """
+        Adds newly recorded respondents to the counters and bitmaps, inside
+        the transaction that recorded them and under its workspace lock
+        """
+        details_by_package, packages_by_day = cls._get_schedule(
+            {r.workspace_id for r in respondents}
+        )
+
+        detail_counts: Counter = Counter()
+        detail_workspaces: dict[int, int] = {}
+        subjects: set[tuple[int, str]] = set()
+        for r in respondents:
+            detail_ids = details_by_package.get((r.workspace_id, r.survey_package_id))
+            if detail_ids:
+                detail_counts.update(detail_ids)
+                detail_workspaces.update((d, r.workspace_id) for d in detail_ids)
+                subjects.add((r.workspace_id, r.respondent_id))
+
+        if not subjects:
+            return
+
+        RoutineDetailCompletion.objects.bulk_create(
+            [
+                RoutineDetailCompletion(workspace_id=w, routine_detail_id=d)
+                for d, w in detail_workspaces.items()
+            ],
+            ignore_conflicts=True,
+        )
+        # One statement per distinct increment, a batch rarely has many
+        detail_ids_by_increment: dict[int, list[int]] = {}
+        for detail_id, count in detail_counts.items():
+            detail_ids_by_increment.setdefault(count, []).append(detail_id)
+        for count, detail_ids in detail_ids_by_increment.items():
+            RoutineDetailCompletion.objects.filter(
+                routine_detail_id__in=detail_ids
+            ).update(completed_count=F("completed_count") + count)
+
+        # The progress rows are locked before the submissions are read, so
+        # concurrent submissions of one subject never miss each other's days
+        RespondentProgress.objects.bulk_create(
+            [RespondentProgress(workspace_id=w, respondent_id=r) for w, r in subjects],
+            ignore_conflicts=True,
+        )
+        progress_rows = {
+            (p.workspace_id, p.respondent_id): p
+            for p in RespondentProgress.objects.select_for_update()
+            .filter(
+                workspace_id__in={w for w, _ in subjects},
+                respondent_id__in={r for _, r in subjects},
+            )
+            .order_by("id")
+            if (p.workspace_id, p.respondent_id) in subjects
+        }
+
+        submitted: dict[tuple[int, str], set[int]] = {}
+        for w, p, r in Respondent.objects.filter(
+            workspace_id__in={w for w, _ in subjects},
+            survey_package_id__in={p for _, p in details_by_package.keys()},
+            respondent_id__in={r for _, r in subjects},
+        ).values_list("workspace_id", "survey_package_id", "respondent_id"):
+            submitted.setdefault((w, r), set()).add(p)
+
+        day_counts: Counter = Counter()
+        updated = []
+        for key, progress in progress_rows.items():
+            days = cls._completed_days(
+                key[0], submitted.get(key, set()), packages_by_day
+            )
+            new_days = days & ~progress.completed_days
+            if not new_days:
+                continue
+
+            day_counts.update(
+                (key[0], n + 1)
+                for n in range(new_days.bit_length())
+                if new_days >> n & 1
+            )
+            progress.completed_days_bitmap = RespondentProgress.to_bitmap(
+                progress.completed_days | days
+            )
+            updated.append(progress)
+
+        RespondentProgress.objects.bulk_update(updated, ["completed_days_bitmap"])
+
+        RoutineDayCompletion.objects.bulk_create(
+            [
+                RoutineDayCompletion(workspace_id=w, nth_day=n)
+                for w, n in day_counts.keys()
+            ],
+            ignore_conflicts=True,
+        )
+        for (workspace_id, nth_day), count in day_counts.items():
+            RoutineDayCompletion.objects.filter(
+                workspace_id=workspace_id, nth_day=nth_day
+            ).update(completed_count=F("completed_count") + count)
+
+    @classmethod
+    def rebuild_on_commit(cls, workspace_id: int) -> None:
+        """
+        Rebuilds a workspace once the current transaction commits, a single
+        time however often its routine was written in the transaction
+        """
+        pending = cls._pending_rebuilds.__dict__.setdefault("workspace_ids", set())
+        pending.add(workspace_id)
+
+        def run_rebuild():
+            if workspace_id in pending:
+                pending.discard(workspace_id)
+                cls.rebuild(workspace_id)
+
+        transaction.on_commit(run_rebuild)
+
+    @classmethod
+    def rebuild(cls, workspace_id: int) -> None:
+        """
+        Recomputes the counters and bitmaps of a workspace from its respondents,
+        used when the routine itself changes
+        """
+        with transaction.atomic():
+            # Respondents recorded meanwhile wait for the replaced rows
+            WorkspaceService.lock({workspace_id})
+
+            details_by_package, packages_by_day = cls._get_schedule({workspace_id})
+
+            submitted: dict[str, set[int]] = {}
+            detail_counts: Counter = Counter()
+            for package_id, respondent_id in Respondent.objects.filter(
+                workspace_id=workspace_id,
+                survey_package_id__in=[p for _, p in details_by_package.keys()],
+            ).values_list("survey_package_id", "respondent_id"):
+                submitted.setdefault(respondent_id, set()).add(package_id)
+                detail_counts.update(details_by_package[(workspace_id, package_id)])
+
+            day_counts: Counter = Counter()
+            progress_rows = []
+            for respondent_id, packages in submitted.items():
+                days = cls._completed_days(workspace_id, packages, packages_by_day)
+                day_counts.update(
+                    n + 1 for n in range(days.bit_length()) if days >> n & 1
+                )
+                progress_rows.append(
+                    RespondentProgress(
+                        workspace_id=workspace_id,
+                        respondent_id=respondent_id,
+                        completed_days_bitmap=RespondentProgress.to_bitmap(days),
+                    )
+                )
+
+            RoutineDetailCompletion.objects.filter(workspace_id=workspace_id).delete()
+            RoutineDayCompletion.objects.filter(workspace_id=workspace_id).delete()
+            RespondentProgress.objects.filter(workspace_id=workspace_id).delete()
+
+            RoutineDetailCompletion.objects.bulk_create(
+                [
+                    RoutineDetailCompletion(
+                        workspace_id=workspace_id,
+                        routine_detail_id=detail_id,
+                        completed_count=count,
+                    )
+                    for detail_id, count in detail_counts.items()
+                ]
+            )
+            RoutineDayCompletion.objects.bulk_create(
+                [
+                    RoutineDayCompletion(
+                        workspace_id=workspace_id,
+                        nth_day=nth_day,
+                        completed_count=count,
+                    )
+                    for nth_day, count in day_counts.items()
+                ]
+            )
+            RespondentProgress.objects.bulk_create(progress_rows, batch_size=1000)
+
+    @staticmethod
+    def get_dashboard(workspace: Workspace) -> dict:
+        completions = dict(
+            RoutineDetailCompletion.objects.filter(
+                workspace_id=workspace.id
+            ).values_list("routine_detail_id", "completed_count")
+        )
+        day_completions = dict(
+            RoutineDayCompletion.objects.filter(workspace_id=workspace.id).values_list(
+                "nth_day", "completed_count"
+            )
+        )
+
+        days: dict[int, dict] = {}
+        for detail in RoutineDetail.objects.filter(
+            routine__workspace_id=workspace.id
+        ).order_by("nth_day", "time"):
+            day = days.setdefault(
+                detail.nth_day,
+                dict(
+                    nth_day=detail.nth_day,
+                    completed_count=day_completions.get(detail.nth_day, 0),
+                    routine_details=[],
+                ),
+            )
+            day["routine_details"].append(
+                dict(
+                    id=detail.id,
+                    time=detail.time,
+                    survey_package=detail.survey_package_id,
+                    external_resource=detail.external_resource,
+                    completed_count=completions.get(detail.id, 0),
+                )
+            )
+
+        return dict(workspace=workspace.id, days=list(days.values()))
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.workspaces.models import Workspace, Routine
+from apps.workspaces.resolvers import workspace_key_resolver
+
+
+@receiver(post_save, sender=Workspace)
+@receiver(post_delete, sender=Workspace)
+def on_workspace_written(sender, instance, **kwargs):
+    workspace_key_resolver.invalidate(instance.id)
+
+
+@receiver(post_save, sender=Routine)
+@receiver(post_delete, sender=Routine)
+def on_routine_written(sender, instance, **kwargs):
+    workspace_key_resolver.invalidate(instance.workspace_id)
@@ -1,7 +1,8 @@
 import pytest
 from django.shortcuts import get_object_or_404
 
-from apps.workspaces.models import RoutineDetail, Workspace
+from apps.surveys.models import SectorQuestion
+from apps.workspaces.models import Routine, RoutineDetail, Workspace
 
 
 @pytest.mark.django_db
@@ -131,3 +132,114 @@ def test_get_kick_off_survey_package(
 
     assert res.status_code == 200
     assert len(res.data["parts"]) == 2
+
+
+@pytest.mark.django_db
+def test_kick_off_follows_routine_change(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    url = f"/api/survey-packages/kick-off?key={workspace.uuid}someuuidforrespondent&code={workspace.access_code}"
+    client_request("get", url)
+
+    routine = get_object_or_404(Routine, id=999)
+    routine.kick_off_id = 998
+    routine.save()
+    res = client_request("get", url)
+
+    assert res.status_code == 200
+    assert res.data["id"] == 998
+
+
+@pytest.mark.django_db
+def test_routine_dashboard_counts_completions(
+    client_request,
+    django_capture_on_commit_callbacks,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+):
+    workspace = get_object_or_404(Workspace, id=999)
+    answers = [
+        dict(question_id=q.id, answer="1")
+        for q in SectorQuestion.objects.filter(sector__survey_id=999)
+    ]
+    for respondent_id, package_id in [
+        ("respondent1", 999),
+        ("respondent1", 998),
+        ("respondent2", 999),
+    ]:
+        client_request(
+            "post",
+            f"/api/survey-packages/{package_id}/answers",
+            dict(
+                key=f"{workspace.uuid}{respondent_id}",
+                answers=answers if package_id == 999 else [],
+            ),
+        )
+
+    res = client_request("get", "/api/workspaces/999/dashboard?respondent=respondent2")
+    assert res.status_code == 200
+    assert [d["completed_count"] for d in res.data["days"]] == [2, 1]
+    assert [d["routine_details"][0]["completed_count"] for d in res.data["days"]] == [
+        2,
+        1,
+    ]
+    assert res.data["respondent"]["completed_days"] == [1]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client_request(
+            "post",
+            "/api/workspaces/routines/999/routine-details",
+            dict(nth_day=2, time="18:00", survey_package=999),
+        )
+    res = client_request("get", "/api/workspaces/999/dashboard?respondent=respondent1")
+
+    assert [d["completed_count"] for d in res.data["days"]] == [2, 1]
+    assert [r["completed_count"] for r in res.data["days"][1]["routine_details"]] == [
+        1,
+        2,
+    ]
+    assert res.data["respondent"]["completed_days"] == [1, 2]
+
+
+@pytest.mark.django_db
+def test_routine_detail_on_day_zero(
+    client_request,
+    create_empty_survey_packages,
+    compose_empty_survey_package,
+    create_workspaces,
+    create_workspace_routine,
+    add_survey_packages_to_workspace,
+):
+    res = client_request(
+        "post",
+        "/api/workspaces/routines/999/routine-details",
+        dict(nth_day=0, time="18:00", survey_package=999),
+    )
+    assert res.status_code == 400
+
+    # Details stored before the day was validated do not break submissions
+    RoutineDetail.objects.create(
+        routine_id=999, nth_day=0, time="18:00", survey_package_id=999
+    )
+    workspace = get_object_or_404(Workspace, id=999)
+    res = client_request(
+        "post",
+        "/api/survey-packages/999/answers",
+        dict(
+            key=f"{workspace.uuid}respondent1",
+            answers=[
+                dict(question_id=q.id, answer="1")
+                for q in SectorQuestion.objects.filter(sector__survey_id=999)
+            ],
+        ),
+    )
+    assert res.status_code == 201
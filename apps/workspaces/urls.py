@@ -8,6 +8,8 @@ from apps.workspaces.views import (
     WorkspaceAddSurveyPackageView,
     WorkspaceDestroySurveyPackageView,
     RoutineUpdateView,
+    WorkspaceExportJobCreateView,
+    WorkspaceDashboardView,
 )
 
 urlpatterns: list[URLPattern] = [
@@ -15,6 +17,16 @@ urlpatterns: list[URLPattern] = [
     path("/routines/<int:pk>", RoutineUpdateView.as_view(), name="routine_update"),
     path("/<int:pk>", WorkspaceDetailView.as_view(), name="workspace_details"),
     path("/<int:pk>/routines", RoutineCreateView.as_view(), name="routine"),
+    path(
+        "/<int:pk>/exports",
+        WorkspaceExportJobCreateView.as_view(),
+        name="workspace_export_job_create",
+    ),
+    path(
+        "/<int:pk>/dashboard",
+        WorkspaceDashboardView.as_view(),
+        name="workspace_dashboard",
+    ),
     path(
         "/<int:pk>/survey-packages/<int:survey_package_id>",
         WorkspaceDestroySurveyPackageView.as_view(),
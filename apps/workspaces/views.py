@@ -12,20 +12,28 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status, permissions
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from apps.survey_packages.models import SurveyPackage
+from apps.survey_packages.serializers import ExportJobSerializer
+from apps.survey_packages.services import ExportJobService
 from apps.workspaces.models import (
     Workspace,
     Routine,
     RoutineDetail,
     WorkspaceComposition,
+    RespondentProgress,
 )
 from apps.workspaces.serializers import (
     WorkspaceSerializer,
     RoutineSerializer,
     RoutineDetailSerializer,
 )
-from apps.workspaces.services import RoutineService, WorkspaceService
+from apps.workspaces.services import (
+    RoutineService,
+    WorkspaceService,
+    RoutineProgressService,
+)
 from config.custom_pagination import CustomPagination
 from config.exceptions import (
     InstanceNotFound,
@@ -35,7 +43,7 @@ from config.exceptions import (
     UnprocessableException,
 )
 from config.paginator_inspector import CustomPaginationInspector
-from config.permissions import IsOwnerOrReadOnly
+from config.permissions import IsOwnerOrReadOnly, AdminOnly
 
 
 @method_decorator(
@@ -291,6 +299,11 @@ class RoutineUpdateView(generics.RetrieveUpdateDestroyAPIView):
 
         return Response(serializer.data)
 
+    def perform_destroy(self, instance: Routine) -> None:
+        workspace_id = instance.workspace_id
+        instance.delete()
+        RoutineProgressService.rebuild_on_commit(workspace_id)
+
 
 @method_decorator(
     name="post",
@@ -384,6 +397,9 @@ class RoutineDetailCreateView(generics.CreateAPIView):
                     routine_id=routine_id,
                 )
 
+        # Earlier subjects may have completed the changed day
+        RoutineProgressService.rebuild_on_commit(routine.workspace_id)
+
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -403,6 +419,11 @@ class RoutineDetailView(generics.RetrieveDestroyAPIView):
     queryset = RoutineDetail.objects.all()
     serializer_class = RoutineDetailSerializer
 
+    def perform_destroy(self, instance: RoutineDetail) -> None:
+        workspace_id = instance.routine.workspace_id
+        instance.delete()
+        RoutineProgressService.rebuild_on_commit(workspace_id)
+
 
 class WorkspaceAddSurveyPackageView(generics.CreateAPIView):
     queryset = Workspace.objects.all()
@@ -495,3 +516,68 @@ class WorkspaceDestroySurveyPackageView(generics.DestroyAPIView):
         serializer = self.get_serializer(workspace)
 
         return Response(serializer.data)
+
+
+class WorkspaceExportJobCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated, AdminOnly]
+
+    @swagger_auto_schema(
+        tags=["export"],
+        operation_summary="워크스페이스 루틴의 모든 설문 패키지 응답을 하나의 엑셀 파일로 생성하는 작업을 요청합니다",
+        operation_description="진행 상황 조회와 다운로드는 /survey-packages/exports/{id} 를 이용합니다",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "layout": openapi.Schema(
+                    type=openapi.TYPE_STRING,
+                    description="sheets (차시별 시트, 기본값) 또는 wide (피험자 x 차시/문항 한 시트)",
+                ),
+            },
+        ),
+        responses={202: ExportJobSerializer},
+    )
+    def post(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        job = ExportJobService.create_for_workspace(
+            request.user, kwargs.get("pk"), request.data.get("layout", None)
+        )
+
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class WorkspaceDashboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated, AdminOnly]
+
+    @swagger_auto_schema(
+        operation_summary="워크스페이스 루틴의 차시별 완료 현황을 조회합니다",
+        operation_description="일차별로 모든 설문 패키지를 제출한 피험자 수와, 세부 일정별로 설문 패키지를 제출한 피험자 수를 반환합니다. respondent 를 보내면 해당 피험자가 완료한 일차 목록도 함께 반환합니다",
+        manual_parameters=[
+            openapi.Parameter(
+                "respondent",
+                openapi.IN_QUERY,
+                description="완료한 일차를 조회할 피험자 id",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={200: "ok"},
+    )
+    def get(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        try:
+            workspace = get_object_or_404(Workspace, id=kwargs.get("pk"))
+        except Http404:
+            raise InstanceNotFound("no workspace by the provided id")
+
+        data = RoutineProgressService.get_dashboard(workspace)
+
+        respondent_id = request.GET.get("respondent", None)
+        if respondent_id is not None:
+            progress = RespondentProgress.objects.filter(
+                workspace_id=workspace.id, respondent_id=respondent_id
+            ).first()
+            data["respondent"] = dict(
+                respondent_id=respondent_id,
+                completed_days=progress.completed_day_numbers
+                if progress is not None
+                else [],
+            )
+
+        return Response(data, status=status.HTTP_200_OK)
@@ -20,3 +20,19 @@ class CustomPagination(pagination.PageNumberPagination):
                 ]
             )
         )
+
+
+class CustomCursorPagination(pagination.CursorPagination):
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
@@ -0,0 +1,47 @@
+import hashlib
+from typing import Optional
+
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+
+def version_etag(kind: str, instance_id: int, version: Optional[int]) -> Optional[str]:
+    if version is None:
+        return None
+    return f"{kind}-{instance_id}-{version}"
+
+
+class ETagMixin(object):
+    """
+    Conditional GET for views whose representation follows a version counter.
+    `get_etag` must be cheap, a 304 is answered before the view reads or
+    serializes anything.
+    """
+
+    def get_etag(self) -> Optional[str]:
+        """
+        Returns the current ETag of the resource, None when it cannot be told
+        """
+        raise NotImplementedError
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        etag = self.get_etag()
+        if etag is not None:
+            # Query parameters such as the page change the representation
+            if request.GET:
+                query = request.GET.urlencode().encode()
+                etag = f"{etag}-{hashlib.sha1(query).hexdigest()[:12]}"
+            etag = quote_etag(etag)
+
+            if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+            if etag in if_none_match or "*" in if_none_match:
+                response = HttpResponseNotModified()
+                response.headers["ETag"] = etag
+                return response
+
+        response = super().get(request, *args, **kwargs)
+        if etag is not None and response.status_code == 200:
+            response.headers["ETag"] = etag
+        return response
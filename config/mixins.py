@@ -23,3 +23,27 @@ class SoftDeleteMixin(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StructureVersionMixin(models.Model):
+    """
+    abstract mixin base model for the structure_version field, which saves of
+    a loaded instance leave alone so it only moves through F() updates
+    """
+
+    structure_version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert", False):
+            update_fields = kwargs.get("update_fields", None)
+            if update_fields is None:
+                update_fields = [
+                    f.name for f in self._meta.concrete_fields if not f.primary_key
+                ]
+            kwargs["update_fields"] = [
+                f for f in update_fields if f != "structure_version"
+            ]
+        super().save(*args, **kwargs)
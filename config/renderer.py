@@ -1,3 +1,7 @@
+import re
+from functools import lru_cache
+
+from djangorestframework_camel_case.util import camelize_re, underscore_to_camel
 from rest_framework.renderers import JSONRenderer
 
 
@@ -18,3 +22,35 @@ class CustomRenderer(JSONRenderer):
         return super(CustomRenderer, self).render(
             response, accepted_media_type, renderer_context
         )
+
+
+@lru_cache(maxsize=1024)
+def camelize_key(key: str) -> str:
+    return re.sub(camelize_re, underscore_to_camel, key) if "_" in key else key
+
+
+def camelize_tree(data):
+    """
+    camelize of djangorestframework_camel_case for trees of plain dicts,
+    lists and scalars, with the converted keys cached
+    """
+    if isinstance(data, dict):
+        return {
+            camelize_key(k) if isinstance(k, str) else k: camelize_tree(v)
+            for k, v in data.items()
+        }
+    if isinstance(data, (list, tuple)):
+        return [camelize_tree(v) for v in data]
+    return data
+
+
+class TreeJSONRenderer(JSONRenderer):
+    """
+    Writes the same bytes as the default CamelCaseJSONRenderer for read-only
+    trees such as those of PackageTreeLoader, without its per value checks
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super(TreeJSONRenderer, self).render(
+            camelize_tree(data), accepted_media_type, renderer_context
+        )
@@ -84,7 +84,7 @@ CORS_ALLOWED_ORIGINS = [
     "https://www.convey.works",
 ]
 CORS_ALLOW_CREDENTIALS = True
-CORS_EXPOSE_HEADERS = ["Set-Cookie"]
+CORS_EXPOSE_HEADERS = ["Set-Cookie", "X-Export-Cursor", "ETag"]
 
 ROOT_URLCONF = "config.urls"
 
@@ -260,6 +260,33 @@ STATIC_URL = "static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 APPEND_SLASH = False
 
+# Survey answer ingestion
+# "sync" writes answers within the request, "spool" queues validated submissions
+# to be written in batches by the drain_answer_spool management command
+ANSWER_INGESTION_MODE = os.environ.get("ANSWER_INGESTION_MODE", "sync")
+ANSWER_SPOOL_BATCH_SIZE = int(os.environ.get("ANSWER_SPOOL_BATCH_SIZE", 500))
+ANSWER_SPOOL_FLUSH_INTERVAL = float(os.environ.get("ANSWER_SPOOL_FLUSH_INTERVAL", 2))
+# Compiled answer validators are dropped on package changes; the timeout bounds
+# staleness in other processes when a per-process cache backend is used
+PACKAGE_VALIDATOR_CACHE_TIMEOUT = 60 * 5
+
+# Subject key resolution cache (per process)
+WORKSPACE_KEY_CACHE_SIZE = 10000
+WORKSPACE_KEY_CACHE_TTL = 60 * 10
+
+# Export jobs: storage class of finished artifacts and how long they are kept
+EXPORT_FILE_STORAGE = os.environ.get(
+    "EXPORT_FILE_STORAGE", "config.storage_backends.ExportStorage"
+)
+EXPORT_ARTIFACT_TTL = 60 * 60 * 24
+EXPORT_JOB_POLL_INTERVAL = 2
+# Running jobs started longer ago than this (seconds) are taken as lost and failed
+EXPORT_JOB_STALE_AFTER = 60 * 60
+# Respondents newer than this (seconds) are left to the next incremental export
+EXPORT_CURSOR_SAFETY_LAG = 60
+# Worker processes building the packages of a workspace export, 1 builds them in turn
+EXPORT_PROCESS_POOL_SIZE = int(os.environ.get("EXPORT_PROCESS_POOL_SIZE", 4))
+
 # Email Backend
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
@@ -4,3 +4,11 @@ from storages.backends.s3boto3 import S3Boto3Storage
 class MediaStorage(S3Boto3Storage):
     location = "media"
     file_overwrite = False
+    # Media is public under MEDIA_URL, unsigned links stay valid in cached responses
+    querystring_auth = False
+
+
+class ExportStorage(S3Boto3Storage):
+    location = "exports"
+    default_acl = "private"
+    file_overwrite = False
@@ -11,6 +11,13 @@ tail -n 0 -f gunicorn*.log &
 export DJANGO_SETTINGS_MODULE=config.settings.deploy
 
 cd /home/convey
+
+# Workers run a management command instead of the api, e.g. `worker run_export_jobs`
+if [ "$1" = "worker" ]; then
+    shift
+    exec python3 manage.py "$@"
+fi
+
 python3 manage.py migrate || exit 1
 
 exec gunicorn config.wsgi.deploy:application \